@@ -1,17 +1,20 @@
 import sys
-import time
 import numpy as np
 import pygame
 from os import path
 
+from src.ball_on_plate.telemetry import sample
 from src.detection.opencv.ball_tracker import BallTracker
+from src.stewart_platform.actuator import ActuatorWorker
+from src.stewart_platform.ik_cache import IKCache
 from src.stewart_platform.servo_motor_handler import ServoMotorHandler
 from src.stewart_platform.stewart_platform import StewartPlatform
     
 class BallOnPlate:
 
-    def __init__(self, fps=1, Kp=4.0, Ki=2.0, Kd=1.0):
-        self.ball_tracker = BallTracker(debug=False)
+    def __init__(self, fps=1, Kp=4.0, Ki=2.0, Kd=1.0, telemetry_event=None):
+        self.ball_tracker = BallTracker(debug=False, threaded=True, device_name="/dev/video0")
+        self.frame_id = 0
 
         # Initialize the platform
         self.platform = StewartPlatform(
@@ -52,6 +55,12 @@ class BallOnPlate:
         self.max_velocity = 0.15
         self.max_angle = np.radians(4.0)
 
+        # Precomputed servo angles over the roll/pitch range of the agent
+        self.ik_cache = IKCache(self.platform, z=62, max_angle=np.degrees(self.max_angle), servo_arm_length=self.smh.servo_arm_length, fix_leg_length=self.smh.fix_leg_length).load_or_build()
+
+        # Apply the servo commands in a separate thread, the control loop does not wait for the I2C bus
+        self.actuator = ActuatorWorker(self.smh, self.platform, self.ik_cache)
+
         # PID-Controller
         self.Kp = Kp
         self.Ki = Ki
@@ -69,6 +78,7 @@ class BallOnPlate:
         self.reset()
 
         self.fps = fps
+        self.telemetry_event = telemetry_event
         self.last_action = None
         self._init_pygame()
     
@@ -134,25 +144,29 @@ class BallOnPlate:
             self.np_random.uniform(-self.plate_radius + self.boarder_distance, self.plate_radius - self.boarder_distance)
         )
 
-        position = None
-        while not position:
-            position = self.ball_tracker.get_ball_position()
-            time.sleep(0.01)
+        # Wait for the next ball position of the tracker thread
+        measurement = self.ball_tracker.wait_for_measurement(self.frame_id)
+        if measurement is None:
+            raise RuntimeError("Ball tracker stopped")
+        self.frame_id = measurement.frame_id
+        position = (measurement.x, measurement.y)
 
         # Get initial ball position
         self.sx_old, self.sy_old = position
 
         # Set current time
-        self.last_time = time.time()
+        self.last_time = measurement.capture_ts
 
     def perform_action(self) -> bool:
-        position = None
-        while not position:
-            position = self.ball_tracker.get_ball_position()
-            time.sleep(0.01)
-
-        # Get current time
-        self.current_time = time.time()
+        # Wait for the next ball position of the tracker thread
+        measurement = self.ball_tracker.wait_for_measurement(self.frame_id)
+        if measurement is None:
+            raise RuntimeError("Ball tracker stopped")
+        self.frame_id = measurement.frame_id
+        position = (measurement.x, measurement.y)
+
+        # Get capture time of the frame
+        self.current_time = measurement.capture_ts
         self.delta_t = self.current_time - self.last_time
         self.last_time = self.current_time
         
@@ -196,7 +210,7 @@ class BallOnPlate:
         self.pitch_theta = np.clip(uy, -self.max_angle, self.max_angle)
         self.pitch = np.degrees(self.pitch_theta)
 
-        self.smh.set(self.platform, 0, 0, 62, self.roll, self.pitch, 0)
+        self.actuator.set_tilt(self.roll, self.pitch)
 
         # Check border crossed
         boarder_crossed = True if self.sx < -self.real_width/2 or self.sx > self.real_width/2 or self.sy < -self.real_width/2 or self.sy > self.real_width/2 else False
@@ -210,6 +224,10 @@ class BallOnPlate:
             self.isOnTarget = False
             self.isOnTargetTime = 0
             
+        # Publish the controller state of this step, the age of the state is measured from the capture of the frame
+        if self.telemetry_event:
+            self.telemetry_event(sample(self, (self.integral_x, self.integral_y), capture_ts=measurement.capture_ts))
+
         return self.isOnTargetTime >= 3.0, self.isOnTarget, boarder_crossed
     
     def _meters_to_pixels(self, x, y, img_size):
@@ -278,6 +296,15 @@ class BallOnPlate:
         # Limit frames per second
         self.clock.tick(self.fps)
 
+    def close(self):
+        """
+        Apply the last command and stop the actuator thread and the ball tracker with its camera subscription
+        """
+        self.actuator.flush(timeout=1.0)
+        self.actuator.stop()
+        self.ball_tracker.stop()
+        self.ball_tracker.release_camera()
+
     def _process_events(self):
         # Process user events, key presses
         for event in pygame.event.get():
@@ -297,16 +324,19 @@ if __name__ == "__main__":
 
     agent = BallOnPlate(fps=30, Kp=1.5, Ki=0.0, Kd=0.5)
 
-    for _ in range(10):
-        agent.reset()
-        agent.render()
-        while(True):
-            finish, isOnTarget, boarder_crossed = agent.perform_action()
-            print(f"Is on target: {isOnTarget}")
+    try:
+        for _ in range(10):
+            agent.reset()
             agent.render()
-            if finish:
-                print("Episode is Successful!")
-                break
-            elif boarder_crossed:
-                print("Episode Failed!")
-                break
+            while(True):
+                finish, isOnTarget, boarder_crossed = agent.perform_action()
+                print(f"Is on target: {isOnTarget}")
+                agent.render()
+                if finish:
+                    print("Episode is Successful!")
+                    break
+                elif boarder_crossed:
+                    print("Episode Failed!")
+                    break
+    finally:
+        agent.close()
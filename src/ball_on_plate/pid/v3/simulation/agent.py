@@ -4,10 +4,12 @@ import cv2
 import numpy as np
 import pygame
 from os import path
+
+from src.ball_on_plate.telemetry import sample
     
 class BallOnPlate:
 
-    def __init__(self, fps=1, simulation_mode=True, friction=0.95, Kp=4.0, Ki=2.0, Kd=1.0, raw_image_event=None):
+    def __init__(self, fps=1, simulation_mode=True, friction=0.95, Kp=4.0, Ki=2.0, Kd=1.0, raw_image_event=None, telemetry_event=None):
         self.screen_size = 512
 
         # Physikalische Parameter
@@ -47,8 +49,10 @@ class BallOnPlate:
         self.fps = fps
         self.simulation_mode = simulation_mode
         self.raw_image_event = raw_image_event
+        self.telemetry_event = telemetry_event
         self.last_action = None
-        self._init_pygame()
+        # The renderer is created lazily on the first render() call
+        self.window_surface = None
     
     def _init_pygame(self):
         if self.raw_image_event:
@@ -193,6 +197,10 @@ class BallOnPlate:
         else:
             self.isOnTarget = False
             self.isOnTargetTime = 0
+
+        # Publish the controller state of this step
+        if self.telemetry_event:
+            self.telemetry_event(sample(self, (self.integral_x, self.integral_y)))
             
         return self.isOnTargetTime >= 3.0, self.isOnTarget, boarder_crossed
     
@@ -204,6 +212,10 @@ class BallOnPlate:
     
     def render(self):
 
+        # Initialize pygame only when something is rendered
+        if self.window_surface is None:
+            self._init_pygame()
+
         self._process_events()
 
         # clear to white background, otherwise text with varying length will leave behind prior rendered portions
@@ -263,9 +275,8 @@ class BallOnPlate:
             surface_array = pygame.surfarray.array3d(pygame.display.get_surface())  
             image = np.transpose(surface_array, (1, 0, 2))  # (width, height, 3) -> (height, width, 3)
             image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)  # Correct color from RGB to BGR for OpenCV
-            success, encoded_image = cv2.imencode('.jpg', image)
-            if success:
-                self.raw_image_event(encoded_image)
+            # The image is encoded by the receiver, e.g. the stream encoder of the web server
+            self.raw_image_event(image)
             # image.save(f'test_image/{datetime.now().strftime("%Y%m%d-%H%M%S%f")}.png')
             
                 
@@ -73,6 +73,23 @@ class TrainBallOnPlateRL:
             type=int,
             default=5_000
         )
+        parser.add_argument(
+            '--n_envs',
+            '--n-envs',
+            help='Number of environments to collect rollouts from in parallel.',
+            required=False,
+            type=int,
+            default=1
+        )
+        parser.add_argument(
+            '--vec_backend',
+            '--vec-backend',
+            help='How the environments are vectorized: dummy (sequential), subproc (one process per env) or batched (vectorized physics).',
+            required=False,
+            type=str,
+            choices=['dummy', 'subproc', 'batched'],
+            default='dummy'
+        )
 
         self.args, _ = parser.parse_known_args()
 
@@ -87,7 +104,9 @@ class TrainBallOnPlateRL:
             self.args.sequential_execution,
             self.args.iterations, 
             self.args.steps_per_iteration, 
-            logger
+            logger,
+            n_envs=self.args.n_envs,
+            vec_backend=self.args.vec_backend
         )
 
 class RunBallOnPlateRL:
@@ -183,7 +202,7 @@ class RunBallOnPlateRL:
         self.simulation_mode = simulation_mode
         self.fps = fps
 
-    def run(self, logger, event=None, stop_event=None):
+    def run(self, logger, event=None, stop_event=None, telemetry_event=None):
         from src.ball_on_plate.rl.v4.simulation.training import run_sb3
         run_sb3(
             self.env,
@@ -196,5 +215,6 @@ class RunBallOnPlateRL:
             self.fps,
             logger,
             event,
-            stop_event
+            stop_event,
+            telemetry_event
         )
\ No newline at end of file
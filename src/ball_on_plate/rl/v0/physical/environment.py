@@ -23,11 +23,11 @@ class BallOnPlateEnv(gym.Env):
     """
     metadata = {"render_modes": ["human"]}
 
-    def __init__(self, render_mode=None, render_fps=60):
+    def __init__(self, render_mode=None, render_fps=60, telemetry_event=None):
         super().__init__()
         self.render_mode = render_mode
 
-        self.ball = bop.BallOnPlate(fps=render_fps)
+        self.ball = bop.BallOnPlate(fps=render_fps, telemetry_event=telemetry_event)
         self.action_space = spaces.Box(
             low=np.array([
                 -self.ball.max_angle,
@@ -137,6 +137,10 @@ class BallOnPlateEnv(gym.Env):
     
     def render(self):
         self.ball.render()
+
+    def close(self):
+        self.ball.close()
+        super().close()
     
 if __name__ == "__main__":
     env = gym.make("BallOnPlate-v0_alpha", render_mode="human", render_fps=20)
@@ -164,4 +168,4 @@ if __name__ == "__main__":
                 print(f"Reward {reward}")
                 env.render()
         
-        env.close()
\ No newline at end of file
+    env.close()
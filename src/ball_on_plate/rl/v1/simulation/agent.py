@@ -32,7 +32,8 @@ class BallOnPlate:
         self.simulation_mode = simulation_mode
         self.raw_image_event = raw_image_event
         self.last_action = None
-        self._init_pygame()
+        # The renderer is created lazily on the first render() call
+        self.window_surface = None
     
     def _init_pygame(self):
         if self.raw_image_event:
@@ -166,6 +167,10 @@ class BallOnPlate:
     
     def render(self):
 
+        # Initialize pygame only when something is rendered
+        if self.window_surface is None:
+            self._init_pygame()
+
         self._process_events()
 
         # clear to white background, otherwise text with varying length will leave behind prior rendered portions
@@ -225,9 +230,8 @@ class BallOnPlate:
             surface_array = pygame.surfarray.array3d(pygame.display.get_surface())  
             image = np.transpose(surface_array, (1, 0, 2))  # (width, height, 3) -> (height, width, 3)
             image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)  # Correct color from RGB to BGR for OpenCV
-            success, encoded_image = cv2.imencode('.jpg', image)
-            if success:
-                self.raw_image_event(encoded_image)
+            # The image is encoded by the receiver, e.g. the stream encoder of the web server
+            self.raw_image_event(image)
             # image.save(f'test_image/{datetime.now().strftime("%Y%m%d-%H%M%S%f")}.png')
             
                 
@@ -24,11 +24,11 @@ class BallOnPlateEnv(gym.Env):
     """
     metadata = {"render_modes": ["human"]}
 
-    def __init__(self, render_mode=None, render_fps=30):
+    def __init__(self, render_mode=None, render_fps=30, telemetry_event=None):
         super().__init__()
         self.render_mode = render_mode
 
-        self.ball = bop.BallOnPlate(fps=render_fps)
+        self.ball = bop.BallOnPlate(fps=render_fps, telemetry_event=telemetry_event)
         self.action_space = spaces.Box(
             low=np.array([
                 -self.ball.max_angle,
@@ -148,6 +148,10 @@ class BallOnPlateEnv(gym.Env):
     
     def render(self):
         self.ball.render()
+
+    def close(self):
+        self.ball.close()
+        super().close()
     
 if __name__ == "__main__":
     env = gym.make("BallOnPlate-v2", render_mode="human", render_fps=5, simulation_mode=True)
@@ -175,4 +179,4 @@ if __name__ == "__main__":
                 print(f"Reward {reward}")
                 env.render()
         
-        env.close()
\ No newline at end of file
+    env.close()
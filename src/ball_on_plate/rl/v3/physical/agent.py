@@ -1,18 +1,21 @@
 import math
 import sys
-import time
 import numpy as np
 import pygame
 from os import path
 
+from src.ball_on_plate.telemetry import sample
 from src.detection.opencv.ball_tracker import BallTracker
+from src.stewart_platform.actuator import ActuatorWorker
+from src.stewart_platform.ik_cache import IKCache
 from src.stewart_platform.servo_motor_handler import ServoMotorHandler
 from src.stewart_platform.stewart_platform import StewartPlatform
     
 class BallOnPlate:
 
-    def __init__(self, fps=1):
-        self.ball_tracker = BallTracker(debug=False)
+    def __init__(self, fps=1, telemetry_event=None):
+        self.ball_tracker = BallTracker(debug=False, threaded=True, device_name="/dev/video0")
+        self.frame_id = 0
 
         # Initialize the platform
         self.platform = StewartPlatform(
@@ -54,11 +57,18 @@ class BallOnPlate:
         self.max_velocity = 0.15
         self.max_angle = 4.0
 
+        # Precomputed servo angles over the roll/pitch range of the agent
+        self.ik_cache = IKCache(self.platform, z=62, max_angle=self.max_angle, servo_arm_length=self.smh.servo_arm_length, fix_leg_length=self.smh.fix_leg_length).load_or_build()
+
+        # Apply the servo commands in a separate thread, the control loop does not wait for the I2C bus
+        self.actuator = ActuatorWorker(self.smh, self.platform, self.ik_cache)
+
         # Set random state
         self.np_random = np.random.RandomState()
         self.reset()
 
         self.fps = fps
+        self.telemetry_event = telemetry_event
         self.last_action = None
         self._init_pygame()
     
@@ -110,7 +120,7 @@ class BallOnPlate:
         if seed is not None:
             self.np_random = np.random.RandomState(seed)
 
-        self.smh.set(self.platform, 0, 0, 62, 0, 0, 0)
+        self.actuator.set_tilt(0, 0)
 
         # initialize variables
         self.distance_to_target_reward = 0.0
@@ -131,16 +141,18 @@ class BallOnPlate:
             self.np_random.uniform(-self.plate_radius + self.boarder_distance, self.plate_radius - self.boarder_distance)
         )
 
-        position = None
-        while not position:
-            position = self.ball_tracker.get_ball_position()
-            time.sleep(0.01)
+        # Wait for the next ball position of the tracker thread
+        measurement = self.ball_tracker.wait_for_measurement(self.frame_id)
+        if measurement is None:
+            raise RuntimeError("Ball tracker stopped")
+        self.frame_id = measurement.frame_id
+        position = (measurement.x, measurement.y)
 
         # Get initial ball position
         self.sx_old, self.sy_old = position
 
         # Set current time
-        self.last_time = time.time()
+        self.last_time = measurement.capture_ts
 
     def get_ball_position(self, frame):
         """
@@ -161,16 +173,18 @@ class BallOnPlate:
         # Set roll and pitch for rotation
         self.roll = min(4, action[0])
         self.pitch = min(4, action[1])
-        self.smh.set(self.platform, 0, 0, 62, self.roll, self.pitch, 0)
+        self.actuator.set_tilt(self.roll, self.pitch)
 
 
-        position = None
-        while not position:
-            position = self.ball_tracker.get_ball_position()
-            time.sleep(0.01)
+        # Wait for the next ball position of the tracker thread
+        measurement = self.ball_tracker.wait_for_measurement(self.frame_id)
+        if measurement is None:
+            raise RuntimeError("Ball tracker stopped")
+        self.frame_id = measurement.frame_id
+        position = (measurement.x, measurement.y)
 
-        # Get current time
-        self.current_time = time.time()
+        # Get capture time of the frame
+        self.current_time = measurement.capture_ts
         self.delta_t = self.current_time - self.last_time
         self.last_time = self.current_time
         
@@ -208,6 +222,10 @@ class BallOnPlate:
         # Store last action
         self.last_action = action
             
+        # Publish the controller state of this step, the age of the state is measured from the capture of the frame
+        if self.telemetry_event:
+            self.telemetry_event(sample(self, None, capture_ts=measurement.capture_ts))
+
         return self.isOnTargetTime >= 3.0, self.distance_to_target_reward, boarder_crossed
 
     def _meters_to_pixels(self, x, y, img_size):
@@ -281,6 +299,15 @@ class BallOnPlate:
         # Limit frames per second
         self.clock.tick(self.fps)
 
+    def close(self):
+        """
+        Apply the last command and stop the actuator thread and the ball tracker with its camera subscription
+        """
+        self.actuator.flush(timeout=1.0)
+        self.actuator.stop()
+        self.ball_tracker.stop()
+        self.ball_tracker.release_camera()
+
     def _process_events(self):
         # Process user events, key presses
         for event in pygame.event.get():
@@ -299,14 +326,17 @@ class BallOnPlate:
 if __name__ == "__main__":
 
     ballOnPlate = BallOnPlate(fps=20)
-    ballOnPlate.render()
-    while(True):
-
-        random_action = (
-            np.random.uniform(-ballOnPlate.max_angle, ballOnPlate.max_angle),
-            np.random.uniform(-ballOnPlate.max_angle, ballOnPlate.max_angle)
-        )
-        print(f"Performing action: {random_action}")
-
-        ballOnPlate.perform_action(random_action)
+    try:
         ballOnPlate.render()
+        while(True):
+
+            random_action = (
+                np.random.uniform(-ballOnPlate.max_angle, ballOnPlate.max_angle),
+                np.random.uniform(-ballOnPlate.max_angle, ballOnPlate.max_angle)
+            )
+            print(f"Performing action: {random_action}")
+
+            ballOnPlate.perform_action(random_action)
+            ballOnPlate.render()
+    finally:
+        ballOnPlate.close()
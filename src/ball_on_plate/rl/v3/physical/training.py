@@ -77,23 +77,26 @@ def train_sb3(env_id, id, sb3_model="PPO", use_existing_model=None, device='cpu'
                 device=device
             )
 
-    for _ in range(iterations):
-        model.learn(
-            total_timesteps=steps_per_iteration,
-            callback=eval_callback,
-            progress_bar=True,
-            reset_num_timesteps=False
-        )
+    try:
+        for _ in range(iterations):
+            model.learn(
+                total_timesteps=steps_per_iteration,
+                callback=eval_callback,
+                progress_bar=True,
+                reset_num_timesteps=False
+            )
 
-        model.save(f"./models/bop/{id}/{model_name}")
+            model.save(f"./models/bop/{id}/{model_name}")
 
-        if sequential_execution:
-            run_sb3(env_id, dir, model_name, model="PPO", episods=1, simulation_mode=True, render_fps=60)
+            if sequential_execution:
+                run_sb3(env_id, dir, model_name, model="PPO", episods=1, simulation_mode=True, render_fps=60)
+    finally:
+        env.close()
 
 
-def run_sb3(env_id, id, model_name, sb3_model, device='cpu', iterations=10, render_fps=32):
+def run_sb3(env_id, id, model_name, sb3_model, device='cpu', iterations=10, render_fps=32, telemetry_event=None):
 
-    env = gym.make(env_id, render_fps=render_fps)
+    env = gym.make(env_id, render_fps=render_fps, telemetry_event=telemetry_event)
 
     if sb3_model == "a2c":
         model = A2C.load(
@@ -115,25 +118,28 @@ def run_sb3(env_id, id, model_name, sb3_model, device='cpu', iterations=10, rend
         )
 
     print(iterations)
-    for _ in range(iterations):
-        count = 0
-        # Run a test
-        obs = env.reset()[0]
-        env.render()
-        terminated = False
-        while True:
-            count += 1
-            action, _ = model.predict(observation=obs, deterministic=True) # Turn on deterministic, so predict always returns the same behavior
-            obs, _, terminated, truncated, _ = env.step(action)
-
+    try:
+        for _ in range(iterations):
+            count = 0
+            # Run a test
+            obs = env.reset()[0]
             env.render()
-
-            if terminated or truncated:
-                if terminated:
-                    print(f"Success (count: {count})")
-                else:
-                    print(f"Failed (count: {count})")
-                break
+            terminated = False
+            while True:
+                count += 1
+                action, _ = model.predict(observation=obs, deterministic=True) # Turn on deterministic, so predict always returns the same behavior
+                obs, _, terminated, truncated, _ = env.step(action)
+
+                env.render()
+
+                if terminated or truncated:
+                    if terminated:
+                        print(f"Success (count: {count})")
+                    else:
+                        print(f"Failed (count: {count})")
+                    break
+    finally:
+        env.close()
 
 
 if __name__ == "__main__":
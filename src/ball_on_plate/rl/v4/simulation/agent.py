@@ -6,10 +6,76 @@ import cv2
 import numpy as np
 import pygame
 from os import path
+
+from src.ball_on_plate.telemetry import sample
+
+# Time step range of the seeded step schedule in seconds (s)
+DT_RANGE = (0.05, 0.175)
+
+# Random numbers of one reset (sx, sy, target x, target y) and of one step (gravity, time step, friction, 2 for the servo noise)
+RESET_DRAWS = 4
+STEP_DRAWS = 5
+
+def _splitmix64(x):
+    """
+    SplitMix64 finalizer, an invertible mix of uint64 arrays (wraps around by design)
+    """
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _seed_keys(seeds):
+    """
+    Keys of the random streams of the plates
+
+    :param seeds: one int seed per plate, None draws a key from the entropy of the system
+    :return: uint64 array with one key per plate
+    """
+    entropy = np.random.default_rng()
+    return _splitmix64(np.array([entropy.integers(2**64, dtype=np.uint64) if seed is None else seed for seed in seeds], dtype=np.uint64))
+
+def _draw(keys, counters, draws):
+    """
+    Counter-based random numbers of several plates at once.
+
+    The numbers of a plate depend only on its key and its counter, so all plates
+    are drawn with one set of array operations. A scalar plate and a lane of the
+    batched plates with the same key and counter get bit-for-bit the same numbers,
+    whatever the clock mode. The counters are incremented in place.
+
+    :param keys: uint64 array with the key of every plate
+    :param counters: uint64 array with the number of draws of every plate so far
+    :param draws: number of random numbers per plate
+    :return: array of shape (plates, draws) with uniform samples in [0, 1)
+    """
+    x = counters[:, None] * np.uint64(draws) + np.arange(draws, dtype=np.uint64)
+    bits = _splitmix64(keys[:, None] ^ _splitmix64(x))
+    counters += np.uint64(1)
+    return (bits >> np.uint64(11)) * 2.0**-53
+
+def _step_noise(keys, counters):
+    """
+    Draw all random terms of one simulation step.
+
+    :return: uniforms of shape (plates, 3) (gravity, time step, friction) and standard normals of shape (plates, 2) (servo noise roll, pitch)
+    """
+    u = _draw(keys, counters, STEP_DRAWS)
+    # Box-Muller, 1 - u is in (0, 1]
+    radius = np.sqrt(-2.0 * np.log(1.0 - u[:, 3]))
+    angle = 2.0 * np.pi * u[:, 4]
+    return u[:, :3], np.stack((radius * np.cos(angle), radius * np.sin(angle)), axis=1)
     
 class BallOnPlate:
 
-    def __init__(self, fps=1, simulation_mode=True, raw_image_event=None):
+    def __init__(self, fps=1, simulation_mode=True, raw_image_event=None, dt=None, telemetry_event=None):
+        """
+        :param fps: frames per second for rendering
+        :param simulation_mode: use the simulation clock instead of the wall clock
+        :param raw_image_event: callback for rendered images (headless rendering)
+        :param dt: fixed time step in seconds (s), None draws it from the seeded step schedule
+        :param telemetry_event: callback called with the Telemetry of every step
+        """
         self.screen_size = 512
 
         # Physikalische Parameter
@@ -29,15 +95,21 @@ class BallOnPlate:
         self.max_agular_speed = 8.0 # [degree] (degree per second)
         self.servo_noise_std = 0.25
 
-        # Set random state
-        self.np_random = np.random.RandomState()
+        # Simulation clock
+        self.dt = dt
+
+        # Set random state (key and counter of the random stream)
+        self._keys = _seed_keys([None])
+        self._counters = np.zeros(1, dtype=np.uint64)
         self.reset()
 
         self.fps = fps
         self.simulation_mode = simulation_mode
         self.raw_image_event = raw_image_event
+        self.telemetry_event = telemetry_event
         self.last_action = None
-        self._init_pygame()
+        # The renderer is created lazily on the first render() call
+        self.window_surface = None
     
     def _init_pygame(self):
         if self.raw_image_event:
@@ -85,7 +157,8 @@ class BallOnPlate:
 
     def reset(self, seed=None):
         if seed is not None:
-            self.np_random = np.random.RandomState(seed)
+            self._keys = _seed_keys([seed])
+            self._counters[:] = 0
         self.distance_to_target_reward = 0.0
         self.distance_to_target = 0.0
         self.isOnTargetTime = 0.0
@@ -95,23 +168,33 @@ class BallOnPlate:
         self.ay = 0.0 # m/s^2
         self.vx = 0.0 # s/t
         self.vy = 0.0 # s/t
-        self.sx = self.np_random.uniform(-self.plate_radius, self.plate_radius) # Position in Meter
-        self.sy = self.np_random.uniform(-self.plate_radius, self.plate_radius) # Position in Meter
+        u = _draw(self._keys, self._counters, RESET_DRAWS)[0]
+        target_radius = self.plate_radius - self.boarder_distance
+        self.sx = float(self.plate_radius * (2 * u[0] - 1)) # Position in Meter
+        self.sy = float(self.plate_radius * (2 * u[1] - 1)) # Position in Meter
         self.target_pos = (
-            self.np_random.uniform(-self.plate_radius + self.boarder_distance, self.plate_radius - self.boarder_distance),
-            self.np_random.uniform(-self.plate_radius + self.boarder_distance, self.plate_radius - self.boarder_distance)
+            float(target_radius * (2 * u[2] - 1)),
+            float(target_radius * (2 * u[3] - 1))
         )
         self.last_time = time.time()
         self.last_action = (0, 0)
 
     def perform_action(self, action) -> bool:
 
+        # Draw the random terms of this step from the own random stream
+        uniforms, normals = _step_noise(self._keys, self._counters)
+        self._uniforms, self._normals = uniforms[0], normals[0]
+
         # Randomize gravitational force
-        self.g = np.random.uniform(9.8, 9.82)
+        self.g = 9.8 + (9.82 - 9.8) * self._uniforms[0]
 
         # check if it is simulation mode
         if self.simulation_mode:
-            self.delta_t = self.np_random.uniform(0.05, 0.175)
+            # Fixed time step or seeded time step schedule
+            if self.dt is not None:
+                self.delta_t = self.dt
+            else:
+                self.delta_t = DT_RANGE[0] + (DT_RANGE[1] - DT_RANGE[0]) * self._uniforms[1]
         else:
             self.current_time = time.time()
             self.delta_t = self.current_time - self.last_time
@@ -134,8 +217,8 @@ class BallOnPlate:
         self.pitch = np.clip(delta_pitch, -max_delta_angle, max_delta_angle)
 
         # Get random noise
-        noise_roll  = np.random.normal(-self.servo_noise_std, self.servo_noise_std)
-        noise_pitch = np.random.normal(-self.servo_noise_std, self.servo_noise_std)
+        noise_roll  = -self.servo_noise_std + self.servo_noise_std * self._normals[0]
+        noise_pitch = -self.servo_noise_std + self.servo_noise_std * self._normals[1]
 
         # Add noice
         self.roll  = self.roll  + noise_roll
@@ -165,7 +248,7 @@ class BallOnPlate:
         self.vy = self.vy + self.ay * self.delta_t
 
         # friction, it is used to simulate common friction on different ground.
-        self.friction_mu = np.random.uniform(0.96, 0.995)
+        self.friction_mu = 0.96 + (0.995 - 0.96) * self._uniforms[2]
         self.vx *= self.friction_mu
         self.vy *= self.friction_mu
 
@@ -193,6 +276,10 @@ class BallOnPlate:
 
         # Store last action
         self.last_action = action
+
+        # Publish the controller state of this step
+        if self.telemetry_event:
+            self.telemetry_event(sample(self))
             
         return self.isOnTargetTime >= 3.0, self.distance_to_target_reward, boarder_crossed
     
@@ -204,6 +291,10 @@ class BallOnPlate:
     
     def render(self):
 
+        # Initialize pygame only when something is rendered
+        if self.window_surface is None:
+            self._init_pygame()
+
         self._process_events()
 
         # clear to white background, otherwise text with varying length will leave behind prior rendered portions
@@ -263,9 +354,8 @@ class BallOnPlate:
             surface_array = pygame.surfarray.array3d(pygame.display.get_surface())  
             image = np.transpose(surface_array, (1, 0, 2))  # (width, height, 3) -> (height, width, 3)
             image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)  # Correct color from RGB to BGR for OpenCV
-            success, encoded_image = cv2.imencode('.jpg', image)
-            if success:
-                self.raw_image_event(encoded_image)
+            # The image is encoded by the receiver, e.g. the stream encoder of the web server
+            self.raw_image_event(image)
             # image.save(f'test_image/{datetime.now().strftime("%Y%m%d-%H%M%S%f")}.png')
             
                 
@@ -287,6 +377,191 @@ class BallOnPlate:
                     sys.exit()
 
 
+
+class BatchedBallOnPlate:
+    """
+    Vectorized version of BallOnPlate that simulates N plates at once.
+
+    The state of every plate (position, velocity, tilt, target, ...) is kept in
+    contiguous float arrays of length N and all plates are advanced with one set
+    of array operations, including the random numbers. Every plate has its own
+    counter-based random stream, plate i seeded with seed + i follows exactly the
+    trajectory of a scalar BallOnPlate seeded with seed + i. Rendering is not supported.
+    """
+
+    def __init__(self, num_plates, simulation_mode=True, dt=None):
+        self.num_plates = num_plates
+        self.screen_size = 512
+
+        # Physikalische Parameter
+        self.mu = 0.3
+        self.real_width = 0.25 # 25 cm in Metern (m)
+        self.plate_radius = self.real_width / 2 # In meter (m)
+        self.boarder_distance = 0.04 # in meter (m)
+        self.tolerance = 0.02 # Tolerance next to target in meter (m)
+        self.pixels_per_meter = 512 / self.real_width  # Convert platform to computer-readable coordinate system ()
+
+        # Gravity
+        self.g = np.full(num_plates, 9.81)
+        self.max_velocity = 0.15
+        self.max_angle = 3
+
+        # Additional varibales
+        self.max_agular_speed = 8.0 # [degree] (degree per second)
+        self.servo_noise_std = 0.25
+
+        # State of all plates (one entry per plate)
+        self.distance_to_target_reward = np.zeros(num_plates)
+        self.distance_to_target = np.zeros(num_plates)
+        self.isOnTargetTime = np.zeros(num_plates)
+        self.roll = np.zeros(num_plates) # X-Axis
+        self.pitch = np.zeros(num_plates) # Y-Axis
+        self.ax = np.zeros(num_plates) # m/s^2
+        self.ay = np.zeros(num_plates) # m/s^2
+        self.vx = np.zeros(num_plates) # s/t
+        self.vy = np.zeros(num_plates) # s/t
+        self.sx = np.zeros(num_plates) # Position in Meter
+        self.sy = np.zeros(num_plates) # Position in Meter
+        self.target_pos = np.zeros((num_plates, 2)) # Target position in Meter
+        self.last_action = np.zeros((num_plates, 2))
+        self.delta_t = np.zeros(num_plates)
+        self.friction_mu = np.ones(num_plates)
+
+        # Simulation clock
+        self.dt = dt
+
+        # Set random state (key and counter of the random stream of every plate)
+        self._keys = _seed_keys([None] * num_plates)
+        self._counters = np.zeros(num_plates, dtype=np.uint64)
+        self.simulation_mode = simulation_mode
+        self.reset()
+
+    def reset(self, seed=None, mask=None):
+        """
+        Reset all plates or only the plates selected by mask.
+
+        :param seed: int (plate i is seeded with seed + i) or list with one seed per plate
+        :param mask: boolean array of length N, plates to reset (default: all)
+        """
+        if mask is None:
+            lanes = np.arange(self.num_plates)
+        else:
+            lanes = np.flatnonzero(mask)
+        if seed is not None:
+            seeds = [seed + i for i in range(self.num_plates)] if np.isscalar(seed) else seed
+            seeded = np.array([i for i in lanes if seeds[i] is not None], dtype=np.intp)
+            if len(seeded):
+                self._keys[seeded] = _seed_keys([seeds[i] for i in seeded])
+                self._counters[seeded] = 0
+        if len(lanes) == 0:
+            return
+
+        self.distance_to_target_reward[lanes] = 0.0
+        self.distance_to_target[lanes] = 0.0
+        self.isOnTargetTime[lanes] = 0.0
+        self.roll[lanes] = 0.0
+        self.pitch[lanes] = 0.0
+        self.ax[lanes] = 0.0
+        self.ay[lanes] = 0.0
+        self.vx[lanes] = 0.0
+        self.vy[lanes] = 0.0
+
+        # Same draws as the scalar model (sx, sy, target x, target y), only the reset plates advance their counters
+        counters = self._counters[lanes]
+        u = _draw(self._keys[lanes], counters, RESET_DRAWS)
+        self._counters[lanes] = counters
+        target_radius = self.plate_radius - self.boarder_distance
+        self.sx[lanes] = self.plate_radius * (2 * u[:, 0] - 1)
+        self.sy[lanes] = self.plate_radius * (2 * u[:, 1] - 1)
+        self.target_pos[lanes] = target_radius * (2 * u[:, 2:4] - 1)
+        self.last_action[lanes] = 0.0
+        self.last_time = time.time()
+
+    def perform_action(self, actions):
+        """
+        Advance all plates by one step.
+
+        :param actions: array of shape (N, 2) with the desired roll and pitch (degree)
+        :return: tuple of arrays (finish, distance_to_target_reward, boarder_crossed)
+        """
+        n = self.num_plates
+
+        # Draw the random terms of this step, every plate from its own stream
+        self._uniforms, self._normals = _step_noise(self._keys, self._counters)
+
+        # Randomize gravitational force
+        self.g = 9.8 + (9.82 - 9.8) * self._uniforms[:, 0]
+
+        # check if it is simulation mode
+        if self.simulation_mode:
+            # Fixed time step or seeded time step schedule
+            if self.dt is not None:
+                self.delta_t = np.full(n, self.dt)
+            else:
+                self.delta_t = DT_RANGE[0] + (DT_RANGE[1] - DT_RANGE[0]) * self._uniforms[:, 1]
+        else:
+            self.current_time = time.time()
+            self.delta_t = np.full(n, self.current_time - self.last_time)
+            self.last_time = self.current_time
+
+        # Degree times delta time
+        max_delta_angle = self.max_agular_speed * self.delta_t
+
+        # Rate limited tilt (desired angles are the ones of the last action)
+        self.roll = np.clip(self.last_action[:, 0] - self.roll, -max_delta_angle, max_delta_angle)
+        self.pitch = np.clip(self.last_action[:, 1] - self.pitch, -max_delta_angle, max_delta_angle)
+
+        # Add servo noise
+        self.roll = self.roll + (-self.servo_noise_std + self.servo_noise_std * self._normals[:, 0])
+        self.pitch = self.pitch + (-self.servo_noise_std + self.servo_noise_std * self._normals[:, 1])
+
+        # Calculate accelerate for x and y (rolling or slipping)
+        roll_theta = np.radians(self.roll)
+        self.ax = np.where(
+            self.mu >= (2/7) * np.tan(roll_theta),
+            (5/7) * self.g * np.sin(roll_theta),
+            (5/7) * self.g * (np.sin(roll_theta) - self.mu * np.cos(roll_theta))
+        )
+        pitch_theta = np.radians(self.pitch)
+        self.ay = np.where(
+            self.mu >= (2/7) * np.tan(pitch_theta),
+            (5/7) * self.g * np.sin(pitch_theta),
+            (5/7) * self.g * (np.sin(pitch_theta) - self.mu * np.cos(pitch_theta))
+        )
+
+        # Calculcate velocity
+        self.vx = self.vx + self.ax * self.delta_t
+        self.vy = self.vy + self.ay * self.delta_t
+
+        # friction, it is used to simulate common friction on different ground.
+        self.friction_mu = 0.96 + (0.995 - 0.96) * self._uniforms[:, 2]
+        self.vx *= self.friction_mu
+        self.vy *= self.friction_mu
+
+        # Calculcate position
+        self.sx = self.sx + self.vx * self.delta_t + (1/2) * self.ax * (self.delta_t * self.delta_t)
+        self.sy = self.sy + self.vy * self.delta_t + (1/2) * self.ay * (self.delta_t * self.delta_t)
+
+        # Border crossed
+        half_width = self.real_width / 2
+        boarder_crossed = (self.sx < -half_width) | (self.sx > half_width) | (self.sy < -half_width) | (self.sy > half_width)
+
+        # Is ball on target
+        dx = self.sx - self.target_pos[:, 0]
+        dy = self.sy - self.target_pos[:, 1]
+        distance = np.sqrt(dx * dx + dy * dy)
+        on_target = (np.abs(dx) < self.tolerance) & (np.abs(dy) < self.tolerance)
+        self.distance_to_target_reward = np.where(on_target, 1 - distance / self.tolerance, -1.0)
+        self.isOnTargetTime = np.where(on_target, self.isOnTargetTime + self.delta_t, 0.0)
+
+        self.distance_to_target = distance / self.plate_radius
+
+        # Store last action
+        self.last_action = np.array(actions, dtype=np.float64).reshape(n, 2)
+
+        return self.isOnTargetTime >= 3.0, self.distance_to_target_reward, boarder_crossed
+
+
 if __name__ == "__main__":
 
     ballOnPlate = BallOnPlate(fps=20, simulation_mode=False)
@@ -2,6 +2,8 @@ import math
 import gymnasium as gym
 from gymnasium import spaces
 from gymnasium.envs.registration import register
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
 from gymnasium.utils.env_checker import check_env
 
 
@@ -13,8 +15,51 @@ gym.registry.clear()
 register(
     id="BallOnPlate-v4",
     entry_point="src.ball_on_plate.rl.v4.simulation.environment:BallOnPlateEnv",
+    vector_entry_point="src.ball_on_plate.rl.v4.simulation.environment:BallOnPlateVectorEnv",
 )
 
+def _build_action_space(max_angle):
+    return spaces.Box(
+        low=np.array([
+            -max_angle,
+            -max_angle
+        ]),
+        high=np.array([
+            max_angle,
+            max_angle
+        ]),
+        shape=(2, ),
+        dtype=np.float32
+    )
+
+def _build_observation_space(max_angle):
+    return spaces.Box(
+        # Each array is min and max values
+        # [
+        #     sx, sy,
+        #     vx, vy,
+        #     roll (rad), pitch (rad),
+        #     target_x, target_y,
+        #     isOnTarget
+        # ]
+        low=np.array([
+            -1.0, -1.0,
+            -1.0, -1.0,
+            -max_angle, -max_angle,
+            -1.0, -1.0,
+            0.0
+        ]),
+        high=np.array([
+            1.0, 1.0,
+            1.0, 1.0,
+            max_angle, max_angle,
+            1.0, 1.0,
+            1.0
+        ]),
+        shape=(9, ),
+        dtype=np.float32
+    )
+
 class BallOnPlateEnv(gym.Env):
     """Custom Environment that follows gym interface.
 
@@ -24,51 +69,15 @@ class BallOnPlateEnv(gym.Env):
     """
     metadata = {"render_modes": ["human"]}
 
-    def __init__(self, render_mode=None, render_fps=60, simulation_mode=True, raw_image_event=None):
+    def __init__(self, render_mode=None, render_fps=60, simulation_mode=True, raw_image_event=None, dt=None, telemetry_event=None):
         super().__init__()
         self.render_mode = render_mode
 
-        self.ball = bop.BallOnPlate(fps=render_fps, simulation_mode=simulation_mode, raw_image_event=raw_image_event)
-        self.action_space = spaces.Box(
-            low=np.array([
-                -self.ball.max_angle,
-                -self.ball.max_angle
-            ]),
-            high=np.array([
-                self.ball.max_angle,
-                self.ball.max_angle
-            ]),
-            shape=(2, ),
-            dtype=np.float32
-        ) 
+        self.ball = bop.BallOnPlate(fps=render_fps, simulation_mode=simulation_mode, raw_image_event=raw_image_event, dt=dt, telemetry_event=telemetry_event)
+        self.action_space = _build_action_space(self.ball.max_angle)
         # spaces.Discrete(len(bop.BallOnPlateAction))
 
-        self.observation_space = spaces.Box(
-            # Each array is min and max values
-            # [
-            #     sx, sy,
-            #     vx, vy,
-            #     roll (rad), pitch (rad),
-            #     target_x, target_y,
-            #     isOnTarget
-            # ]
-            low=np.array([
-                -1.0, -1.0,
-                -1.0, -1.0,
-                -self.ball.max_angle, -self.ball.max_angle,
-                -1.0, -1.0,
-                0.0
-            ]),
-            high=np.array([
-                1.0, 1.0,
-                1.0, 1.0,
-                self.ball.max_angle, self.ball.max_angle,
-                1.0, 1.0,
-                1.0
-            ]),
-            shape=(9, ),
-            dtype=np.float32
-        )
+        self.observation_space = _build_observation_space(self.ball.max_angle)
 
         self.max_steps = 1000
 
@@ -149,6 +158,133 @@ class BallOnPlateEnv(gym.Env):
     def render(self):
         self.ball.render()
     
+class BallOnPlateVectorEnv(VectorEnv):
+    """Vectorized BallOnPlate environment backed by the batched physics.
+
+    All environments are stepped with one call to BatchedBallOnPlate and the
+    reward and termination logic of BallOnPlateEnv is computed as array masks.
+    Finished environments are reset in the same step, the observation and info
+    of the finished episode are returned in infos["final_obs"] and
+    infos["final_info"].
+
+    Resetting with seed s seeds environment i with s + i, environment i then
+    reproduces a BallOnPlateEnv reset with seed s + i bit for bit.
+    """
+    metadata = {"render_modes": [], "autoreset_mode": AutoresetMode.SAME_STEP}
+
+    def __init__(self, num_envs=1, render_mode=None, simulation_mode=True, dt=None):
+        if render_mode is not None:
+            raise ValueError("BallOnPlateVectorEnv does not support rendering.")
+        self.num_envs = num_envs
+        self.render_mode = render_mode
+
+        self.ball = bop.BatchedBallOnPlate(num_envs, simulation_mode=simulation_mode, dt=dt)
+
+        self.single_action_space = _build_action_space(self.ball.max_angle)
+        self.single_observation_space = _build_observation_space(self.ball.max_angle)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        self.max_steps = 1000
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.points_got = np.zeros(num_envs, dtype=np.float64)
+
+    def _get_state(self):
+        obs = np.stack([
+            self.ball.sx / self.ball.plate_radius,
+            self.ball.sy / self.ball.plate_radius,
+            self.ball.vx / self.ball.max_velocity,
+            self.ball.vy / self.ball.max_velocity,
+            np.deg2rad(self.ball.roll),
+            np.deg2rad(self.ball.pitch),
+            self.ball.target_pos[:, 0] / self.ball.plate_radius,
+            self.ball.target_pos[:, 1] / self.ball.plate_radius,
+            self.ball.distance_to_target
+        ], axis=1).astype(np.float32)
+        return obs
+
+    def reset(self, *, seed=None, options=None):
+        # The seed is either an int or a list with one seed per environment
+        super().reset(seed=seed if seed is None or np.isscalar(seed) else seed[0])
+
+        # Optionally only reset some environments
+        mask = (options or {}).get("reset_mask")
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=np.bool_)
+
+        self.steps[mask] = 0
+        self.points_got[mask] = 0
+
+        self.ball.reset(seed, mask)
+
+        obs = self._get_state()
+
+        info = {}
+
+        return obs, info
+
+    def step(self, actions):
+
+        # Increment steps
+        self.steps += 1
+
+        # Perform actions of all environments at once
+        finish, distance_to_target_reward, boarder_crossed = self.ball.perform_action(actions)
+
+        # Basic rewards
+        rewards = np.full(self.num_envs, -1.0)
+
+        # Ball left the target, lose all collected points
+        lost = (distance_to_target_reward == -1) & (self.points_got > 0)
+        rewards[lost] -= self.points_got[lost]
+        self.points_got[lost] = 0
+
+        # Ball is on target
+        on_target = distance_to_target_reward >= 0
+        rewards[on_target] = 1
+        self.points_got[on_target] += 1
+
+        # Check ending condition
+        terminated = finish.copy()
+        truncated = ~finish & ((self.steps > self.max_steps) | boarder_crossed)
+        rewards[terminated] += 100
+        rewards[truncated] -= 100
+
+        # Get observation
+        obs = self._get_state()
+
+        # Generate some info for debug, just in case you need it
+        all_envs = np.ones(self.num_envs, dtype=np.bool_)
+        infos = {
+            "ball_pos": np.stack([self.ball.sx, self.ball.sy], axis=1),
+            "_ball_pos": all_envs,
+            "target_pos": self.ball.target_pos.copy(),
+            "_target_pos": all_envs,
+        }
+
+        # Auto reset finished environments
+        done = terminated | truncated
+        if done.any():
+            final_obs = np.full(self.num_envs, fill_value=None, dtype=object)
+            for i in np.flatnonzero(done):
+                final_obs[i] = obs[i].copy()
+            infos["final_obs"] = final_obs
+            infos["_final_obs"] = done
+            infos["final_info"] = {
+                "ball_pos": infos["ball_pos"],
+                "_ball_pos": done,
+                "target_pos": infos["target_pos"],
+                "_target_pos": done,
+            }
+            infos["_final_info"] = done
+
+            self.steps[done] = 0
+            self.points_got[done] = 0
+            self.ball.reset(mask=done)
+            obs[done] = self._get_state()[done]
+
+        return obs, rewards, terminated, truncated, infos
+
 if __name__ == "__main__":
     env = gym.make("BallOnPlate-v4", render_mode="human", render_fps=5, simulation_mode=True)
     
@@ -0,0 +1,126 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import os
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.evaluation import evaluate_policy
+
+# Evaluation environments of the worker process
+_eval_env = None
+
+def _init_worker(env_id, n_envs, vec_backend):
+    global _eval_env
+    import torch
+    from src.ball_on_plate.rl.v4.simulation.training import build_vec_env
+
+    # The worker must not compete with the training for the cores
+    torch.set_num_threads(1)
+    _eval_env = build_vec_env(env_id, n_envs, vec_backend)
+
+def _evaluate(path, model_class, n_eval_episodes, deterministic):
+    # Runs in the worker process
+    model = model_class.load(path, device="cpu")
+    return evaluate_policy(model, _eval_env, n_eval_episodes=n_eval_episodes, deterministic=deterministic, return_episode_rewards=True)
+
+class AsyncEvalCallback(BaseCallback):
+    """
+    Evaluate checkpoints of the model in a separate process while the training continues
+
+    Every eval_freq calls the model is saved as checkpoint and evaluated by a worker process with its own
+    pool of environments, the rollout collection does not wait for it. While a checkpoint is evaluated the
+    next evaluation points are skipped, so the evaluations never queue up. The results are logged when they
+    are ready and the best checkpoint is kept as best_model.zip.
+    """
+
+    def __init__(self, env_id, n_envs: int = 1, vec_backend: str = "dummy", eval_freq: int = 10000, n_eval_episodes: int = 10, deterministic: bool = True, best_model_save_path: str = ".", verbose: int = 0, logger=None):
+        """
+        :param env_id: id of the registered environment
+        :param n_envs: number of evaluation environments in the worker process
+        :param vec_backend: vec backend of the evaluation environments, see build_vec_env
+        :param eval_freq: evaluate every eval_freq calls, every call steps all training environments
+        :param n_eval_episodes: episodes per evaluation
+        :param deterministic: evaluate the deterministic policy
+        :param best_model_save_path: directory of the checkpoint and the best model
+        """
+        super().__init__(verbose)
+        self.log = logger or logging.getLogger("StewartPlatform.AsyncEvalCallback")
+        self.env_id = env_id
+        self.n_envs = n_envs
+        self.vec_backend = vec_backend
+        self.eval_freq = eval_freq
+        self.n_eval_episodes = n_eval_episodes
+        self.deterministic = deterministic
+        self.best_model_save_path = best_model_save_path
+        self.checkpoint_path = os.path.join(best_model_save_path, "eval_checkpoint.zip")
+
+        self.executor = None
+        self.pending = None # Future and timesteps of the checkpoint being evaluated
+        self.best_mean_reward = -np.inf
+        self.last_mean_reward = -np.inf
+        self.evaluations_skipped = 0
+
+    def _init_callback(self):
+        os.makedirs(self.best_model_save_path, exist_ok=True)
+
+    def _start_worker(self):
+        # Spawn, a forked copy of the training process would inherit the state of torch
+        self.executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.env_id, self.n_envs, self.vec_backend)
+        )
+
+    def _on_step(self) -> bool:
+        self._collect()
+        if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
+            if self.pending is not None:
+                self.evaluations_skipped += 1
+            else:
+                # The worker has loaded the previous checkpoint, it can be overwritten
+                if self.executor is None:
+                    self._start_worker()
+                self.model.save(self.checkpoint_path)
+                future = self.executor.submit(_evaluate, self.checkpoint_path, type(self.model), self.n_eval_episodes, self.deterministic)
+                self.pending = (future, self.num_timesteps)
+        return True
+
+    def _collect(self, wait: bool = False):
+        # Log the result of the running evaluation once it is ready
+        if self.pending is None:
+            return
+        future, timesteps = self.pending
+        if not wait and not future.done():
+            return
+        self.pending = None
+        try:
+            rewards, lengths = future.result()
+        except Exception as e:
+            self.log.error(f"Evaluation of the checkpoint at {timesteps} timesteps failed: {e}")
+            if isinstance(e, BrokenProcessPool):
+                # The worker died, the next evaluation starts a new one
+                self.executor.shutdown()
+                self.executor = None
+            return
+
+        self.last_mean_reward = float(np.mean(rewards))
+        self.logger.record("eval/mean_reward", self.last_mean_reward)
+        self.logger.record("eval/std_reward", float(np.std(rewards)))
+        self.logger.record("eval/mean_ep_length", float(np.mean(lengths)))
+        self.logger.record("eval/timesteps", timesteps)
+        self.logger.record("eval/skipped", self.evaluations_skipped)
+        self.log.info(f"Evaluation at {timesteps} timesteps: mean reward {self.last_mean_reward:.2f} +/- {np.std(rewards):.2f}")
+        if self.last_mean_reward > self.best_mean_reward:
+            self.best_mean_reward = self.last_mean_reward
+            os.replace(self.checkpoint_path, os.path.join(self.best_model_save_path, "best_model.zip"))
+
+    def close(self):
+        """
+        Wait for the running evaluation and stop the worker process
+        """
+        self._collect(wait=True)
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
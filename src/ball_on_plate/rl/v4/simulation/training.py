@@ -1,28 +1,64 @@
 from asyncio import Event
+from functools import partial
 import os
 import time
 import gymnasium as gym
 import numpy as np
 import logging
 from stable_baselines3 import A2C, DQN, PPO
-from stable_baselines3.common.callbacks import EvalCallback
+from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecMonitor
 
 from src.ball_on_plate.rl.v4.simulation import environment
-
-def train_sb3(env_id, id, sb3_model="PPO", use_existing_model=None, device='cpu', sequential_execution=False, iterations = 40, steps_per_iteration=5_000, logger=None):
+from src.ball_on_plate.rl.v4.simulation.evaluation import AsyncEvalCallback
+
+def _make_env(env_id):
+    # Module level function, so subprocess workers import this module (and register the env)
+    return gym.make(env_id)
+
+def build_vec_env(env_id, n_envs=1, vec_backend="dummy", seed=None):
+    """
+    Build a vectorized environment with n_envs workers.
+
+    :param env_id: id of the registered environment
+    :param n_envs: number of environments
+    :param vec_backend: dummy (sequential in this process), subproc (one process per env) or batched (BatchedBallOnPlate)
+    :param seed: seed of the environments
+    :return: SB3 VecEnv with episode statistics
+    """
+    if vec_backend == "batched":
+        from src.ball_on_plate.rl.v4.simulation.vec_env import BallOnPlateVecEnv
+        env = VecMonitor(BallOnPlateVecEnv(n_envs))
+        if seed is not None:
+            env.seed(seed)
+        return env
+    elif vec_backend == "subproc":
+        return make_vec_env(partial(_make_env, env_id), n_envs=n_envs, seed=seed, vec_env_cls=SubprocVecEnv)
+    elif vec_backend == "dummy":
+        return make_vec_env(partial(_make_env, env_id), n_envs=n_envs, seed=seed, vec_env_cls=DummyVecEnv)
+    raise ValueError(f"Unknown vec backend: {vec_backend}")
+
+def train_sb3(env_id, id, sb3_model="PPO", use_existing_model=None, device='cpu', sequential_execution=False, iterations = 40, steps_per_iteration=5_000, logger=None, n_envs=1, vec_backend="dummy"):
+    logger = logger or logging.getLogger(__name__)
     os.makedirs(f"./models/bop/{id}", exist_ok=True)
 
-    env = gym.make(env_id)
-
-    # Evaluierung während des Trainings
-    eval_callback = EvalCallback(
-        env,
-        eval_freq=10000,
-        n_eval_episodes=10,
+    # Training environments
+    env = build_vec_env(env_id, n_envs, vec_backend)
+
+    # Evaluation in a worker process with its own pool of environments, so evaluation episodes
+    # never stall the rollout collection or reset the training environments in the middle of a rollout
+    n_eval_episodes = 10
+    eval_callback = AsyncEvalCallback(
+        env_id,
+        n_envs=min(n_envs, n_eval_episodes),
+        vec_backend=vec_backend,
+        eval_freq=max(10000 // n_envs, 1), # Counted in calls, every call steps all n_envs
+        n_eval_episodes=n_eval_episodes,
         deterministic=True,
-        render=False,
-        best_model_save_path=f"./models/bop/{id}"
+        best_model_save_path=f"./models/bop/{id}",
+        logger=logger
     )
+    logger.debug(f"Training on {n_envs} envs ({vec_backend}), evaluating on {eval_callback.n_envs} envs in a worker process")
 
     if sb3_model == "a2c":
         if use_existing_model is not None:
@@ -94,11 +130,16 @@ def train_sb3(env_id, id, sb3_model="PPO", use_existing_model=None, device='cpu'
         if sequential_execution:
             run_sb3(env_id, dir, model_name, model="PPO", episods=1, simulation_mode=True, render_fps=60)
 
+    env.close()
+    eval_callback.close()
+
 
-def run_sb3(env_id, id, model_name, sb3_model, device='cpu', iterations=10, simulation_mode=False, render_fps=32, logger: logging=None, raw_image_event=None, stop_event: Event=None):
+def run_sb3(env_id, id, model_name, sb3_model, device='cpu', iterations=10, simulation_mode=False, render_fps=32, logger: logging=None, raw_image_event=None, stop_event: Event=None, telemetry_event=None):
     logger = logger or logging.getLogger(__name__)
 
-    env = gym.make(env_id, simulation_mode=simulation_mode, render_fps=render_fps, raw_image_event=raw_image_event)
+    # Only environments with telemetry take the callback
+    kwargs = {"telemetry_event": telemetry_event} if telemetry_event else {}
+    env = gym.make(env_id, simulation_mode=simulation_mode, render_fps=render_fps, raw_image_event=raw_image_event, **kwargs)
 
     if sb3_model == "a2c":
         model = A2C.load(
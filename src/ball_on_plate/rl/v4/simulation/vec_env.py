@@ -0,0 +1,59 @@
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from src.ball_on_plate.rl.v4.simulation.environment import BallOnPlateVectorEnv
+
+
+class BallOnPlateVecEnv(VecEnv):
+    """Stable-Baselines3 VecEnv adapter for BallOnPlateVectorEnv.
+
+    Steps all environments in one call to the batched physics instead of
+    looping over single gym environments like DummyVecEnv does. Finished
+    environments are reset automatically, the last observation of the episode
+    is stored in info["terminal_observation"] as SB3 expects.
+    """
+
+    def __init__(self, num_envs, simulation_mode=True, dt=None):
+        # The vector env must exist before VecEnv.__init__ calls get_attr
+        self.venv = BallOnPlateVectorEnv(num_envs=num_envs, simulation_mode=simulation_mode, dt=dt)
+        super().__init__(num_envs, self.venv.single_observation_space, self.venv.single_action_space)
+        self._actions = None
+
+    def reset(self):
+        # SB3 seeds every env separately, so does the batched physics
+        seed = None if all(seed is None for seed in self._seeds) else list(self._seeds)
+        obs, _ = self.venv.reset(seed=seed)
+        self._reset_seeds()
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        return obs
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self):
+        obs, rewards, terminated, truncated, infos = self.venv.step(self._actions)
+        dones = terminated | truncated
+
+        # SB3 expects a list with one info dict per environment
+        env_infos = [{} for _ in range(self.num_envs)]
+        for i in np.flatnonzero(dones):
+            env_infos[i]["terminal_observation"] = infos["final_obs"][i]
+            env_infos[i]["TimeLimit.truncated"] = bool(truncated[i])
+
+        return obs, rewards.astype(np.float32), dones, env_infos
+
+    def close(self):
+        self.venv.close()
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self.venv, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self.venv, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        method = getattr(self.venv, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,52 @@
+from collections import namedtuple
+import math
+import time
+
+# Controller state of one tick of the control loop
+# time: wall clock time of the tick in seconds since the epoch (s)
+# capture_ts: time of the measurement the tick is based on in seconds since the epoch (s)
+# sx, sy: position of the ball (m), vx, vy: velocity of the ball (m/s), roll, pitch: angles of the plate (degree)
+# target_x, target_y: target position (m), error_x, error_y: target minus position (m)
+# integral_x, integral_y: integral terms of the PID controller (m*s), NaN for controllers without them
+TELEMETRY_FIELDS = (
+    "time", "capture_ts",
+    "sx", "sy", "vx", "vy",
+    "roll", "pitch",
+    "target_x", "target_y",
+    "error_x", "error_y",
+    "integral_x", "integral_y"
+)
+
+Telemetry = namedtuple("Telemetry", TELEMETRY_FIELDS)
+
+def sample(plate, integral=None, capture_ts: float = None) -> Telemetry:
+    """
+    Take the controller state of a plate after a tick
+
+    :param plate: agent with sx, sy, vx, vy, roll, pitch and target_pos
+    :param integral: optional integral terms (x, y) of the controller
+    :param capture_ts: time.monotonic() of the measurement like Measurement.capture_ts, default is now
+    :return: Telemetry
+    """
+    now = time.time()
+    # The measurements use the monotonic clock, the telemetry the wall clock of the browser
+    if capture_ts is not None:
+        capture_ts = now - (time.monotonic() - capture_ts)
+    target_x, target_y = plate.target_pos
+    integral_x, integral_y = integral if integral is not None else (math.nan, math.nan)
+    return Telemetry(
+        now,
+        now if capture_ts is None else capture_ts,
+        float(plate.sx),
+        float(plate.sy),
+        float(plate.vx),
+        float(plate.vy),
+        float(plate.roll),
+        float(plate.pitch),
+        float(target_x),
+        float(target_y),
+        float(target_x - plate.sx),
+        float(target_y - plate.sy),
+        float(integral_x),
+        float(integral_y)
+    )
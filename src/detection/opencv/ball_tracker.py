@@ -1,27 +1,214 @@
+from collections import namedtuple
+import logging
+import threading
 import cv2
 import time
 import numpy as np
 
+# Ball position of one frame, capture_ts is time.monotonic() when the frame was captured
+Measurement = namedtuple("Measurement", ["frame_id", "capture_ts", "x", "y"])
+
 class BallTracker:
-    def __init__(self, camera_index=0, frame_width=800, frame_height=600, debug=False):
+    # Crop of the rotated frame (pixel)
+    crop_top, crop_left = 0, 86
+    crop_bottom, crop_right = 0, 70
+
+    def __init__(self, camera_index=0, frame_width=800, frame_height=600, debug=False, roi_tracking=True, roi_min_size=48, roi_velocity_gain=2.0, threaded=False, device_name=None, logger=None):
+        """
+        :param device_name: read the frames from the capture hub of this device (e.g. /dev/video0) instead of opening the camera, so the camera can be shared with other consumers
+        :param threaded: capture and detect in a separate thread, the measurements are read with wait_for_measurement
+        :param roi_tracking: search only a window around the last position and fall back to the full frame on loss
+        :param roi_min_size: minimum half size of the search window (pixel)
+        :param roi_velocity_gain: the search window grows by this factor times the velocity of the ball (pixel per frame)
+        """
         self.debug = debug
-        self.cap = cv2.VideoCapture(camera_index, cv2.CAP_V4L2)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, frame_width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, frame_height)
+        self.frame_size = (frame_width, frame_height)
+        self.hub = None
+        self.subscription = None
+        self.frame = None # Frame of the capture hub that is being processed
+        if device_name:
+            from src.video_capture.hub import open_hub
+
+            # Only the newest frame is queued for the tracker
+            self.hub = open_hub(device_name, options={"video_size": f"{frame_width}x{frame_height}", "input_format": "mjpeg"}, format="v4l2", logger=logger)
+            self.subscription = self.hub.subscribe(maxsize=1, name="ball_tracker")
+        else:
+            self.cap = cv2.VideoCapture(camera_index, cv2.CAP_V4L2)
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, frame_width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, frame_height)
+
+        # Tracking state in coordinates of the cropped frame
+        self.roi_tracking = roi_tracking
+        self.roi_min_size = roi_min_size
+        self.roi_velocity_gain = roi_velocity_gain
+        self.last_position = None
+        self.last_radius = 0.0
+        self.velocity = (0.0, 0.0)
+
+        # Latest measurement of the tracker thread
+        self.logger = logger or logging.getLogger("StewartPlatform.BallTracker")
+        self.condition = threading.Condition()
+        self.measurement = None
+        self.frame_id = 0
+        self.running = False
+        self.thread = None
+        if threaded:
+            self.running = True
+            self.thread = threading.Thread(target=self.update, daemon=True)
+            self.thread.start()
+
+    def update(self):
+        while self.running:
+            img_rgb, capture_ts = self.read_frame()
+            if img_rgb is None:
+                self.logger.error("Videoquelle beendet oder Fehler beim Lesen.")
+                break
+            self.frame_id += 1
+
+            # Frames without ball are not published
+            position = self.find_ball(img_rgb)
+            self.release_frame()
+            if position is None:
+                continue
+
+            with self.condition:
+                self.measurement = Measurement(self.frame_id, capture_ts, position[0], position[1])
+                self.condition.notify_all()
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def wait_for_measurement(self, after=0, timeout=None):
+        """
+        Wait for a measurement of a frame newer than the given one
+
+        :param after: frame id of the last measurement that was used
+        :param timeout: maximum waiting time (s)
+        :return: the latest Measurement or None on timeout or if the tracker thread stopped
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: not self.running or (self.measurement is not None and self.measurement.frame_id > after), timeout)
+            if self.measurement is not None and self.measurement.frame_id > after:
+                return self.measurement
+            return None
+
+    def stop(self):
+        self.running = False
+        if self.subscription is not None:
+            # Wake up the tracker thread waiting for a frame
+            self.subscription.close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def read_frame(self):
+        """
+        Read the next frame from the camera or the capture hub
+
+        A frame of the capture hub is a view of its ring and stays valid until release_frame or the next read_frame.
+
+        :return: frame and its capture time (time.monotonic()), the frame is None if the source stopped
+        """
+        self.release_frame()
+        if self.subscription is None:
+            success, img_rgb = self.cap.read()
+            return (img_rgb if success else None), time.monotonic()
+
+        frame = None
+        while frame is None and not self.subscription.closed:
+            frame = self.subscription.get(timeout=0.5)
+        if frame is None:
+            return None, time.monotonic()
+
+        # The hub may have been opened with another resolution by a different consumer
+        self.frame = frame
+        img_rgb = frame.image
+        if (img_rgb.shape[1], img_rgb.shape[0]) != self.frame_size:
+            img_rgb = cv2.resize(img_rgb, self.frame_size, interpolation=cv2.INTER_AREA)
+            self.release_frame()
+        return img_rgb, frame.capture_ts
+
+    def release_frame(self):
+        # Hand the slot of the frame back to the capture hub
+        frame, self.frame = self.frame, None
+        if frame is not None:
+            frame.release()
 
     def get_ball_position(self):
         # Read frame from cam
-        success, img_rgb = self.cap.read()
-        if not success:
+        img_rgb, _ = self.read_frame()
+        if img_rgb is None:
+            return None
+        position = self.find_ball(img_rgb)
+        self.release_frame()
+        return position
+
+    def find_ball(self, img_rgb):
+        """
+        Find the ball in a frame of the camera
+
+        :param img_rgb: frame as read from the camera (not rotated and not cropped)
+        :return: center of the ball in the rotated and cropped frame or None
+        """
+        frame_height, frame_width = img_rgb.shape[:2]
+        width = frame_width - self.crop_left - self.crop_right
+        height = frame_height - self.crop_top - self.crop_bottom
+
+        detection = None
+        roi = None
+        if self.roi_tracking and self.last_position is not None:
+            # Search window around the predicted position, scaled by the velocity
+            px = self.last_position[0] + self.velocity[0]
+            py = self.last_position[1] + self.velocity[1]
+            half = self.roi_min_size + 2 * self.last_radius + self.roi_velocity_gain * max(abs(self.velocity[0]), abs(self.velocity[1]))
+            x0 = int(max(0, px - half))
+            y0 = int(max(0, py - half))
+            x1 = int(min(width, px + half))
+            y1 = int(min(height, py + half))
+
+            if x1 > x0 and y1 > y0:
+                roi = (x0, y0, x1, y1)
+                # The window in the not rotated frame, only the window is rotated
+                left = frame_width - self.crop_left - x1
+                top = frame_height - self.crop_top - y1
+                patch = cv2.rotate(img_rgb[top:top + y1 - y0, left:left + x1 - x0], cv2.ROTATE_180)
+                detection = self._detect(patch, (x0, y0))
+
+        if detection is None:
+            # Full frame search
+            img_rgb = cv2.rotate(img_rgb, cv2.ROTATE_180)
+
+            # Crop image to the preferd size
+            img_rgb = img_rgb[self.crop_top:img_rgb.shape[0] - self.crop_bottom, self.crop_left:img_rgb.shape[1] - self.crop_right]
+            patch = img_rgb
+            detection = self._detect(img_rgb, (0, 0))
+            roi = None
+
+        if detection is None:
+            # Ball lost
+            self.last_position = None
+            self.velocity = (0.0, 0.0)
             return None
 
-        img_rgb = cv2.rotate(img_rgb, cv2.ROTATE_180)
-        
-        # Crop image to the preferd size
-        crop_top, crop_left = 0, 86
-        crop_bottom, crop_right = 0, 70
-        img_rgb = img_rgb[crop_top:img_rgb.shape[0] - crop_bottom, crop_left:img_rgb.shape[1] - crop_right]
+        (x, y), radius, contour = detection
+
+        # Update the tracking state
+        if self.last_position is not None:
+            self.velocity = (x - self.last_position[0], y - self.last_position[1])
+        self.last_position = (x, y)
+        self.last_radius = radius
+
+        # Becouse if the type of the object we have to convert it to int
+        center = (int(x), int(y))
+
+        if self.debug:
+            self._draw(patch, roi, center, int(radius), contour)
+
+        # Return features
+        return center
 
+    def _detect(self, img_rgb, offset):
         # Convert image from rgb to gray
         img_gray = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY)
         if self.debug:
@@ -32,43 +219,43 @@ class BallTracker:
         if self.debug:
             cv2.imshow('tresh', tresh)
 
-        # Get all contours
-        contours, _ = cv2.findContours(tresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        # To prevent manipulating the original image we create a copy of it
-        img_rgb_copy = img_rgb.copy()
+        # Get all contours, shifted into coordinates of the cropped frame
+        contours, _ = cv2.findContours(tresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
 
         # contours = [cnt for cnt in contours if self.check_circle(cv2.minEnclosingCircle(cnt)[1], cv2.contourArea(cnt))]
 
         # Check if any contour exist
-        if contours:
-            # Detect longest contour
-            largest_contour = max(contours, key=cv2.contourArea)
+        if not contours:
+            return None
 
-            # Get x, y, koordinates and the radius
-            (x,y), radius = cv2.minEnclosingCircle(largest_contour)
+        # Detect longest contour
+        largest_contour = max(contours, key=cv2.contourArea)
 
-            # Becouse if the type of the object we have to convert it to int
-            center = (int(x), int(y))
-            radius = int(radius)
+        # Get x, y, koordinates and the radius
+        (x, y), radius = cv2.minEnclosingCircle(largest_contour)
+        return (x, y), radius, largest_contour
 
-            # Draw circle
-            cv2.circle(img_rgb_copy, center, radius, (255, 0, 0), 4)
+    def _draw(self, img_rgb, roi, center, radius, contour):
+        # To prevent manipulating the original image we create a copy of it
+        img_rgb_copy = img_rgb.copy()
 
-            # Get ellipse from largest contour
-            ellipse = cv2.fitEllipse(largest_contour)
+        # Shift into coordinates of the image
+        offset = np.array(roi[:2]) if roi else np.zeros(2, dtype=int)
+        center = (center[0] - int(offset[0]), center[1] - int(offset[1]))
+        contour = contour - offset
+
+        # Draw circle
+        cv2.circle(img_rgb_copy, center, radius, (255, 0, 0), 4)
+
+        # Get ellipse from largest contour
+        if len(contour) >= 5:
+            ellipse = cv2.fitEllipse(contour)
 
             # Draw ellipse
             cv2.ellipse(img_rgb_copy, ellipse, (0, 255, 0), 4)
 
+        cv2.imshow("Detected Circle", img_rgb_copy)
 
-            if self.debug:
-                cv2.imshow("Detected Circle", img_rgb_copy)
-            # Return features
-            return center
-        else:
-            return None
-    
     def check_circle(self, radius, area):
         circle_area = np.pi * (radius ** 2)
 
@@ -79,7 +266,12 @@ class BallTracker:
 
     def release_camera(self):
         # Kamera freigeben
-        self.cap.release()
+        if self.subscription is not None:
+            self.release_frame()
+            self.subscription.close()
+            self.hub.close()
+        else:
+            self.cap.release()
 
 # Beispielverwendung
 if __name__ == "__main__":
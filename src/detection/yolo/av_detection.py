@@ -1,7 +1,7 @@
 from ultralytics import YOLO  # YOLOv8-Modell
 import cv2
 
-from src.video_capture.video_capture import CameraThreadWithAV
+from src.video_capture.hub import open_hub
 
 def crop_and_resize(frame):
     # 720x720 aus der Bildmitte zuschneiden
@@ -26,7 +26,7 @@ def detect_and_speak(video_source=0, language="de"):
     ncnn_model = YOLO("./models/best_ncnn_model")
 
     # Videoquelle öffnen (z. B. Webcam oder Video)
-    cam = CameraThreadWithAV(
+    hub = open_hub(
         device_name='/dev/video1',
         options={
             "video_size": '1280x720',
@@ -36,63 +36,62 @@ def detect_and_speak(video_source=0, language="de"):
         format="v4l2",
         logger=None
     )
-
-    last_frame_num = cam.frame_num
-    while cam.running:
-        if last_frame_num != cam.frame_num:
-            last_frame_num = cam.frame_num
-
-            frame, fps, frame_num = cam.read()
-            print(frame_num)
-            if frame is not None:
-            
-                # input_frame = crop_and_resize(frame)
-
-                # Objekterkennung auf dem aktuellen Frame
-                # results = ncnn_model(input_frame)  # Ergebnisse vom Modell
-                results = ncnn_model(frame)
-
-
-                # Replace the detected_classes list with a dictionary to count occurrences
-                detected_classes_count = {}
-                for result in results:
-                    boxes = result.boxes  # Boxen und Klassen aus den Ergebnissen
-                    for box in boxes:
-                        class_id = int(box.cls[0])  # Klassen-ID
-                        class_name = ncnn_model.names[class_id]  # Klassenname
-                        confidence = box.conf[0]  # Add this line to get confidence score
-                        if confidence >= 0.5:
-                            detected_classes_count[class_name] = (
-                                detected_classes_count.get(class_name, 0) + 1
-                            )
-
-                            # Koordinaten der Bounding Box erhalten
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-
-                            # Bounding Box zeichnen
-                            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-
-                            # Text (Klassennamen und Confidence-Score) über der Box anzeigen
-                            label = f"{class_name} ({confidence:.2f})"
-                            cv2.putText(
-                                frame,
-                                label,
-                                (x1, y1 - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX,
-                                0.5,
-                                (0, 255, 0),
-                                2,
-                            )
-
-                # Frame mit Bounding Boxes anzeigen
-                cv2.imshow("YOLO11 Objekterkennung", frame)
+    subscription = hub.subscribe(maxsize=1, name="yolo")
+
+    for hub_frame in subscription.frames():
+        print(hub_frame.frame_num)
+        # The frame of the hub is read-only, the bounding boxes are drawn into a copy
+        frame = hub_frame.image.copy()
+        if frame is not None:
+        
+            # input_frame = crop_and_resize(frame)
+
+            # Objekterkennung auf dem aktuellen Frame
+            # results = ncnn_model(input_frame)  # Ergebnisse vom Modell
+            results = ncnn_model(frame)
+
+
+            # Replace the detected_classes list with a dictionary to count occurrences
+            detected_classes_count = {}
+            for result in results:
+                boxes = result.boxes  # Boxen und Klassen aus den Ergebnissen
+                for box in boxes:
+                    class_id = int(box.cls[0])  # Klassen-ID
+                    class_name = ncnn_model.names[class_id]  # Klassenname
+                    confidence = box.conf[0]  # Add this line to get confidence score
+                    if confidence >= 0.5:
+                        detected_classes_count[class_name] = (
+                            detected_classes_count.get(class_name, 0) + 1
+                        )
+
+                        # Koordinaten der Bounding Box erhalten
+                        x1, y1, x2, y2 = map(int, box.xyxy[0])
+
+                        # Bounding Box zeichnen
+                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
+                        # Text (Klassennamen und Confidence-Score) über der Box anzeigen
+                        label = f"{class_name} ({confidence:.2f})"
+                        cv2.putText(
+                            frame,
+                            label,
+                            (x1, y1 - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX,
+                            0.5,
+                            (0, 255, 0),
+                            2,
+                        )
+
+            # Frame mit Bounding Boxes anzeigen
+            cv2.imshow("YOLO11 Objekterkennung", frame)
 
         # Beenden mit der Taste 'q'
         if cv2.waitKey(1) & 0xFF == ord("q"):
             break
 
     # Video ist zu Ende, aber warte auf Audio
-    cam.stop()
+    subscription.close()
+    hub.close()
 
     # Cleanup erst nach Audio-Ende
     cv2.destroyAllWindows()
@@ -0,0 +1,152 @@
+import logging
+import os
+import time
+
+# Environment variable to select the bus backend: "smbus" (default), "fake" or "fake:<frequency in Hz>"
+BUS_ENV = "STEWART_PLATFORM_I2C_BUS"
+
+# Fake buses are shared per bus number like the real bus
+_fake_buses = {}
+
+def open_bus(bus=None, number: int = 1):
+    """
+    Open the I2C bus
+
+    :param bus: an opened bus object, a backend name ("smbus", "fake", "fake:<frequency>") or None to read the backend from the environment
+    :param number: number of the I2C bus
+    :return: bus object with the smbus interface
+    """
+    if bus is not None and not isinstance(bus, str):
+        return bus
+
+    backend = bus or os.environ.get(BUS_ENV, "smbus")
+    if backend == "smbus":
+        import smbus
+        return smbus.SMBus(number)
+    if backend.startswith("fake"):
+        frequency = int(backend.split(":", 1)[1]) if ":" in backend else 400000
+        if number not in _fake_buses:
+            _fake_buses[number] = FakeI2CBus(frequency=frequency)
+        return _fake_buses[number]
+    raise ValueError(f"Unknown I2C bus backend: {backend}")
+
+class FakeI2CDevice:
+    """
+    In-process I2C device with 256 byte registers
+    """
+
+    def __init__(self, registers: dict = None, auto_increment: bool = True):
+        """
+        :param registers: initial register values by address
+        :param auto_increment: block transfers advance the register address after every byte
+        """
+        self.registers = bytearray(256)
+        for reg, value in (registers or {}).items():
+            self.registers[reg] = value
+        self.auto_increment = auto_increment
+        self.pointer = 0
+
+    def increments(self) -> bool:
+        return self.auto_increment
+
+    def write(self, reg, data):
+        for i, value in enumerate(data):
+            self.registers[(reg + i if self.increments() else reg) & 0xFF] = value & 0xFF
+        self.pointer = reg
+
+    def read(self, reg, length):
+        return [self.registers[(reg + i if self.increments() else reg) & 0xFF] for i in range(length)]
+
+class FakePCA9685(FakeI2CDevice):
+    """
+    Fake PCA9685, the register auto-increment follows the AI bit of MODE1
+    """
+
+    def __init__(self):
+        super().__init__(registers={0x00: 0x11, 0x01: 0x04, 0xFE: 0x1E}, auto_increment=False)
+
+    def increments(self) -> bool:
+        return bool(self.registers[0x00] & 0x20)
+
+class FakeNunchuk(FakeI2CDevice):
+    """
+    Fake Nunchuk with centered joystick, level accelerometer and released buttons
+    """
+
+    def __init__(self):
+        super().__init__(registers={0x00: 128, 0x01: 128, 0x02: 128, 0x03: 128, 0x04: 178, 0x05: 0x03})
+
+class FakeI2CBus:
+    """
+    In-process I2C bus with the smbus interface and a timing model
+
+    Every transaction takes the time of its bits at the bus frequency (9 bits per byte including ACK,
+    plus start, repeated start and stop conditions) and a fixed overhead of the driver.
+    """
+
+    def __init__(self, frequency: int = 400000, transaction_overhead: float = 0.0, devices: dict = None, realtime: bool = True, logger=None):
+        """
+        :param frequency: bus frequency (Hz), e.g. 100000 or 400000
+        :param transaction_overhead: fixed time per transaction (s)
+        :param devices: fake devices by address, default is a PCA9685 at 0x40 and a Nunchuk at 0x52
+        :param realtime: wait for the duration of every transaction, otherwise only count the bus time
+        """
+        self.logger = logger or logging.getLogger("StewartPlatform.FakeI2CBus")
+        self.frequency = frequency
+        self.transaction_overhead = transaction_overhead
+        self.devices = devices if devices is not None else {0x40: FakePCA9685(), 0x52: FakeNunchuk()}
+        self.realtime = realtime
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.bus_time = 0.0 # (s)
+
+    def _device(self, addr):
+        if addr not in self.devices:
+            raise OSError(121, "Remote I/O error")
+        return self.devices[addr]
+
+    def _transfer(self, length: int, conditions: int):
+        # Bus time of one transaction
+        duration = (9 * length + conditions) / self.frequency + self.transaction_overhead
+        self.transactions += 1
+        self.bytes += length
+        self.bus_time += duration
+        if self.realtime:
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                pass
+
+    def write_byte(self, addr, value):
+        self._device(addr).pointer = value & 0xFF
+        self._transfer(2, 2)
+
+    def read_byte(self, addr):
+        device = self._device(addr)
+        self._transfer(2, 2)
+        return device.read(device.pointer, 1)[0]
+
+    def write_byte_data(self, addr, reg, value):
+        self._device(addr).write(reg, [value])
+        self._transfer(3, 2)
+
+    def read_byte_data(self, addr, reg):
+        result = self._device(addr).read(reg, 1)[0]
+        self._transfer(4, 3)
+        return result
+
+    def write_i2c_block_data(self, addr, reg, data):
+        if len(data) > 32:
+            raise ValueError("Block transfers are limited to 32 bytes")
+        self._device(addr).write(reg, data)
+        self._transfer(2 + len(data), 2)
+
+    def read_i2c_block_data(self, addr, reg, length=32):
+        result = self._device(addr).read(reg, min(length, 32))
+        self._transfer(3 + len(result), 3)
+        return result
+
+    def close(self):
+        pass
@@ -63,6 +63,7 @@ class Nunchuk:
     def run(self, logger, stop_event:Event=None):        
         from src.stewart_platform.stewart_platform import StewartPlatform
         from src.stewart_platform.servo_motor_handler import ServoMotorHandler
+        from src.stewart_platform.workspace import WorkspaceMap
         from src.nunchuk.nunchuk import Nunchuk
 
         # Initialize the Stewart platform
@@ -80,6 +81,16 @@ class Nunchuk:
         use_accelerometer = self.use_accelerometer
         logger = logger or logging.getLogger("StewartPlatform.Circle")
 
+        # Reachable roll/pitch range of the controller, commands outside of it are saturated
+        workspace = WorkspaceMap(
+            platform,
+            roll=(-radius, radius, 101),
+            pitch=(-radius, radius, 101),
+            servo_arm_length=smh.servo_arm_length,
+            fix_leg_length=smh.fix_leg_length,
+            logger=logger
+        ).load_or_build()
+
         while True:
             if stop_event and stop_event.is_set():
                 return
@@ -104,11 +115,19 @@ class Nunchuk:
             else:
                 x_offset = radius / 128 * (nc.joy_x - 128)
                 y_offset = -(radius / 128 * (nc.joy_y - 128))
+
+            # Saturate the command to the reachable workspace
+            pose = workspace.clamp((0, 0, 62, x_offset, y_offset, 0))
+            if pose is None:
+                logger.error("Neutral pose is not reachable")
+                return
+
+            # Set the angle of the Stewart platform based on the Nunchuk values
+            # The workspace is a grid, a pose clamped to the edge of a cell can still be unreachable
             try:
-                # Set the angle of the Stewart platform based on the Nunchuk values
-                smh.set(platform, 0, 0, 62, x_offset, y_offset, 0)
-            except:
-                pass
+                smh.set(platform, *pose)
+            except (ValueError, OSError) as e:
+                logger.warning(f"Failed to set pose {pose}: {e}")
             
             # Sleep for the specified period
             time.sleep(period)
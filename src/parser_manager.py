@@ -10,12 +10,16 @@ class ParserManager:
     operations = [
         'set',
         'circle',
+        'workspace',
+        'benchmark_servo',
         'nunchuck',
         'ball_on_plate_pid',
         'ball_on_plate_rl',
         'train_ball_on_plate_rl',
         'video_capture_linux',
         'video_capture_windows',
+        'benchmark_encoder',
+        'capture_hub',
         'image_recorder'
     ]
 
@@ -119,8 +123,8 @@ class ParserManager:
             required=True,
             choices=self.operations,
             help='Specify the operation mode. '
-                'Available options: set, circle, nunchuck, ball_on_plate, '
-                'train_ball_on_plate, video_capture_linux, video_capture_windows.'
+                'Available options: set, circle, workspace, benchmark_servo, nunchuck, ball_on_plate, '
+                'train_ball_on_plate, video_capture_linux, video_capture_windows, benchmark_encoder, capture_hub.'
         )
         # Add an argument to set the logging level for the application
         parser.add_argument(
@@ -243,6 +247,18 @@ class ParserManager:
                 model.parser()
                 self.setup_logger()
                 model.run(self.logger)
+        elif self.operation == 'workspace':
+                from src.stewart_platform.task import Workspace
+                model = Workspace(self.base_radius, self.base_angle, self.platform_radius, self.platform_angle)
+                model.parser()
+                self.setup_logger()
+                model.run(self.logger)
+        elif self.operation == 'benchmark_servo':
+                from src.stewart_platform.task import BenchmarkServo
+                model = BenchmarkServo(self.base_radius, self.base_angle, self.platform_radius, self.platform_angle)
+                model.parser()
+                self.setup_logger()
+                model.run(self.logger)
         elif self.operation == 'nunchuck':
                 from src.nunchuk.task import Nunchuk
                 model = Nunchuk(self.base_radius, self.base_angle, self.platform_radius, self.platform_angle)
@@ -279,6 +295,18 @@ class ParserManager:
                 model.parse()
                 self.setup_logger()
                 model.run(self.logger)
+        elif self.operation == 'benchmark_encoder':
+                from src.video_capture.task import BenchmarkEncoder
+                model = BenchmarkEncoder()
+                model.parse()
+                self.setup_logger()
+                model.run(self.logger)
+        elif self.operation == 'capture_hub':
+                from src.video_capture.task import CaptureHubServer
+                model = CaptureHubServer()
+                model.parse()
+                self.setup_logger()
+                model.run(self.logger)
         elif self.operation == 'image_recorder':
                 from src.video_capture.recorder.task import ImageRecorder
                 model = ImageRecorder()
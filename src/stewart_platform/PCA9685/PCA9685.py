@@ -3,7 +3,8 @@
 import logging
 import time
 import math
-import smbus
+from src.i2c.bus import open_bus
+from src.stewart_platform.trace import tracer, I2C_WRITE, I2C_READ, I2C_BLOCK, PWM
 # import pygame
 
 # ============================================================================
@@ -28,23 +29,46 @@ class PCA9685:
   __ALLLED_OFF_L       = 0xFC
   __ALLLED_OFF_H       = 0xFD
 
+  # MODE1 bits
+  __RESTART            = 0x80
+  __AI                 = 0x20
 
-  def __init__(self, logger=None, address=0x40):
+  # Data bytes of one I2C block transfer
+  __BLOCK_SIZE         = 32
+
+
+  def __init__(self, logger=None, address=0x40, bus=None):
     self.logger = logger or logging.getLogger("StewartPlatform.PCA9685")
-    self.bus = smbus.SMBus(1)
+    self.bus = open_bus(bus)
     self.address = address
+
+    # Write-through shadow of the last LED_ON/LED_OFF values per channel
+    self.shadow = {}
+    # Number of channel writes sent to the bus and skipped because the values did not change
+    self.writes_issued = 0
+    self.writes_skipped = 0
     self.logger.debug("Reseting PCA9685")
     self.write(self.__MODE1, 0x00)
+    self.enableAutoIncrement()
+
+  def enableAutoIncrement(self):
+    "Enables the register auto-increment, needed for block writes of the LEDn registers"
+    mode = self.read(self.__MODE1)
+    self.write(self.__MODE1, (mode & ~self.__RESTART & 0xFF) | self.__AI)
 	
   def write(self, reg, value):
     "Writes an 8-bit value to the specified register/address"
     self.bus.write_byte_data(self.address, reg, value)
-    self.logger.debug("I2C: Write 0x%02X to register 0x%02X" % (value, reg))
+    if tracer.enabled:
+      tracer.record(I2C_WRITE, reg, value)
+    self.logger.debug("I2C: Write 0x%02X to register 0x%02X", value, reg)
 	  
   def read(self, reg):
     "Read an unsigned byte from the I2C device"
     result = self.bus.read_byte_data(self.address, reg)
-    self.logger.debug("I2C: Device 0x%02X returned 0x%02X from reg 0x%02X" % (self.address, result & 0xFF, reg))
+    if tracer.enabled:
+      tracer.record(I2C_READ, reg, result)
+    self.logger.debug("I2C: Device 0x%02X returned 0x%02X from reg 0x%02X", self.address, result & 0xFF, reg)
     return result
 	
   def setPWMFreq(self, freq):
@@ -53,10 +77,13 @@ class PCA9685:
     prescaleval /= 4096.0       # 12-bit
     prescaleval /= float(freq)
     prescaleval -= 1.0
-    self.logger.debug("Setting PWM frequency to %d Hz" % freq)
-    self.logger.debug("Estimated pre-scale: %d" % prescaleval)
+    self.logger.debug("Setting PWM frequency to %d Hz", freq)
+    self.logger.debug("Estimated pre-scale: %d", prescaleval)
     prescale = math.floor(prescaleval + 0.5)
-    self.logger.debug("Final pre-scale: %d" % prescale)
+    self.logger.debug("Final pre-scale: %d", prescale)
+
+    # The device may have been reset, write every channel again
+    self.invalidateShadow()
 
     oldmode = self.read(self.__MODE1)
     newmode = (oldmode & 0x7F) | 0x10        # sleep
@@ -67,14 +94,64 @@ class PCA9685:
     self.write(self.__MODE1, oldmode | 0x80)
     self.write(self.__MODE2, 0x04)
 
+  def invalidateShadow(self):
+    "Forgets the shadowed PWM values, the next write of every channel goes to the bus"
+    self.shadow.clear()
+
   def setPWM(self, channel, on, off):
     "Sets a single PWM channel"
+    if self.shadow.get(channel) == (on, off):
+      self.writes_skipped += 1
+      return
     self.write(self.__LED0_ON_L+4*channel, on & 0xFF)
     self.write(self.__LED0_ON_H+4*channel, on >> 8)
     self.write(self.__LED0_OFF_L+4*channel, off & 0xFF)
     self.write(self.__LED0_OFF_H+4*channel, off >> 8)
-    self.logger.debug("channel: %d  LED_ON: %d LED_OFF: %d" % (channel,on,off))
+    self.shadow[channel] = (on, off)
+    self.writes_issued += 1
+    if tracer.enabled:
+      tracer.record(PWM, channel, off, on)
+    self.logger.debug("channel: %d  LED_ON: %d LED_OFF: %d", channel, on, off)
 	  
+  def set_pwm_many(self, channels, on, off):
+    "Sets several PWM channels, contiguous channels are written in one block transfer"
+    count = len(channels)
+    on = on if isinstance(on, (list, tuple)) else [on] * count
+    off = off if isinstance(off, (list, tuple)) else [off] * count
+
+    # Skip channels whose values did not change
+    values = []
+    for channel, on_value, off_value in sorted(zip(channels, on, off)):
+      if self.shadow.get(channel) == (on_value, off_value):
+        self.writes_skipped += 1
+      else:
+        values.append((channel, on_value, off_value))
+    if not values:
+      return
+
+    # Split into runs of contiguous channels
+    runs = []
+    for channel, on_value, off_value in values:
+      if runs and channel == runs[-1][0] + len(runs[-1][1]) // 4 and len(runs[-1][1]) < self.__BLOCK_SIZE:
+        runs[-1][1].extend((on_value & 0xFF, on_value >> 8, off_value & 0xFF, off_value >> 8))
+      else:
+        runs.append((channel, [on_value & 0xFF, on_value >> 8, off_value & 0xFF, off_value >> 8]))
+
+    # One transaction per run, the register address increments after every byte
+    for channel, data in runs:
+      self.bus.write_i2c_block_data(self.address, self.__LED0_ON_L+4*channel, data)
+    for channel, on_value, off_value in values:
+      self.shadow[channel] = (on_value, off_value)
+    self.writes_issued += len(values)
+
+    if tracer.enabled:
+      for channel, data in runs:
+        tracer.record(I2C_BLOCK, self.__LED0_ON_L+4*channel, len(data))
+      for channel, on_value, off_value in values:
+        tracer.record(PWM, channel, off_value, on_value)
+    if self.logger.isEnabledFor(logging.DEBUG):
+      self.logger.debug("channels: %s  LED_ON: %s LED_OFF: %s (%d transactions)", [v[0] for v in values], [v[1] for v in values], [v[2] for v in values], len(runs))
+
   def setServoPulse(self, channel, pulse):
     "Sets the Servo Pulse,The PWM frequency must be 50HZ"
     pulse = pulse*4096/20000        #PWM frequency is 50HZ,the period is 20000us
@@ -87,6 +164,20 @@ class PCA9685:
     else:
         self.logger.error("Angle out of range")
     
+  def setRotationAngles(self, channels, Angles):
+    "Sets the rotation angles of several channels with block writes"
+    valid = []
+    offs = []
+    for channel, Angle in zip(channels, Angles):
+      if(Angle >= 0 and Angle <= 180):
+        pulse = Angle * (2000 / 180) + 501
+        valid.append(channel)
+        offs.append(int(pulse*4096/20000))
+      else:
+        self.logger.error("Angle out of range")
+    if valid:
+      self.set_pwm_many(valid, 0, offs)
+
   def exit_PCA9685(self):
     self.write(self.__MODE2, 0x00)
 
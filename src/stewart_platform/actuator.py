@@ -0,0 +1,136 @@
+from collections import deque
+import logging
+import threading
+import time
+import numpy as np
+
+from src.stewart_platform.ik_cache import IKCache
+from src.stewart_platform.servo_motor_handler import ServoMotorHandler
+from src.stewart_platform.stewart_platform import StewartPlatform
+
+class ActuatorWorker:
+    """
+    Thread that owns the servo motor handler and applies the latest commanded pose
+
+    Commands go into a single slot mailbox. A command that has not been applied yet is replaced by the next one,
+    so the control loop never blocks on I2C and stale poses are dropped instead of queued.
+    """
+
+    def __init__(self, smh: ServoMotorHandler, platform: StewartPlatform, ik_cache: IKCache = None, logger=None, latency_window: int = 1000):
+        """
+        Initialize and start the actuator thread
+
+        :param smh: servo motor handler, only used by the actuator thread afterwards
+        :param platform: Stewart Plattform used for the inverse kinematics
+        :param ik_cache: optional IK cache used by set_tilt
+        :param latency_window: number of latencies kept for the statistics
+        """
+        self.logger = logger or logging.getLogger("StewartPlatform.ActuatorWorker")
+        self.smh = smh
+        self.platform = platform
+        self.ik_cache = ik_cache
+
+        # Single slot mailbox with the latest command and its submit time
+        self.condition = threading.Condition()
+        self.pending = None
+        self.busy = False
+
+        # Statistics
+        self.commands_submitted = 0
+        self.commands_applied = 0
+        self.commands_dropped = 0
+        self.latencies = deque(maxlen=latency_window) # Submit until written to the bus (s)
+
+        self.running = True
+        self.thread = threading.Thread(target=self.update, daemon=True)
+        self.thread.start()
+
+    def set(self, x: float, y: float, z: float, alpha: float, beta: float, gamma: float):
+        """
+        Command a pose of the plattform, returns immediately
+        """
+        self._submit(("pose", (x, y, z, alpha, beta, gamma)))
+
+    def set_tilt(self, alpha: float, beta: float):
+        """
+        Command roll and pitch through the IK cache, returns immediately
+        """
+        if self.ik_cache is None:
+            raise ValueError("set_tilt needs an IK cache")
+        self._submit(("tilt", (alpha, beta)))
+
+    def _submit(self, command):
+        with self.condition:
+            if self.pending is not None:
+                self.commands_dropped += 1
+            self.pending = (command, time.monotonic())
+            self.commands_submitted += 1
+            self.condition.notify_all()
+
+    def update(self):
+        while True:
+            # Wait for the next command
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                (kind, args), submit_time = self.pending
+                self.pending = None
+                self.busy = True
+
+            latency = None
+            try:
+                if kind == "tilt":
+                    self.smh.set_tilt(self.platform, self.ik_cache, *args)
+                else:
+                    self.smh.set(self.platform, *args)
+            except Exception as e:
+                self.logger.error(f"Failed to set pose {args}: {e}")
+            else:
+                latency = time.monotonic() - submit_time
+
+            # The latencies are read by latency_stats in other threads
+            with self.condition:
+                if latency is not None:
+                    self.latencies.append(latency)
+                    self.commands_applied += 1
+                self.busy = False
+                self.condition.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until the latest command has been applied
+
+        :param timeout: maximum waiting time (s)
+        :return: True if no command is pending anymore
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.pending is None and not self.busy, timeout)
+
+    def latency_stats(self):
+        """
+        Statistics of the actuation latency from submit until written to the bus
+
+        :return: dictionary with the mean, median, 95th percentile and maximum latency (s) and the command counters
+        """
+        with self.condition:
+            latencies = np.array(list(self.latencies))
+            submitted = self.commands_submitted
+            applied = self.commands_applied
+            dropped = self.commands_dropped
+        return {
+            "mean": float(latencies.mean()) if latencies.size else 0.0,
+            "p50": float(np.percentile(latencies, 50)) if latencies.size else 0.0,
+            "p95": float(np.percentile(latencies, 95)) if latencies.size else 0.0,
+            "max": float(latencies.max()) if latencies.size else 0.0,
+            "submitted": submitted,
+            "applied": applied,
+            "dropped": dropped
+        }
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
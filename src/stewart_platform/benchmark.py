@@ -0,0 +1,136 @@
+import io
+import logging
+import math
+import time
+import numpy as np
+
+from src.i2c.bus import FakeI2CBus
+from src.stewart_platform.ik_cache import IKCache
+from src.stewart_platform.servo_motor_handler import ServoMotorHandler
+from src.stewart_platform.stewart_platform import StewartPlatform
+from src.stewart_platform.trace import tracer
+
+def _circle(iterations: int, radius: float = 3.0):
+    # Roll/pitch path like the circle test, every pose differs from the one before
+    angles = np.linspace(0, 2 * math.pi, iterations, endpoint=False)
+    return np.stack([radius * np.cos(angles), radius * np.sin(angles)], axis=1).tolist()
+
+def benchmark_servo_set(platform: StewartPlatform, frequency: int = 400000, transaction_overhead: float = 0.0, iterations: int = 500, z: float = 68, ik_cache: IKCache = None):
+    """
+    Measure the cost of the ServoMotorHandler.set variants on a fake I2C bus
+
+    :param platform: Stewart Plattform used for the inverse kinematics
+    :param frequency: frequency of the fake bus (Hz)
+    :param transaction_overhead: fixed time per transaction of the fake bus (s)
+    :param iterations: number of set calls per variant
+    :param z: height of the plattform (mm), high enough that all servo angles of the path are within the range of the handler
+    :param ik_cache: IK cache for the set_tilt variant, built if not given
+    :return: dictionary by variant with the time per call (s), the bus time per call (s) and the transactions per call
+    """
+    bus = FakeI2CBus(frequency=frequency, transaction_overhead=transaction_overhead)
+    smh = ServoMotorHandler(bus=bus)
+    if ik_cache is None:
+        ik_cache = IKCache(platform, z=z, max_angle=4.0, resolution=0.05, servo_arm_length=smh.servo_arm_length, fix_leg_length=smh.fix_leg_length)
+        ik_cache.build()
+    path = _circle(iterations)
+
+    def per_channel(roll, pitch):
+        # Register by register like before the block writes
+        smh.pwm.invalidateShadow()
+        leg_length_list = platform.calculate(0, 0, z, roll, pitch, 0)
+        angle_list = platform.getAngles(smh.servo_arm_length, smh.fix_leg_length, leg_length_list)
+        for index, angle in enumerate(angle_list):
+            smh.setRotationAngle(index, angle)
+
+    def block(roll, pitch):
+        smh.pwm.invalidateShadow()
+        smh.set(platform, 0, 0, z, roll, pitch, 0)
+
+    def changed_only(roll, pitch):
+        smh.set(platform, 0, 0, z, roll, pitch, 0)
+
+    def repeated(roll, pitch):
+        # Same command every tick, e.g. saturated controller output
+        smh.set(platform, 0, 0, z, 1.0, 1.0, 0)
+
+    def ik_cache_tilt(roll, pitch):
+        smh.set_tilt(platform, ik_cache, roll, pitch)
+
+    variants = {
+        "per_channel": per_channel,
+        "block": block,
+        "changed_only": changed_only,
+        "repeated": repeated,
+        "ik_cache": ik_cache_tilt
+    }
+
+    results = {}
+    for name, variant in variants.items():
+        smh.pwm.invalidateShadow()
+        bus.reset_counters()
+        start = time.perf_counter()
+        for roll, pitch in path:
+            variant(roll, pitch)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "time": elapsed / iterations,
+            "bus_time": bus.bus_time / iterations,
+            "transactions": bus.transactions / iterations
+        }
+    return results
+
+def benchmark_trace_overhead(platform: StewartPlatform, iterations: int = 2000, z: float = 68):
+    """
+    Measure the CPU time of one control tick with tracing off, with the tracer and with debug logging
+
+    The fake bus does not wait for the transactions, so only the cost of the Python code is measured.
+
+    :param platform: Stewart Plattform used for the inverse kinematics
+    :param iterations: number of set calls per mode
+    :param z: height of the plattform (mm)
+    :return: dictionary by mode with the time per call (s)
+    """
+    smh = ServoMotorHandler(bus=FakeI2CBus(realtime=False))
+    loggers = [smh.logger, smh.pwm.logger]
+    levels = [logger.level for logger in loggers]
+    path = _circle(iterations)
+
+    # Debug messages are formatted into memory instead of the console
+    handler = logging.StreamHandler(io.StringIO())
+
+    def run():
+        smh.pwm.invalidateShadow()
+        start = time.perf_counter()
+        for roll, pitch in path:
+            smh.set(platform, 0, 0, z, roll, pitch, 0)
+        return (time.perf_counter() - start) / iterations
+
+    results = {}
+    try:
+        for logger in loggers:
+            logger.setLevel(logging.INFO)
+        results["off"] = run()
+
+        tracer.clear()
+        tracer.enable()
+        results["tracer"] = run()
+        tracer.disable()
+        tracer.clear()
+
+        for logger in loggers:
+            logger.setLevel(logging.DEBUG)
+            logger.addHandler(handler)
+        results["debug_log"] = run()
+    finally:
+        for logger, level in zip(loggers, levels):
+            logger.setLevel(level)
+            logger.removeHandler(handler)
+    return results
+
+def log_results(results: dict, logger=None):
+    logger = logger or logging.getLogger("StewartPlatform.Benchmark")
+    for name, result in results.items():
+        if not isinstance(result, dict):
+            logger.info(f"{name:>14}: {result * 1e6:8.1f} µs per call")
+            continue
+        logger.info(f"{name:>14}: {result['time'] * 1e6:8.1f} µs per call, bus {result['bus_time'] * 1e6:8.1f} µs, {result['transactions']:5.1f} transactions")
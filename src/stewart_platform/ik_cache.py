@@ -0,0 +1,229 @@
+import hashlib
+import logging
+import os
+import numpy as np
+
+from src.stewart_platform.stewart_platform import StewartPlatform
+
+class IKCache:
+    """
+    Lookup table of servo angles over a roll/pitch grid for a fixed x, y, z and yaw
+
+    The table is precomputed with the batched inverse kinematics of the Stewart Plattform,
+    queries are answered by bilinear interpolation between the four surrounding grid points.
+    """
+
+    def __init__(self, platform: StewartPlatform, z: float = 62, max_angle: float = 4.0, resolution: float = 0.01, servo_arm_length: int = 15, fix_leg_length: int = 65, x: float = 0, y: float = 0, gamma: float = 0, logger=None):
+        """
+        Initialize the IK cache, the table is empty until build or load is called
+
+        :param platform: Stewart Plattform used for the inverse kinematics
+        :param z: height of the plattform (mm)
+        :param max_angle: roll and pitch are covered within -max_angle and max_angle (degree)
+        :param resolution: distance between two grid points (degree)
+        :param servo_arm_length: length of the servo arm (mm)
+        :param fix_leg_length: length of the fixed leg (mm)
+        :param x: x position of the plattform (mm)
+        :param y: y position of the plattform (mm)
+        :param gamma: yaw of the plattform (degree)
+        """
+        self.platform = platform
+        self.x = x
+        self.y = y
+        self.z = z
+        self.gamma = gamma
+        self.max_angle = max_angle
+        self.resolution = resolution
+        self.servo_arm_length = servo_arm_length
+        self.fix_leg_length = fix_leg_length
+        self.logger = logger or logging.getLogger("StewartPlatform.IKCache")
+
+        # Number of grid points per axis
+        self.size = int(round(2 * max_angle / resolution)) + 1
+
+        # Servo angles with shape (size, size, 6), index [roll, pitch]
+        self.table = None
+        # Mask with shape (size, size) of grid points where all legs are reachable
+        self.reachable = None
+
+    def key(self):
+        """
+        Key of the cache derived from the geometry of the plattform and the grid parameters
+
+        :return: hex digest identifying the table
+        """
+        h = hashlib.sha1()
+        h.update(np.round(self.platform.base_point_array, 9).tobytes())
+        h.update(np.round(self.platform.plattform_point_array, 9).tobytes())
+        params = (self.x, self.y, self.z, self.gamma, self.max_angle, self.resolution, self.servo_arm_length, self.fix_leg_length)
+        h.update(repr(tuple(float(p) for p in params)).encode())
+        return h.hexdigest()[:16]
+
+    def build(self):
+        """
+        Calculate the servo angles for every grid point
+        """
+        axis = np.linspace(-self.max_angle, self.max_angle, self.size)
+        self.table = np.empty((self.size, self.size, 6), dtype=np.float32)
+        self.reachable = np.empty((self.size, self.size), dtype=bool)
+
+        # One roll row at a time to keep the intermediate arrays small
+        poses = np.empty((self.size, 6))
+        poses[:, 0] = self.x
+        poses[:, 1] = self.y
+        poses[:, 2] = self.z
+        poses[:, 4] = axis
+        poses[:, 5] = self.gamma
+        for i, roll in enumerate(axis):
+            poses[:, 3] = roll
+            angles, valid = self.platform.inverse_kinematics_batch(poses, self.servo_arm_length, self.fix_leg_length)
+            self.table[i] = angles
+            self.reachable[i] = valid
+
+        self.logger.info(f"IK cache built with {self.size}x{self.size} grid points, {np.count_nonzero(self.reachable)} reachable")
+
+    def get_batch(self, roll, pitch):
+        """
+        Interpolate the servo angles for several roll/pitch pairs
+
+        :param roll: array of roll angles (degree)
+        :param pitch: array of pitch angles (degree)
+        :return: tuple of servo angles (degree) with shape (N, 6) and mask with shape (N,) of pairs inside the reachable grid
+        """
+        roll = np.atleast_1d(np.asarray(roll, dtype=np.float64))
+        pitch = np.atleast_1d(np.asarray(pitch, dtype=np.float64))
+
+        # Position in grid coordinates
+        fr = np.nan_to_num((roll + self.max_angle) / self.resolution, nan=-1.0)
+        fp = np.nan_to_num((pitch + self.max_angle) / self.resolution, nan=-1.0)
+        inside = (fr >= 0) & (fr <= self.size - 1) & (fp >= 0) & (fp <= self.size - 1)
+
+        # Lower corner of the cell, the last row/column uses the cell before it
+        i = np.clip(np.floor(fr), 0, self.size - 2).astype(np.intp)
+        j = np.clip(np.floor(fp), 0, self.size - 2).astype(np.intp)
+        tr = np.clip(fr - i, 0, 1)[:, None]
+        tp = np.clip(fp - j, 0, 1)[:, None]
+
+        angles = (
+            self.table[i, j] * (1 - tr) * (1 - tp) +
+            self.table[i + 1, j] * tr * (1 - tp) +
+            self.table[i, j + 1] * (1 - tr) * tp +
+            self.table[i + 1, j + 1] * tr * tp
+        )
+
+        # All four corners must be reachable
+        valid = inside & self.reachable[i, j] & self.reachable[i + 1, j] & self.reachable[i, j + 1] & self.reachable[i + 1, j + 1]
+        angles[~valid] = np.nan
+
+        return angles, valid
+
+    def get(self, roll: float, pitch: float):
+        """
+        Interpolate the servo angles for one roll/pitch pair
+
+        :param roll: roll angle (degree)
+        :param pitch: pitch angle (degree)
+        :return: list of servo angles (degree) or None if the pair is outside the reachable grid
+        """
+        fr = (roll + self.max_angle) / self.resolution
+        fp = (pitch + self.max_angle) / self.resolution
+        if not (0 <= fr <= self.size - 1 and 0 <= fp <= self.size - 1):
+            return None
+
+        i = min(int(fr), self.size - 2)
+        j = min(int(fp), self.size - 2)
+        if not (self.reachable[i, j] and self.reachable[i + 1, j] and self.reachable[i, j + 1] and self.reachable[i + 1, j + 1]):
+            return None
+
+        tr = fr - i
+        tp = fp - j
+        cell = self.table[i:i + 2, j:j + 2]
+        angles = (
+            cell[0, 0] * ((1 - tr) * (1 - tp)) +
+            cell[1, 0] * (tr * (1 - tp)) +
+            cell[0, 1] * ((1 - tr) * tp) +
+            cell[1, 1] * (tr * tp)
+        )
+        return angles.tolist()
+
+    def error_report(self, samples: int = 10000, seed: int = 0):
+        """
+        Compare the interpolated angles with the exact inverse kinematics
+
+        Half of the samples lie in the middle of grid cells, where the interpolation error is the largest,
+        the other half is drawn uniformly over the grid.
+
+        :param samples: number of roll/pitch pairs to compare
+        :param seed: seed of the random generator
+        :return: dictionary with the maximum and mean absolute error (degree) and the number of compared samples
+        """
+        rng = np.random.default_rng(seed)
+        half = samples // 2
+        cells = rng.integers(0, self.size - 1, size=(half, 2))
+        centers = (cells + 0.5) * self.resolution - self.max_angle
+        uniform = rng.uniform(-self.max_angle, self.max_angle, size=(samples - half, 2))
+        roll, pitch = np.concatenate([centers, uniform]).T
+
+        angles, valid = self.get_batch(roll, pitch)
+
+        poses = np.zeros((len(roll), 6))
+        poses[:, 0] = self.x
+        poses[:, 1] = self.y
+        poses[:, 2] = self.z
+        poses[:, 3] = roll
+        poses[:, 4] = pitch
+        poses[:, 5] = self.gamma
+        exact, exact_valid = self.platform.inverse_kinematics_batch(poses, self.servo_arm_length, self.fix_leg_length)
+
+        compared = valid & exact_valid
+        error = np.abs(angles[compared] - exact[compared])
+        return {
+            "max_error": float(error.max()) if error.size else 0.0,
+            "mean_error": float(error.mean()) if error.size else 0.0,
+            "samples": int(np.count_nonzero(compared))
+        }
+
+    def save(self, file_path: str):
+        """
+        Save the table to disk
+
+        :param file_path: path of the .npz file
+        """
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        np.savez_compressed(file_path, key=self.key(), table=self.table, reachable=self.reachable)
+        self.logger.info(f"IK cache saved to {file_path}")
+
+    def load(self, file_path: str) -> bool:
+        """
+        Load the table from disk if it was built for the same geometry and grid
+
+        :param file_path: path of the .npz file
+        :return: True if the table was loaded
+        """
+        if not os.path.exists(file_path):
+            return False
+
+        with np.load(file_path) as data:
+            if str(data["key"]) != self.key():
+                self.logger.warning(f"IK cache {file_path} does not match the current geometry")
+                return False
+            self.table = data["table"]
+            self.reachable = data["reachable"]
+
+        self.logger.info(f"IK cache loaded from {file_path}")
+        return True
+
+    def load_or_build(self, cache_dir: str = "./cache/ik"):
+        """
+        Load the table from the cache directory or build and save it
+
+        :param cache_dir: directory with the cached tables, the file name is the key of the cache
+        :return: the IK cache itself
+        """
+        file_path = os.path.join(cache_dir, f"{self.key()}.npz")
+        if not self.load(file_path):
+            self.build()
+            report = self.error_report()
+            self.logger.info(f"IK cache interpolation error: max {report['max_error']:.5f}°, mean {report['mean_error']:.5f}° over {report['samples']} samples")
+            self.save(file_path)
+        return self
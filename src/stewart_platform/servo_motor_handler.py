@@ -1,13 +1,19 @@
 import logging
 from src.stewart_platform.PCA9685.PCA9685 import PCA9685
+from src.stewart_platform.ik_cache import IKCache
 from src.stewart_platform.stewart_platform import StewartPlatform
+from src.stewart_platform.trace import tracer, LEG, ANGLE
 
 class ServoMotorHandler:
-    def __init__(self, logger=None) -> None:
+    def __init__(self, logger=None, bus=None) -> None:
         self.logger = logger or logging.getLogger("ServoMotorHandler")
-        self.pwm = PCA9685()
+        self.pwm = PCA9685(bus=bus)
         self.pwm.setPWMFreq(50)
 
+    # Length of the servo arm and of the fixed leg (mm)
+    servo_arm_length = 15
+    fix_leg_length = 65
+
     # Standard deviation for each angle so that the r-axis is horizontal
     # servo: angle deviation
     deviation = {
@@ -22,16 +28,52 @@ class ServoMotorHandler:
     def set(self, platform: StewartPlatform, x: float, y: float, z: float, alpha: float, beta: float, gamma: float):
             leg_length_list = platform.calculate(x, y, z, alpha, beta, gamma)
             if leg_length_list != None:
-                for index, leg_length in enumerate(leg_length_list):
-                    self.logger.debug(f"length of leg {index}: {leg_length}")
+                if tracer.enabled:
+                    for index, leg_length in enumerate(leg_length_list):
+                        tracer.record(LEG, index, 0, leg_length)
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    for index, leg_length in enumerate(leg_length_list):
+                        self.logger.debug("length of leg %d: %s", index, leg_length)
+
+            angle_list = platform.getAngles(self.servo_arm_length, self.fix_leg_length, leg_length_list)
+            self.set_angles(angle_list)
+
+    # Set roll and pitch from the IK cache, poses outside the cached grid fall back to the full calculation
+    def set_tilt(self, platform: StewartPlatform, ik_cache: IKCache, alpha: float, beta: float):
+            angle_list = ik_cache.get(alpha, beta)
+            if angle_list is None:
+                self.set(platform, ik_cache.x, ik_cache.y, ik_cache.z, alpha, beta, ik_cache.gamma)
+            else:
+                self.set_angles(angle_list)
+
+    # Set the servo angles directly, e.g. from a precomputed trajectory
+    def set_angles(self, angle_list):
+            if tracer.enabled:
+                for index, angle in enumerate(angle_list):
+                    tracer.record(ANGLE, index, 0, angle)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                for index, angle in enumerate(angle_list):
+                    self.logger.debug("angle of servo %d: %s", index, angle)
 
-            angle_list = platform.getAngles(15, 65, leg_length_list)
+            channels = []
+            angles = []
             for index, angle in enumerate(angle_list):
-                self.logger.debug(f"angle of servo {index}: {angle}")
-                self.setRotationAngle(index, angle)
+                temp = self.toServoAngle(index, angle)
+                if temp is not None:
+                    channels.append(index)
+                    angles.append(temp)
+
+            # Write all servos in one bulk transfer
+            self.pwm.setRotationAngles(channels, angles)
 
     # Set the rotation angle for the Steward Plattform (between: -45 and 45)
     def setRotationAngle(self, servo, angle, logger=None):
+        temp = self.toServoAngle(servo, angle)
+        if temp is not None:
+            self.pwm.setRotationAngle(servo, temp)
+
+    # Transform the angle of the Steward Plattform to the angle of the servo
+    def toServoAngle(self, servo, angle):
         # min = 921
         # max = 1780
         # mean = max - (min / 2)
@@ -41,6 +83,7 @@ class ServoMotorHandler:
             temp += (self.deviation[servo] if servo % 2 == 0 else -self.deviation[servo]) # Add angle deviation
             temp += 90 # Transform to normal angle
             # print(temp)
-            self.pwm.setRotationAngle(servo, temp)
+            return temp
         else:
-            self.logger.error("Angle out of range")
\ No newline at end of file
+            self.logger.error("Angle out of range")
+            return None
@@ -39,6 +39,10 @@ class StewartPlatform:
             # print("Pi: ", Pi)
         self.plattform_points = plattform_points
 
+        # Points as (6, 3) arrays for the batch calculation
+        self.base_point_array = np.array(base_points, dtype=np.float64)
+        self.plattform_point_array = np.array(plattform_points, dtype=np.float64)
+
         self.logger = logger or logging.getLogger("StewartPlatform.StewartPlatform")
 
     def calculate(self, x: float, y: float, z: float, alpha: float, beta: float, gamma: float):
@@ -98,7 +102,7 @@ class StewartPlatform:
         # R = Rz @ Ry @ Rx
         R = np.dot(Rz, np.dot(Ry, Rx))
         if self.debug:
-            self.logger.debug("rotation matrix: \n", R, "\n")
+            self.logger.debug("rotation matrix: \n%s\n", R)
 
         # transform plattform points
         Pb = []
@@ -107,7 +111,7 @@ class StewartPlatform:
             Pb.append(np.dot(R, self.plattform_points[i]) + t)
         
         if self.debug:
-            self.logger.debug("plattform points: \n", Pb, "\n")
+            self.logger.debug("plattform points: \n%s\n", Pb)
 
         # calculate leg length
         v = []
@@ -123,6 +127,67 @@ class StewartPlatform:
             l.append(np.linalg.norm(v[i]))
 
         return l
+
+    def calculate_batch(self, poses: np.ndarray):
+        """
+        Calculate the length of each leg of the Stewart Plattform for a batch of poses
+
+        All legs of all poses are calculated at once with array operations. Instead of
+        logging and returning None, poses outside the allowed range are reported in the
+        validity mask and their leg lengths are NaN.
+
+        :param poses: array of shape (N, 6) with x, y, z (mm) and alpha, beta, gamma (degree) per pose
+        :return: tuple of leg lengths with shape (N, 6) and validity mask with shape (N,)
+        """
+        poses = np.asarray(poses, dtype=np.float64).reshape(-1, 6)
+        x, y, z, alpha, beta, gamma = poses.T
+
+        # Same range checks as calculate
+        valid = (
+            (x >= 0) & (y >= 0) & (z >= 0) &
+            (x <= 200) & (y <= 200) & (z <= 200) &
+            (np.abs(alpha) <= 45) & (np.abs(beta) <= 45) & (np.abs(gamma) <= 45)
+        )
+
+        alpha = np.radians(alpha)
+        beta = np.radians(beta)
+        gamma = np.radians(gamma)
+
+        n = poses.shape[0]
+        ones = np.ones(n)
+        zeros = np.zeros(n)
+
+        # Calculate rotation matrices with shape (N, 3, 3)
+        # roll
+        Rx = np.stack([
+            np.stack([ones, zeros, zeros], axis=1),
+            np.stack([zeros, np.cos(alpha), -np.sin(alpha)], axis=1),
+            np.stack([zeros, np.sin(alpha), np.cos(alpha)], axis=1)
+        ], axis=1)
+        # pitch
+        Ry = np.stack([
+            np.stack([np.cos(beta), zeros, np.sin(beta)], axis=1),
+            np.stack([zeros, ones, zeros], axis=1),
+            np.stack([-np.sin(beta), zeros, np.cos(beta)], axis=1)
+        ], axis=1)
+        # yaw
+        Rz = np.stack([
+            np.stack([np.cos(gamma), -np.sin(gamma), zeros], axis=1),
+            np.stack([np.sin(gamma), np.cos(gamma), zeros], axis=1),
+            np.stack([zeros, zeros, ones], axis=1)
+        ], axis=1)
+
+        # R = Rz @ Ry @ Rx
+        R = Rz @ Ry @ Rx
+
+        # transform plattform points of all poses, shape (N, 6, 3)
+        Pb = np.einsum('nij,lj->nli', R, self.plattform_point_array) + poses[:, None, :3]
+
+        # calculate leg length
+        lengths = np.linalg.norm(Pb - self.base_point_array, axis=2)
+        lengths[~valid] = np.nan
+
+        return lengths, valid
     
     def getAngles(self, servo_arm_length: int, fix_leg_length: int, leg_length_list: list):
         """
@@ -161,3 +226,44 @@ class StewartPlatform:
         
         # return a list of all angels
         return angles
+
+    def get_angles_batch(self, servo_arm_length: int, fix_leg_length: int, leg_lengths: np.ndarray):
+        """
+        Calculate the servo angles for a batch of leg lengths
+
+        Unlike getAngles no exception is raised for unreachable legs, their angle is NaN
+        and they are marked in the returned mask.
+
+        :param servo_arm_length: length of the servo arm (mm)
+        :param fix_leg_length: length of the fixed leg (mm)
+        :param leg_lengths: array of shape (N, 6) with leg lengths (mm)
+        :return: tuple of servo angles (degree) with shape (N, 6) and reachable mask with shape (N, 6)
+        """
+        r = servo_arm_length
+        l = fix_leg_length
+        L = np.asarray(leg_lengths, dtype=np.float64)
+
+        # Leg length within the value range (NaN lengths are never reachable)
+        reachable = (abs(r - l) <= L) & (L <= (r + l))
+
+        # Calculate cos_theta for all legs, ignore the warnings of unreachable legs
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_theta = (r * r + L * L - l * l) / (2 * r * L)
+        reachable &= (cos_theta >= -1) & (cos_theta <= 1)
+
+        angles = np.full(L.shape, np.nan)
+        angles[reachable] = np.degrees(np.arccos(cos_theta[reachable]))
+        return angles, reachable
+
+    def inverse_kinematics_batch(self, poses: np.ndarray, servo_arm_length: int, fix_leg_length: int):
+        """
+        Calculate the servo angles for a whole trajectory of poses at once
+
+        :param poses: array of shape (N, 6) with x, y, z (mm) and alpha, beta, gamma (degree) per pose
+        :param servo_arm_length: length of the servo arm (mm)
+        :param fix_leg_length: length of the fixed leg (mm)
+        :return: tuple of servo angles (degree) with shape (N, 6) and mask with shape (N,) of poses where all legs are reachable
+        """
+        lengths, valid = self.calculate_batch(poses)
+        angles, reachable = self.get_angles_batch(servo_arm_length, fix_leg_length, lengths)
+        return angles, valid & reachable.all(axis=1)
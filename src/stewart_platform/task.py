@@ -198,18 +198,22 @@ class Circle:
             # Start the circular motion test
             angles = np.linspace(0, 2 * math.pi, int(steps))
 
+            # Precompute the servo angles of the whole path in one call
+            poses = np.zeros((len(angles), 6))
+            poses[:, 2] = 62
+            poses[:, 3] = radius * np.cos(angles)
+            poses[:, 4] = radius * np.sin(angles)
+            servo_angles, reachable = platform.inverse_kinematics_batch(poses, smh.servo_arm_length, smh.fix_leg_length)
+            if not reachable.all():
+                logger.warning(f"Skip {np.count_nonzero(~reachable)} unreachable poses of the circle (radius: {radius})")
+            servo_angles = servo_angles[reachable]
+
             # Set the radius of the circle
             while True:
-                for theta in angles:
+                for angle_list in servo_angles:
                     if stop_event and stop_event.is_set():
                         return
-                    x_offset = radius * math.cos(theta)
-                    # x_offset = 0
-                    # x_offset = np.random.uniform(-10, 10)
-                    y_offset = radius * math.sin(theta)
-                    # y_offset = 0
-                    # y_offset = np.random.uniform(-10, 10)
-                    smh.set(platform, 0, 0, 62, x_offset, y_offset, 0)
+                    smh.set_angles(angle_list)
                     time.sleep(period)
 
         # If smooth is not selected, use the old method
@@ -280,4 +284,167 @@ class Circle:
                         return
                     smh.set(platform, 0, 0, 62, i, -radius, 0)
                     time.sleep(period)
-        
\ No newline at end of file
+        
+class Workspace:
+    """
+    Generate the reachability map of the Stewart platform.
+    """
+
+    def __init__(self, base_radius: int, base_angle: list, platform_radius: int, platform_angle: list):
+        self.base_radius = base_radius
+        self.base_angle = base_angle
+        self.platform_radius = platform_radius
+        self.platform_angle = platform_angle
+
+    def parser(self, parser=None):
+        parser = argparse.ArgumentParser(
+            parents=[parser] if parser else [],
+            prog='Workspace',
+            usage='%(prog)s [options]',
+            description='Generate the reachability map of the Stewart platform. '
+                'Every axis is either fixed to one value or swept with LOW HIGH STEPS.',
+            epilog='Example: %(prog)s -z 62 -roll -15 15 61 -pitch -15 15 61',
+        )
+        for axis, default in (('x', [0]), ('y', [0]), ('z', [62]), ('roll', [-15, 15, 61]), ('pitch', [-15, 15, 61]), ('yaw', [0])):
+            parser.add_argument(
+                f'-{axis}',
+                help=f'Fixed value or LOW HIGH STEPS of the {axis} axis',
+                required=False,
+                type=float,
+                nargs='+',
+                default=default
+            )
+        parser.add_argument(
+            '--cache_dir',
+            help='Directory of the reachability maps',
+            required=False,
+            type=str,
+            default='./cache/workspace'
+        )
+
+        self.args, _ = parser.parse_known_args()
+        self.axes = {axis: self._axis(getattr(self.args, axis)) for axis in ('x', 'y', 'z', 'roll', 'pitch', 'yaw')}
+        self.cache_dir = self.args.cache_dir
+
+    @staticmethod
+    def _axis(values):
+        if len(values) == 1:
+            return values[0]
+        if len(values) == 3:
+            return (values[0], values[1], int(values[2]))
+        raise ValueError("An axis takes either one value or LOW HIGH STEPS")
+
+    def manual(self, axes: dict, cache_dir='./cache/workspace'):
+        self.axes = axes
+        self.cache_dir = cache_dir
+
+    def run(self, logger):
+        from src.stewart_platform.stewart_platform import StewartPlatform
+        from src.stewart_platform.workspace import WorkspaceMap
+
+        # Get or set the logger
+        logger = logger or logging.getLogger("StewartPlatform.Workspace")
+
+        # Initialize the stewart platform
+        platform = StewartPlatform(self.base_radius, self.base_angle, self.platform_radius, self.platform_angle)
+
+        # Sweep the pose space and save the map
+        workspace = WorkspaceMap(
+            platform,
+            **self.axes,
+            logger=logger
+        ).load_or_build(self.cache_dir)
+
+        # Report the reachable range of every swept axis
+        volume = workspace.volume
+        for axis, name in enumerate(('x', 'y', 'z', 'roll', 'pitch', 'yaw')):
+            if workspace.shape[axis] == 1:
+                continue
+            other = tuple(i for i in range(6) if i != axis)
+            reachable = np.flatnonzero(volume.any(axis=other))
+            if reachable.size == 0:
+                logger.info(f"{name}: not reachable")
+                continue
+            low = workspace.low[axis] + reachable[0] * workspace.spacing[axis]
+            high = workspace.low[axis] + reachable[-1] * workspace.spacing[axis]
+            logger.info(f"{name}: reachable between {low:g} and {high:g}")
+
+class BenchmarkServo:
+    """
+    Benchmark the servo motor handler on a fake I2C bus.
+    """
+
+    def __init__(self, base_radius: int, base_angle: list, platform_radius: int, platform_angle: list):
+        self.base_radius = base_radius
+        self.base_angle = base_angle
+        self.platform_radius = platform_radius
+        self.platform_angle = platform_angle
+
+    def parser(self, parser=None):
+        parser = argparse.ArgumentParser(
+            parents=[parser] if parser else [],
+            prog='BenchmarkServo',
+            usage='%(prog)s [options]',
+            description='Benchmark the servo motor handler on a fake I2C bus.',
+            epilog='Example: %(prog)s --frequency 100000 400000 --iterations 500',
+        )
+        parser.add_argument(
+            '--frequency',
+            help='Frequencies of the fake I2C bus (Hz)',
+            required=False,
+            type=int,
+            nargs='+',
+            default=[100000, 400000]
+        )
+        parser.add_argument(
+            '--transaction_overhead',
+            help='Fixed time per I2C transaction (s)',
+            required=False,
+            type=float,
+            default=0.0
+        )
+        parser.add_argument(
+            '--iterations',
+            help='Number of set calls per variant',
+            required=False,
+            type=int,
+            default=500
+        )
+        parser.add_argument(
+            '--trace_overhead',
+            help='Also measure the overhead of the tracer and of debug logging',
+            required=False,
+            action='store_true',
+            default=False,
+        )
+
+        self.args, _ = parser.parse_known_args()
+        self.frequency = self.args.frequency
+        self.transaction_overhead = self.args.transaction_overhead
+        self.iterations = self.args.iterations
+        self.trace_overhead = self.args.trace_overhead
+
+    def manual(self, frequency, transaction_overhead, iterations, trace_overhead=False):
+        self.frequency = frequency
+        self.transaction_overhead = transaction_overhead
+        self.iterations = iterations
+        self.trace_overhead = trace_overhead
+
+    def run(self, logger):
+        from src.stewart_platform.stewart_platform import StewartPlatform
+        from src.stewart_platform.benchmark import benchmark_servo_set, benchmark_trace_overhead, log_results
+
+        # Get or set the logger
+        logger = logger or logging.getLogger("StewartPlatform.BenchmarkServo")
+
+        # Initialize the stewart platform
+        platform = StewartPlatform(self.base_radius, self.base_angle, self.platform_radius, self.platform_angle)
+
+        for frequency in self.frequency:
+            logger.info(f"I2C bus with {frequency} Hz:")
+            results = benchmark_servo_set(platform, frequency, self.transaction_overhead, self.iterations)
+            log_results(results, logger)
+
+        if self.trace_overhead:
+            logger.info("Tracing overhead per control tick:")
+            log_results(benchmark_trace_overhead(platform, self.iterations), logger)
@@ -0,0 +1,81 @@
+import time
+import numpy as np
+
+# Event codes
+I2C_WRITE = 1 # a: register, b: value
+I2C_READ = 2 # a: register, b: value
+I2C_BLOCK = 3 # a: first register, b: number of bytes
+PWM = 4 # a: channel, b: off count, value: on count
+LEG = 5 # a: leg, value: length (mm)
+ANGLE = 6 # a: servo, value: angle (degree)
+
+EVENT_NAMES = {
+    I2C_WRITE: "i2c_write",
+    I2C_READ: "i2c_read",
+    I2C_BLOCK: "i2c_block",
+    PWM: "pwm",
+    LEG: "leg",
+    ANGLE: "angle"
+}
+
+# Layout of dumped events
+EVENT_DTYPE = np.dtype([("time", "f8"), ("event", "u1"), ("a", "i4"), ("b", "i4"), ("value", "f8")])
+
+class Tracer:
+    """
+    Ring buffer of fixed size events for the hot paths of the servo control
+
+    Callers check the enabled flag before recording, so a disabled tracer costs one attribute lookup.
+    The buffer keeps the latest events and is only formatted when it is dumped.
+    """
+
+    def __init__(self, capacity: int = 65536):
+        self.enabled = False
+        self.capacity = capacity
+        self.buffer = [None] * capacity
+        self.count = 0 # Number of recorded events since the last clear
+
+    def enable(self, capacity: int = None):
+        if capacity is not None and capacity != self.capacity:
+            self.capacity = capacity
+            self.buffer = [None] * capacity
+            self.count = 0
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.buffer = [None] * self.capacity
+        self.count = 0
+
+    def record(self, event: int, a: int = 0, b: int = 0, value: float = 0.0):
+        count = self.count
+        self.buffer[count % self.capacity] = (time.perf_counter(), event, a, b, value)
+        self.count = count + 1
+
+    def dump(self, file_path: str = None, logger=None):
+        """
+        Get the buffered events in chronological order
+
+        :param file_path: optional .npy file to save the events to
+        :param logger: optional logger to write the events to
+        :return: structured array with the fields time, event, a, b and value
+        """
+        count = self.count
+        if count <= self.capacity:
+            events = self.buffer[:count]
+        else:
+            start = count % self.capacity
+            events = self.buffer[start:] + self.buffer[:start]
+        events = np.array([e for e in events if e is not None], dtype=EVENT_DTYPE)
+
+        if file_path:
+            np.save(file_path, events)
+        if logger:
+            for e in events:
+                logger.info("%.6f %s a=%d b=%d value=%g", e["time"], EVENT_NAMES.get(int(e["event"]), e["event"]), e["a"], e["b"], e["value"])
+        return events
+
+# Tracer shared by the PCA9685, the servo motor handler and the Stewart Plattform
+tracer = Tracer()
@@ -0,0 +1,219 @@
+import hashlib
+import logging
+import os
+import numpy as np
+
+from src.stewart_platform.stewart_platform import StewartPlatform
+
+# Order of the pose axes
+AXES = ("x", "y", "z", "roll", "pitch", "yaw")
+
+# Neutral pose of the plattform, the clamp saturates commands towards it
+NEUTRAL_POSE = (0, 0, 62, 0, 0, 0)
+
+class WorkspaceMap:
+    """
+    Reachability volume of the Stewart Plattform over a grid of poses
+
+    Every axis of the pose is either fixed to one value or swept from low to high in a number of steps,
+    so the map can cover the whole 6-DOF pose space or only chosen slices of it.
+    """
+
+    def __init__(self, platform: StewartPlatform, x=0, y=0, z=62, roll=(-15, 15, 61), pitch=(-15, 15, 61), yaw=0, servo_arm_length: int = 15, fix_leg_length: int = 65, logger=None):
+        """
+        Initialize the workspace map, the volume is empty until build or load is called
+
+        :param platform: Stewart Plattform used for the inverse kinematics
+        :param x: fixed x position or tuple of (low, high, steps) (mm)
+        :param y: fixed y position or tuple of (low, high, steps) (mm)
+        :param z: fixed z position or tuple of (low, high, steps) (mm)
+        :param roll: fixed roll or tuple of (low, high, steps) (degree)
+        :param pitch: fixed pitch or tuple of (low, high, steps) (degree)
+        :param yaw: fixed yaw or tuple of (low, high, steps) (degree)
+        :param servo_arm_length: length of the servo arm (mm)
+        :param fix_leg_length: length of the fixed leg (mm)
+        """
+        self.platform = platform
+        self.servo_arm_length = servo_arm_length
+        self.fix_leg_length = fix_leg_length
+        self.logger = logger or logging.getLogger("StewartPlatform.WorkspaceMap")
+
+        # Low, high and number of grid points per axis
+        low, high, steps = [], [], []
+        for name, axis in zip(AXES, (x, y, z, roll, pitch, yaw)):
+            if np.ndim(axis) == 0:
+                axis = (axis, axis, 1)
+            if len(axis) != 3 or int(axis[2]) < 1 or (int(axis[2]) > 1 and axis[1] <= axis[0]):
+                raise ValueError(f"Axis {name} must be a number or a tuple of (low, high, steps)")
+            low.append(float(axis[0]))
+            high.append(float(axis[1]) if int(axis[2]) > 1 else float(axis[0]))
+            steps.append(int(axis[2]))
+        self.low = np.array(low)
+        self.high = np.array(high)
+        self.shape = tuple(steps)
+
+        # Distance between two grid points per axis, fixed axes use 1 to avoid a division by zero
+        self.spacing = np.where(
+            np.array(steps) > 1,
+            (self.high - self.low) / np.maximum(np.array(steps) - 1, 1),
+            1.0
+        )
+
+        # Reachability mask with the shape of the grid
+        self.volume = None
+
+    def key(self):
+        """
+        Key of the map derived from the geometry of the plattform and the grid
+
+        :return: hex digest identifying the volume
+        """
+        h = hashlib.sha1()
+        h.update(np.round(self.platform.base_point_array, 9).tobytes())
+        h.update(np.round(self.platform.plattform_point_array, 9).tobytes())
+        h.update(self.low.tobytes())
+        h.update(self.high.tobytes())
+        h.update(repr((self.shape, float(self.servo_arm_length), float(self.fix_leg_length))).encode())
+        return h.hexdigest()[:16]
+
+    def grid_poses(self, flat_index: np.ndarray):
+        """
+        Poses of grid points
+
+        :param flat_index: array of flat grid indices
+        :return: array of poses with shape (N, 6)
+        """
+        index = np.stack(np.unravel_index(flat_index, self.shape), axis=1)
+        return self.low + index * self.spacing
+
+    def build(self, chunk_size: int = 65536):
+        """
+        Sweep the grid with the batched inverse kinematics
+
+        :param chunk_size: number of poses calculated at once
+        """
+        total = int(np.prod(self.shape))
+        volume = np.empty(total, dtype=bool)
+        for start in range(0, total, chunk_size):
+            flat_index = np.arange(start, min(start + chunk_size, total))
+            _, valid = self.platform.inverse_kinematics_batch(self.grid_poses(flat_index), self.servo_arm_length, self.fix_leg_length)
+            volume[flat_index] = valid
+        self.volume = volume.reshape(self.shape)
+
+        self.logger.info(f"Workspace map built with {total} poses, {np.count_nonzero(volume)} reachable ({np.count_nonzero(volume) / total:.1%})")
+
+    def is_reachable_batch(self, poses):
+        """
+        Check several poses against the map
+
+        A pose counts as reachable if all grid points of the cell around it are reachable.
+        Poses outside the grid or off a fixed axis are not reachable.
+
+        :param poses: array of shape (N, 6) with x, y, z (mm) and roll, pitch, yaw (degree) per pose
+        :return: mask with shape (N,)
+        """
+        poses = np.asarray(poses, dtype=np.float64).reshape(-1, 6)
+        swept = np.array(self.shape) > 1
+
+        # Position in grid coordinates
+        f = np.nan_to_num((poses - self.low) / self.spacing, nan=-1.0)
+        inside = np.all((f >= -1e-9) & (f <= np.array(self.shape) - 1 + 1e-9), axis=1)
+        inside &= np.all(swept | (np.abs(poses - self.low) <= 1e-9), axis=1)
+
+        # Lower corner of the cell, the last grid point uses the cell before it
+        lower = np.clip(np.floor(f), 0, np.maximum(np.array(self.shape) - 2, 0)).astype(np.intp)
+
+        # Check every corner of the cell along the swept axes
+        reachable = inside.copy()
+        swept_axes = np.flatnonzero(swept)
+        for corner in range(2 ** len(swept_axes)):
+            index = lower.copy()
+            for bit, axis in enumerate(swept_axes):
+                index[:, axis] += (corner >> bit) & 1
+            reachable &= self.volume[tuple(index.T)]
+        return reachable
+
+    def is_reachable(self, pose) -> bool:
+        """
+        Check one pose against the map
+
+        :param pose: x, y, z (mm) and roll, pitch, yaw (degree)
+        :return: True if the pose is reachable
+        """
+        return bool(self.is_reachable_batch(pose)[0])
+
+    def clamp(self, pose, center=NEUTRAL_POSE, steps: int = 64):
+        """
+        Saturate a pose to the reachable workspace
+
+        Unreachable poses are moved along the line to the center pose, so the direction of the command is kept.
+
+        :param pose: x, y, z (mm) and roll, pitch, yaw (degree)
+        :param center: reachable pose to move towards
+        :param steps: number of candidates on the line
+        :return: the pose itself if it is reachable, otherwise the reachable pose closest to it on the line, or None if the center is not reachable
+        """
+        pose = np.asarray(pose, dtype=np.float64)
+        if self.is_reachable(pose):
+            return pose
+
+        # Check all candidates on the line at once, from the center to the pose
+        center = np.asarray(center, dtype=np.float64)
+        t = np.linspace(0, 1, steps + 1)
+        reachable = self.is_reachable_batch(center + t[:, None] * (pose - center))
+        if not reachable[0]:
+            return None
+
+        # Last candidate before the first unreachable one
+        last = np.argmin(reachable) - 1
+        return center + t[last] * (pose - center)
+
+    def save(self, file_path: str):
+        """
+        Save the volume as bit mask to disk
+
+        :param file_path: path of the .npz file
+        """
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        np.savez_compressed(
+            file_path,
+            key=self.key(),
+            low=self.low,
+            high=self.high,
+            shape=np.array(self.shape),
+            volume=np.packbits(self.volume.ravel())
+        )
+        self.logger.info(f"Workspace map saved to {file_path}")
+
+    def load(self, file_path: str) -> bool:
+        """
+        Load the volume from disk if it was built for the same geometry and grid
+
+        :param file_path: path of the .npz file
+        :return: True if the volume was loaded
+        """
+        if not os.path.exists(file_path):
+            return False
+
+        with np.load(file_path) as data:
+            if str(data["key"]) != self.key():
+                self.logger.warning(f"Workspace map {file_path} does not match the current geometry")
+                return False
+            total = int(np.prod(self.shape))
+            self.volume = np.unpackbits(data["volume"], count=total).astype(bool).reshape(self.shape)
+
+        self.logger.info(f"Workspace map loaded from {file_path}")
+        return True
+
+    def load_or_build(self, cache_dir: str = "./cache/workspace"):
+        """
+        Load the volume from the cache directory or build and save it
+
+        :param cache_dir: directory with the cached volumes, the file name is the key of the map
+        :return: the workspace map itself
+        """
+        file_path = os.path.join(cache_dir, f"{self.key()}.npz")
+        if not self.load(file_path):
+            self.build()
+            self.save(file_path)
+        return self
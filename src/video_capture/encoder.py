@@ -0,0 +1,149 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+import cv2
+import numpy as np
+
+# Step of the ladder: scale of the resolution, JPEG quality and grayscale
+Rung = namedtuple("Rung", ["name", "scale", "quality", "grayscale"])
+
+# Resolution/quality ladder from the best to the cheapest stream
+DEFAULT_LADDER = (
+    Rung("high", 1.0, 85, False),
+    Rung("medium", 0.75, 75, False),
+    Rung("low", 0.5, 60, False),
+    Rung("minimal", 0.5, 40, True)
+)
+
+class StreamEncoder:
+    """
+    JPEG encoder of the web streams with a resolution/quality ladder
+
+    Frames are encoded in a pool of worker threads, so the capture or render thread only hands the frame over.
+    OpenCV releases the GIL while resizing and encoding, so the workers run in parallel.
+    """
+
+    def __init__(self, ladder=DEFAULT_LADDER, workers: int = 2, logger=None):
+        """
+        :param ladder: rungs from the best to the cheapest stream
+        :param workers: number of encoder threads
+        """
+        self.logger = logger or logging.getLogger("StewartPlatform.StreamEncoder")
+        self.ladder = tuple(ladder)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="StreamEncoder")
+
+    def rung(self, name):
+        """
+        Index of a rung
+
+        :param name: name or index of the rung, None or "auto" for automatic selection
+        :return: index of the rung or None for automatic selection
+        """
+        if name is None or name == "auto":
+            return None
+        if isinstance(name, int):
+            if not 0 <= name < len(self.ladder):
+                raise ValueError(f"Rung {name} is not in the ladder")
+            return name
+        for index, rung in enumerate(self.ladder):
+            if rung.name == name:
+                return index
+        raise ValueError(f"Unknown rung: {name}")
+
+    def rung_for_quality(self, quality: int) -> int:
+        """
+        Best rung that does not exceed a JPEG quality, used for the automatic selection
+
+        :param quality: JPEG quality the connection can afford
+        :return: index of the rung
+        """
+        for index, rung in enumerate(self.ladder):
+            if rung.quality <= quality:
+                return index
+        return len(self.ladder) - 1
+
+    def encode(self, image: np.ndarray, rung: int) -> bytes:
+        """
+        Encode a BGR frame with the settings of a rung
+
+        :param image: BGR frame, not modified
+        :param rung: index of the rung
+        :return: JPEG bytes
+        """
+        settings = self.ladder[rung]
+        if settings.scale != 1.0:
+            # Area interpolation is only fast for integer factors
+            interpolation = cv2.INTER_AREA if (1 / settings.scale).is_integer() else cv2.INTER_LINEAR
+            image = cv2.resize(image, None, fx=settings.scale, fy=settings.scale, interpolation=interpolation)
+        if settings.grayscale:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        success, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, settings.quality])
+        if not success:
+            raise RuntimeError(f"Failed to encode frame with rung {settings.name}")
+        return buffer.tobytes()
+
+    def encode_rungs(self, image: np.ndarray, rungs) -> list:
+        """
+        Encode a frame for several rungs
+
+        :param image: BGR frame
+        :param rungs: indices of the rungs
+        :return: list with the JPEG bytes by rung, None for rungs that were not requested
+        """
+        jpegs = [None] * len(self.ladder)
+        for rung in rungs:
+            jpegs[rung] = self.encode(image, rung)
+        return jpegs
+
+    def submit(self, image: np.ndarray, rungs):
+        """
+        Encode a frame in the worker pool
+
+        :param image: BGR frame, must not be modified until the future is done
+        :param rungs: indices of the rungs
+        :return: Future of the list returned by encode_rungs
+        """
+        return self.executor.submit(self.encode_rungs, image, rungs)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+def benchmark_encoder(image: np.ndarray = None, iterations: int = 50, ladder=DEFAULT_LADDER, width: int = 1280, height: int = 720):
+    """
+    Measure the encode time and size per rung of the ladder
+
+    :param image: BGR frame to encode, default is a synthetic frame with gradient and noise
+    :param iterations: number of encodes per rung
+    :param ladder: rungs to measure
+    :param width: width of the synthetic frame (pixel)
+    :param height: height of the synthetic frame (pixel)
+    :return: dictionary by rung name with the time per frame (s) and the size of a frame (bytes)
+    """
+    if image is None:
+        # Smooth content like the plate with some sensor noise
+        rng = np.random.default_rng(0)
+        gradient = np.linspace(0, 200, width, dtype=np.float32)[None, :, None] + np.linspace(0, 40, height, dtype=np.float32)[:, None, None]
+        image = np.clip(gradient + rng.normal(0, 6, (height, width, 3)), 0, 255).astype(np.uint8)
+        cv2.circle(image, (width // 2, height // 2), height // 20, (255, 255, 255), -1)
+
+    encoder = StreamEncoder(ladder, workers=1)
+    results = {}
+    try:
+        for index, rung in enumerate(encoder.ladder):
+            size = len(encoder.encode(image, index))
+            start = time.perf_counter()
+            for _ in range(iterations):
+                encoder.encode(image, index)
+            results[rung.name] = {
+                "time": (time.perf_counter() - start) / iterations,
+                "bytes": size
+            }
+    finally:
+        encoder.shutdown()
+    return results
+
+def log_results(results: dict, logger=None):
+    logger = logger or logging.getLogger("StewartPlatform.Benchmark")
+    for name, result in results.items():
+        logger.info(f"{name:>10}: {result['time'] * 1e3:6.2f} ms per frame, {result['bytes'] / 1024:7.1f} KiB")
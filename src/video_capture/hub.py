@@ -0,0 +1,654 @@
+from collections import deque
+from multiprocessing import connection, resource_tracker, shared_memory
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import numpy as np
+
+from src.video_capture.video_capture import CameraThreadWithAV, LatencyHistogram
+
+# Open hubs by device name, every device is opened once per process
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+# Authentication of the connections between the processes of one machine
+_AUTHKEY = b"StewartPlatform.CaptureHub"
+
+def hub_address(device_name: str) -> str:
+    """
+    :param device_name: name of the device, e.g. /dev/video0
+    :return: address of the hub server of the device, a named pipe on Windows and a Unix socket elsewhere
+    """
+    name = "stewart_capture_hub_" + re.sub(r"[^A-Za-z0-9]+", "_", device_name).strip("_")
+    if os.name == "nt":
+        return rf"\\.\pipe\{name}"
+    return os.path.join(tempfile.gettempdir(), f"{name}.sock")
+
+def _listen(address: str):
+    """
+    Claim the address of a hub server
+
+    :return: Listener or None if another process serves the address
+    """
+    try:
+        listener = connection.Listener(address, authkey=_AUTHKEY)
+    except OSError:
+        if os.name == "nt":
+            return None
+        try:
+            connection.Client(address, authkey=_AUTHKEY).close()
+            return None
+        except OSError:
+            # Socket file of a process that did not shut down
+            os.unlink(address)
+            listener = connection.Listener(address, authkey=_AUTHKEY)
+    if os.name != "nt":
+        os.chmod(address, 0o600)
+    return listener
+
+def open_hub(device_name: str, options: dict = None, format: str = "v4l2", low_latency: bool = False, share: bool = True, logger=None):
+    """
+    Open the capture hub of a device or share the one that is already open
+
+    The first process that opens a device owns the camera and serves its frames to the other processes,
+    e.g. a controller started from the command line and the web server. Every call must be paired with
+    a call of close on the returned hub. The device is closed with the last user of the owning process,
+    the subscriptions of the other processes end then.
+
+    :param device_name: name of the device, e.g. /dev/video0
+    :param options: options of the device, only used by the owner
+    :param format: input format of PyAV, e.g. v4l2 or dshow
+    :param low_latency: minimal buffering in demuxer and decoder, only used by the owner
+    :param share: serve the device to other processes and use the hub of another process
+    :return: CaptureHub or RemoteHub
+    """
+    options = options or {}
+    with _hubs_lock:
+        hub = _hubs.get(device_name)
+        if hub is None:
+            address = hub_address(device_name)
+            for _ in range(2):
+                hub = RemoteHub.connect(device_name, logger) if share else None
+                if hub is not None:
+                    break
+                listener = _listen(address) if share else None
+                if listener is not None or not share:
+                    hub = CaptureHub(device_name, options, format, low_latency, listener, logger)
+                    break
+            if hub is None:
+                raise RuntimeError(f"Failed to open or connect to the capture hub of {device_name}")
+            _hubs[device_name] = hub
+        if hub.options != options:
+            hub.logger.warning(f"{device_name} is already open with {hub.options}, ignoring {options}")
+        hub.users += 1
+        return hub
+
+class Frame:
+    """
+    Frame delivered to a subscriber
+
+    The image is a read-only view of a slot of the camera ring, shared with the other subscribers and
+    without copy. The slot is not reused until the frame is released, a consumer that keeps the image
+    longer has to copy it.
+    """
+
+    def __init__(self, image, fps, frame_num, capture_ts, release=None):
+        self.image = image
+        self.fps = fps
+        self.frame_num = frame_num
+        self.capture_ts = capture_ts # time.monotonic() when the decoded frame arrived, the clock is shared by the processes
+        self.read_ts = None # time.monotonic() when the subscriber got the frame
+        self.subscription = None
+        self._release = release
+
+    def release(self):
+        release, self._release = self._release, None
+        if release is None:
+            return
+        if self.subscription is not None and self.read_ts is not None:
+            self.subscription._consumed(time.monotonic() - self.read_ts)
+        release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+class Subscription:
+    """
+    Bounded queue of frames for one consumer of a capture hub
+
+    When the queue is full the oldest frame is released and dropped, so a slow consumer only loses frames
+    and never holds back the hub or the other subscribers.
+    """
+
+    def __init__(self, hub, maxsize: int = 1, name: str = None):
+        self.hub = hub
+        self.name = name
+        self.maxsize = maxsize
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+
+        # Statistics
+        self.frames_delivered = 0
+        self.frames_dropped = 0
+        self.capture_to_get = LatencyHistogram() # Capture until the consumer gets the frame
+        self.get_to_release = LatencyHistogram() # Consumer gets the frame until it releases it
+
+    def put(self, frame: Frame):
+        with self.condition:
+            if self.closed:
+                dropped = frame
+            else:
+                dropped = self.queue.popleft() if len(self.queue) == self.maxsize else None
+                if dropped is not None:
+                    self.frames_dropped += 1
+                self.queue.append(frame)
+                self.frames_delivered += 1
+                self.condition.notify_all()
+        if dropped is not None:
+            dropped.release()
+
+    def get(self, timeout: float = None):
+        """
+        Wait for the next frame
+
+        :param timeout: maximum waiting time (s)
+        :return: the oldest queued Frame or None on timeout or if the subscription is closed, the frame must be released
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.queue or self.closed, timeout)
+            if not self.queue:
+                return None
+            frame = self.queue.popleft()
+            frame.read_ts = time.monotonic()
+            frame.subscription = self
+            self.capture_to_get.add(frame.read_ts - frame.capture_ts)
+            return frame
+
+    def frames(self, stop_event=None, timeout: float = 0.5):
+        """
+        Iterate over the frames until the subscription or the stop event stops
+
+        Each frame is released when the next one is requested.
+
+        :param stop_event: optional event to stop the iteration
+        :param timeout: interval to check the stop event (s)
+        :return: generator of Frame
+        """
+        while not self.closed and not (stop_event and stop_event.is_set()):
+            frame = self.get(timeout)
+            if frame is not None:
+                with frame:
+                    yield frame
+
+    def _consumed(self, hold_time: float):
+        with self.condition:
+            self.get_to_release.add(hold_time)
+
+    def stats(self):
+        """
+        :return: dictionary with the number of delivered and dropped frames and the latency summaries (s)
+        """
+        with self.condition:
+            return {
+                "name": self.name,
+                "delivered": self.frames_delivered,
+                "dropped": self.frames_dropped,
+                "capture_to_get": self.capture_to_get.summary(),
+                "get_to_release": self.get_to_release.summary()
+            }
+
+    def _shutdown(self):
+        with self.condition:
+            self.closed = True
+            queued = list(self.queue)
+            self.queue.clear()
+            self.condition.notify_all()
+        for frame in queued:
+            frame.release()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+class RemoteSubscriber:
+    """
+    Subscription of another process, served by the owner of the camera
+
+    The frames are sent as slot references into the shared memory ring by a sender thread of the
+    subscriber, so a stalled process never holds back the hub. Only the newest frame waits for the
+    sender, an older one is dropped. The process releases every frame it got, no frame is sent while
+    its queue plus the ones in use and in transit are not released.
+    """
+
+    def __init__(self, hub, conn, maxsize: int, name: str):
+        self.hub = hub
+        self.conn = conn
+        self.maxsize = maxsize
+        self.name = name
+        self.condition = threading.Condition()
+        self.pending = deque() # Newest frame waiting for the sender
+        self.in_flight = {} # FrameRef by frame number
+        self.closed = False
+        self.thread = None
+
+        # Statistics
+        self.frames_delivered = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.send, daemon=True)
+        self.thread.start()
+
+    def put_ref(self, ref):
+        with self.condition:
+            if self.closed:
+                dropped = ref
+            else:
+                dropped = self.pending.popleft() if self.pending else None
+                if dropped is not None:
+                    self.frames_dropped += 1
+                self.pending.append(ref)
+                self.condition.notify_all()
+        if dropped is not None:
+            dropped.release()
+
+    def send(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed or (self.pending and len(self.in_flight) < self.maxsize + 2))
+                if self.closed:
+                    break
+                ref = self.pending.popleft()
+                self.in_flight[ref.frame_num] = ref
+            try:
+                self.conn.send(("frame", ref.frame_num, self.hub.segment_name(ref.slot), ref.image.shape, ref.fps, ref.frame_num, ref.capture_ts))
+            except OSError:
+                # The process is gone, serve drops the subscriber
+                with self.condition:
+                    self.closed = True
+                return
+            with self.condition:
+                self.frames_delivered += 1
+
+        # The process closes the connection, which ends serve
+        try:
+            self.conn.send(("end",))
+        except OSError:
+            pass
+
+    def release(self, token):
+        with self.condition:
+            ref = self.in_flight.pop(token, None)
+            self.condition.notify_all()
+        if ref is not None:
+            ref.release()
+
+    def stats(self):
+        with self.condition:
+            return {
+                "name": self.name,
+                "remote": True,
+                "delivered": self.frames_delivered,
+                "dropped": self.frames_dropped
+            }
+
+    def _shutdown(self):
+        with self.condition:
+            self.closed = True
+            refs = list(self.pending) + list(self.in_flight.values())
+            self.pending.clear()
+            self.in_flight.clear()
+            self.condition.notify_all()
+        for ref in refs:
+            ref.release()
+
+class CaptureHub:
+    """
+    Owner of one camera that fans the frames out to several subscribers
+
+    Every new frame is handed to every subscriber as a reference to its slot in the ring of the camera
+    thread, nothing is copied. The ring is grown so the frames queued and in use by all subscribers never
+    block the camera. With a listener the ring lives in shared memory and other processes subscribe
+    through RemoteHub.
+    """
+
+    def __init__(self, device_name: str, options: dict, format: str, low_latency: bool = False, listener=None, logger=None):
+        """
+        Open the device and start the hub thread, use open_hub to share the device between consumers
+
+        :param listener: multiprocessing Listener to serve the frames to other processes
+        """
+        self.logger = logger or logging.getLogger("StewartPlatform.CaptureHub")
+        self.device_name = device_name
+        self.options = options
+        self.listener = listener
+
+        # Shared memory segments of the ring slots
+        self.segments = {}
+        self.retired_segments = []
+
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.users = 0 # Number of open_hub calls without close
+
+        self.stop_event = threading.Event()
+        try:
+            self.cam = CameraThreadWithAV(
+                device_name=device_name,
+                options=options,
+                format=format,
+                low_latency=low_latency,
+                buffer_factory=self.allocate if listener else None,
+                logger=logger
+            )
+        except Exception:
+            if listener:
+                listener.close()
+            raise
+        self.thread = threading.Thread(target=self.update, daemon=True)
+        self.thread.start()
+
+        if listener:
+            self.accept_thread = threading.Thread(target=self.accept, daemon=True)
+            self.accept_thread.start()
+
+    def allocate(self, slot, shape):
+        # Slot of the camera ring in shared memory, called by the camera thread
+        segment = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        with self.lock:
+            previous = self.segments.get(slot)
+            self.segments[slot] = segment
+            if previous is not None:
+                # Frames of the previous resolution may still be in use, the memory is freed on close
+                previous.unlink()
+                self.retired_segments.append(previous)
+        return np.ndarray(shape, dtype=np.uint8, buffer=segment.buf)
+
+    def segment_name(self, slot) -> str:
+        with self.lock:
+            return self.segments[slot].name
+
+    def subscribe(self, maxsize: int = 1, name: str = None) -> Subscription:
+        """
+        Add a consumer
+
+        :param maxsize: number of frames queued for the consumer, 1 always delivers the newest frame
+        :param name: name of the consumer for the statistics
+        :return: Subscription
+        """
+        subscription = Subscription(self, maxsize, name)
+        self._add(subscription)
+        return subscription
+
+    def _add(self, subscriber):
+        with self.lock:
+            self.subscribers.append(subscriber)
+            # Queued and in use frames of all subscribers, the latest frame and the frame being decoded
+            # A remote subscriber also holds the frame in transit and the one waiting for its sender
+            ring_size = 2 + sum(s.maxsize + (3 if isinstance(s, RemoteSubscriber) else 1) for s in self.subscribers)
+        self.cam.resize_ring(ring_size)
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+        subscription._shutdown()
+
+    def update(self):
+        try:
+            for ref in self.cam.frame_refs(self.stop_event):
+                with self.lock:
+                    subscribers = list(self.subscribers)
+
+                # Every subscriber gets its own reference to the slot
+                for subscriber in subscribers:
+                    shared = ref.share()
+                    if isinstance(subscriber, RemoteSubscriber):
+                        subscriber.put_ref(shared)
+                    else:
+                        subscriber.put(Frame(shared.image, shared.fps, shared.frame_num, shared.capture_ts, shared.release))
+        finally:
+            # Wake up the consumers if the camera stopped
+            with self.lock:
+                subscribers = list(self.subscribers)
+            for subscriber in subscribers:
+                subscriber._shutdown()
+
+    def accept(self):
+        while not self.stop_event.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, connection.AuthenticationError) as e:
+                if self.stop_event.is_set():
+                    break
+                self.logger.warning(f"Rejected connection to the capture hub of {self.device_name}: {e}")
+                continue
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        # One connection per subscription of another process
+        subscriber = None
+        try:
+            message = conn.recv()
+            conn.send(("hello", self.options))
+            if message[0] != "subscribe":
+                return
+            _, maxsize, name = message
+            subscriber = RemoteSubscriber(self, conn, maxsize, name)
+            self._add(subscriber)
+            subscriber.start()
+            while True:
+                message = conn.recv()
+                if message[0] == "release":
+                    subscriber.release(message[1])
+                elif message[0] == "close":
+                    break
+        except (OSError, EOFError):
+            pass
+        finally:
+            if subscriber is not None:
+                self.unsubscribe(subscriber)
+            conn.close()
+
+    def stats(self):
+        """
+        :return: dictionary with the latency summary of the camera and the statistics of the subscribers
+        """
+        with self.lock:
+            subscribers = list(self.subscribers)
+        return {
+            "latency": self.cam.latency_summary(),
+            "subscribers": [subscriber.stats() for subscriber in subscribers]
+        }
+
+    def close(self):
+        """
+        Release one user of the hub, the last user stops the hub and closes the device
+        """
+        with _hubs_lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+            if _hubs.get(self.device_name) is self:
+                del _hubs[self.device_name]
+
+        self.stop_event.set()
+        if self.listener:
+            # Wake up the accept thread
+            try:
+                connection.Client(self.listener.address, authkey=_AUTHKEY).close()
+            except OSError:
+                pass
+            self.accept_thread.join()
+            self.listener.close()
+        self.thread.join()
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.subscribers.clear()
+        for subscriber in subscribers:
+            subscriber._shutdown()
+        self.cam.stop()
+
+        # Frames still held by consumers keep their mapping until they are gone
+        self.cam.ring = None
+        with self.lock:
+            segments = list(self.segments.values()) + self.retired_segments
+            self.segments.clear()
+            self.retired_segments.clear()
+        for segment in segments:
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+            try:
+                segment.close()
+            except BufferError:
+                pass
+
+class RemoteHub:
+    """
+    Capture hub of another process
+
+    The frames are read-only views of the shared memory ring of the owning process. Every subscription
+    has its own connection, the releases of the frames are sent back over it.
+    """
+
+    def __init__(self, device_name: str, options: dict, logger=None):
+        self.logger = logger or logging.getLogger("StewartPlatform.CaptureHub")
+        self.device_name = device_name
+        self.address = hub_address(device_name)
+        self.options = options
+
+        self.lock = threading.Lock()
+        self.links = {} # Connection and reader thread by subscription
+        self.segments = {} # Attached shared memory by name
+        self.users = 0
+
+    @classmethod
+    def connect(cls, device_name: str, logger=None):
+        """
+        Connect to the hub of another process
+
+        :return: RemoteHub or None if no process serves the device
+        """
+        try:
+            conn = connection.Client(hub_address(device_name), authkey=_AUTHKEY)
+        except OSError:
+            return None
+        try:
+            conn.send(("options",))
+            _, options = conn.recv()
+        except (OSError, EOFError):
+            return None
+        finally:
+            conn.close()
+        return cls(device_name, options, logger)
+
+    def subscribe(self, maxsize: int = 1, name: str = None) -> Subscription:
+        """
+        Add a consumer, see CaptureHub.subscribe
+        """
+        conn = connection.Client(self.address, authkey=_AUTHKEY)
+        conn.send(("subscribe", maxsize, name))
+        conn.recv()
+
+        subscription = Subscription(self, maxsize, name)
+        thread = threading.Thread(target=self.receive, args=(conn, subscription), daemon=True)
+        with self.lock:
+            self.links[subscription] = (conn, threading.Lock(), thread)
+        thread.start()
+        return subscription
+
+    def _attach(self, name: str):
+        with self.lock:
+            segment = self.segments.get(name)
+            if segment is None:
+                segment = shared_memory.SharedMemory(name=name)
+                if os.name != "nt":
+                    # The segment belongs to the owning process, the resource tracker of this process must not unlink it
+                    resource_tracker.unregister(segment._name, "shared_memory")
+                self.segments[name] = segment
+            return segment
+
+    def receive(self, conn, subscription):
+        _, send_lock, _ = self.links[subscription]
+
+        def release(token):
+            with send_lock:
+                try:
+                    conn.send(("release", token))
+                except OSError:
+                    pass
+
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == "end":
+                    # The owner of the camera stopped
+                    break
+                _, token, name, shape, fps, frame_num, capture_ts = message
+                image = np.ndarray(shape, dtype=np.uint8, buffer=self._attach(name).buf)
+                image.flags.writeable = False
+                subscription.put(Frame(image, fps, frame_num, capture_ts, lambda token=token: release(token)))
+        except (OSError, EOFError):
+            pass
+        finally:
+            subscription._shutdown()
+            with send_lock:
+                conn.close()
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            link = self.links.pop(subscription, None)
+        if link is not None:
+            conn, send_lock, thread = link
+            with send_lock:
+                try:
+                    conn.send(("close",))
+                except OSError:
+                    pass
+            if thread is not threading.current_thread():
+                thread.join(timeout=2)
+        subscription._shutdown()
+
+    def stats(self):
+        """
+        :return: dictionary with the address of the owning process and the statistics of the subscribers of this process
+        """
+        with self.lock:
+            subscriptions = list(self.links)
+        return {
+            "remote": self.address,
+            "subscribers": [subscription.stats() for subscription in subscriptions]
+        }
+
+    def close(self):
+        """
+        Release one user of the hub, the last user ends the subscriptions of this process
+        """
+        with _hubs_lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+            if _hubs.get(self.device_name) is self:
+                del _hubs[self.device_name]
+
+        with self.lock:
+            subscriptions = list(self.links)
+        for subscription in subscriptions:
+            self.unsubscribe(subscription)
+        with self.lock:
+            segments = list(self.segments.values())
+            self.segments.clear()
+        for segment in segments:
+            try:
+                segment.close()
+            except BufferError:
+                # Frames still held by consumers keep their mapping until they are gone
+                pass
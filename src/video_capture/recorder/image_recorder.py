@@ -3,7 +3,7 @@ from datetime import datetime
 # importing os module  
 import os
 
-from src.video_capture.video_capture import CameraThreadWithAV
+from src.video_capture.hub import open_hub
 
 import cv2
 
@@ -25,7 +25,7 @@ class ImageRecorder:
             os.makedirs('./recorded_images')
 
         if operator_system == 'linux':
-            cam = CameraThreadWithAV(
+            hub = open_hub(
                 device_name='/dev/video0',
                 options={
                     "video_size": '1152x648',
@@ -36,7 +36,7 @@ class ImageRecorder:
                 logger=logger
             )
         else:
-            cam = CameraThreadWithAV(
+            hub = open_hub(
                 device_name = f"video=Logitech BRIO", 
                 options = {
                     "video_size": "1920x1080",
@@ -46,30 +46,30 @@ class ImageRecorder:
                 logger=None
             )
 
-        last_frame_num = cam.frame_num
+        # Queue a few frames, so short stalls while writing do not drop frames
+        subscription = hub.subscribe(maxsize=8, name="image_recorder")
+
         try:
             print("Enter loop")
-            while total_frames > 0 and cam.running:
-                if last_frame_num != cam.frame_num:
-                    last_frame_num = cam.frame_num
-
-                    frame, fps, frame_num = cam.read()
-                    if frame is not None:
-                        total_frames -= 1
-                        print("save Image:")
-                        file_path = f'./recorded_images/{datetime.now().strftime("%Y%m%d-%H%M%S%f")}.jpg'
+            for frame in subscription.frames():
+                if total_frames <= 0:
+                    break
+                total_frames -= 1
+                print("save Image:")
+                file_path = f'./recorded_images/{datetime.now().strftime("%Y%m%d-%H%M%S%f")}.jpg'
 
-                        cropped_frame = self.crop(frame)
-                        # Anzeige des Bildes
-                        cv2.imwrite(file_path, cropped_frame)
+                cropped_frame = self.crop(frame.image)
+                # Anzeige des Bildes
+                cv2.imwrite(file_path, cropped_frame)
 
-                        # Mit 'q' beenden
-                        if cv2.waitKey(1) & 0xFF == ord('q'):
-                            break
+                # Mit 'q' beenden
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
 
         finally:
             print("Leave loop")
-            cam.stop()
+            subscription.close()
+            hub.close()
 
 if __name__ == "__main__":
     print("Start Recognition")
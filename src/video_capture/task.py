@@ -3,6 +3,7 @@ from asyncio import Event
 import json
 import base64
 import logging
+import time
 
 import cv2
 
@@ -43,24 +44,33 @@ class VideoCaptureLinux():
             type=int,
             default=20
         )
+        parser.add_argument(
+            '--low_latency',
+            help='Minimal buffering, always use the newest frame',
+            required=False,
+            action='store_true',
+            default=False
+        )
 
         args, _ = parser.parse_known_args()
         self.device_name = args.device_name
         self.resolution = args.resolution
         self.framerate = args.framerate
+        self.low_latency = args.low_latency
 
-    def manual(self, device_name, resolution, framerate):
+    def manual(self, device_name, resolution, framerate, low_latency=False):
         self.device_name = device_name
         self.resolution = resolution
         self.framerate = framerate
+        self.low_latency = low_latency
 
     def __build(self, logger):
-        from src.video_capture.video_capture import CameraThreadWithAV
+        from src.video_capture.hub import open_hub
 
         logger = logger or logging.getLogger(__name__)
 
-        # Initialize the video capture
-        cam = CameraThreadWithAV(
+        # Share the camera with other consumers, e.g. the ball tracker
+        hub = open_hub(
             device_name=self.device_name,
             options={
                 "video_size": self.resolution,
@@ -68,39 +78,41 @@ class VideoCaptureLinux():
                 "input_format": "mjpeg"
             },
             format="v4l2",
+            low_latency=self.low_latency,
             logger=logger
         )
 
-        return logger, cam
+        return logger, hub
 
     def run(self, logger, event=None, stop_event: Event=None):
-        logger, cam = self.__build(logger)
+        logger, hub = self.__build(logger)
+
+        # Only the newest frame is queued, a slow viewer skips frames instead of delaying them
+        subscription = hub.subscribe(maxsize=1, name="video_capture")
 
-        last_frame_num = cam.frame_num
         try:
-            while cam.running and not stop_event.is_set():
-                if last_frame_num != cam.frame_num:
-                    last_frame_num = cam.frame_num
+            for frame in subscription.frames(stop_event):
+                if not event:
+                    break
 
-                    frame, fps, frame_num = cam.read()
-                    if not event or stop_event.is_set():
-                        break
-                    elif frame is not None:
-                        logger.debug(f"FPS: {fps} (num: {frame_num})")
+                logger.debug(f"FPS: {frame.fps} (num: {frame.frame_num})")
 
-                        if event:
-                            event(frame)
+                if event:
+                    # Read-only frame shared with the other subscribers, only valid during the call
+                    event(frame.image)
 
-                        else:
-                            # Anzeige des Bildes
-                            cv2.imshow("Threaded Camera", frame)
+                else:
+                    # Anzeige des Bildes
+                    cv2.imshow("Threaded Camera", frame.image)
 
-                            # Mit 'q' beenden
-                            if cv2.waitKey(1) & 0xFF == ord('q'):
-                                break
+                    # Mit 'q' beenden
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
 
         finally:
-            cam.stop()
+            logger.info(f"Capture hub: {hub.stats()}")
+            subscription.close()
+            hub.close()
 
 class VideoCaptureWindows:
     """
@@ -138,24 +150,33 @@ class VideoCaptureWindows:
             type=int,
             default=20
         )
+        parser.add_argument(
+            '--low_latency',
+            help='Minimal buffering, always use the newest frame',
+            required=False,
+            action='store_true',
+            default=False
+        )
 
         args, _ = parser.parse_known_args()
         self.device_name = args.device_name
         self.resolution = args.resolution
         self.framerate = args.framerate
+        self.low_latency = args.low_latency
 
-    def manual(self, device_name, resolution, framerate):
+    def manual(self, device_name, resolution, framerate, low_latency=False):
         self.device_name = device_name
         self.resolution = resolution
         self.framerate = framerate
+        self.low_latency = low_latency
 
     def __build(self, logger):
-        from src.video_capture.video_capture import CameraThreadWithAV
+        from src.video_capture.hub import open_hub
 
         logger = logger or logging.getLogger(__name__)
 
-        # Initialize the video capture
-        cam = CameraThreadWithAV(
+        # Share the camera with other consumers, e.g. the ball tracker
+        hub = open_hub(
             device_name=f"video={self.device_name}",
             options={
                 "video_size": self.resolution,
@@ -163,36 +184,191 @@ class VideoCaptureWindows:
                 "input_format": "mjpeg"
             },
             format="dshow",
+            low_latency=self.low_latency,
             logger=logger
         )
 
-        return logger, cam
+        return logger, hub
 
     def run(self, logger, event=None, stop_event: Event=None):
-        logger, cam = self.__build(logger)
+        logger, hub = self.__build(logger)
+
+        # Only the newest frame is queued, a slow viewer skips frames instead of delaying them
+        subscription = hub.subscribe(maxsize=1, name="video_capture")
 
-        last_frame_num = cam.frame_num
         try:
-            while cam.running and not stop_event.is_set():
-                if last_frame_num != cam.frame_num:
-                    last_frame_num = cam.frame_num
+            for frame in subscription.frames(stop_event):
+                if not event:
+                    break
+
+                logger.debug(f"FPS: {frame.fps} (num: {frame.frame_num})")
+
+                if event:
+                    # Read-only frame shared with the other subscribers, only valid during the call
+                    event(frame.image)
+
+                else:
+                    # Anzeige des Bildes
+                    cv2.imshow("Threaded Camera", frame.image)
 
-                    frame, fps, frame_num = cam.read()
-                    if not event or stop_event.is_set():
+                    # Mit 'q' beenden
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
                         break
-                    elif frame is not None:
-                        logger.debug(f"FPS: {fps} (num: {frame_num})")
 
-                        if event:
-                            event(frame)
+        finally:
+            logger.info(f"Capture hub: {hub.stats()}")
+            subscription.close()
+            hub.close()
+
+class BenchmarkEncoder:
+    """
+    Benchmark the stream encoder per rung of the resolution/quality ladder.
+    """
+    def parse(self, parser=None):
+        parser = argparse.ArgumentParser(
+            parents=[parser] if parser else [],
+            prog='BenchmarkEncoder',
+            usage='%(prog)s [options]',
+            description='Measure the encode time per frame for every rung of the stream ladder.',
+            epilog='Example: %(prog)s -r 1280x720 --iterations 100',
+        )
+        parser.add_argument(
+            '-r',
+            '--resolution',
+            help='Resolution of the synthetic frame',
+            required=False,
+            type=str,
+            default='1280x720'
+        )
+        parser.add_argument(
+            '--image',
+            help='Encode this image instead of a synthetic frame',
+            required=False,
+            type=str,
+            default=None
+        )
+        parser.add_argument(
+            '--iterations',
+            help='Number of encodes per rung',
+            required=False,
+            type=int,
+            default=50
+        )
+
+        args, _ = parser.parse_known_args()
+        self.resolution = args.resolution
+        self.image = args.image
+        self.iterations = args.iterations
+
+    def manual(self, resolution='1280x720', image=None, iterations=50):
+        self.resolution = resolution
+        self.image = image
+        self.iterations = iterations
+
+    def run(self, logger):
+        from src.video_capture.encoder import benchmark_encoder, log_results
+
+        logger = logger or logging.getLogger(__name__)
+
+        width, height = (int(value) for value in self.resolution.split('x'))
+        image = cv2.imread(self.image) if self.image else None
+        if self.image and image is None:
+            raise ValueError(f"Failed to read image {self.image}")
 
-                        else:
-                            # Anzeige des Bildes
-                            cv2.imshow("Threaded Camera", frame)
+        logger.info(f"Encode {self.image or f'synthetic {width}x{height} frame'}:")
+        log_results(benchmark_encoder(image, self.iterations, width=width, height=height), logger)
 
-                            # Mit 'q' beenden
-                            if cv2.waitKey(1) & 0xFF == ord('q'):
-                                break
+class CaptureHubServer:
+    """
+    Own a camera in a separate process and serve its frames to the other processes, e.g. a controller and the web server.
+    """
+    def parse(self, parser=None):
+        parser = argparse.ArgumentParser(
+            parents=[parser] if parser else [],
+            prog='CaptureHubServer',
+            usage='%(prog)s [options]',
+            description='Open the camera and share it with the other processes through the capture hub.',
+            epilog='Example: %(prog)s -d /dev/video0 -r 800x600 -f 30',
+        )
+        parser.add_argument(
+            '-d',
+            '--device_name',
+            help='Set the device name',
+            required=False,
+            type=str,
+            default='/dev/video0'
+        )
+        parser.add_argument(
+            '-r',
+            '--resolution',
+            help='Set the resolution, consumers with another resolution resize the frames',
+            required=False,
+            type=str,
+            default='800x600'
+        )
+        parser.add_argument(
+            '-f',
+            '--framerate',
+            help='Set the framerate',
+            required=False,
+            type=int,
+            default=30
+        )
+        parser.add_argument(
+            '--low_latency',
+            help='Minimal buffering, always use the newest frame',
+            required=False,
+            action='store_true',
+            default=False
+        )
+        parser.add_argument(
+            '--stats_interval',
+            help='Interval of the statistics in the log (s)',
+            required=False,
+            type=float,
+            default=10.0
+        )
+
+        args, _ = parser.parse_known_args()
+        self.device_name = args.device_name
+        self.resolution = args.resolution
+        self.framerate = args.framerate
+        self.low_latency = args.low_latency
+        self.stats_interval = args.stats_interval
+
+    def manual(self, device_name, resolution='800x600', framerate=30, low_latency=False, stats_interval=10.0):
+        self.device_name = device_name
+        self.resolution = resolution
+        self.framerate = framerate
+        self.low_latency = low_latency
+        self.stats_interval = stats_interval
+
+    def run(self, logger, stop_event: Event=None):
+        from src.video_capture.hub import CaptureHub, open_hub
+
+        logger = logger or logging.getLogger(__name__)
+
+        hub = open_hub(
+            device_name=self.device_name,
+            options={
+                "video_size": self.resolution,
+                "framerate": str(self.framerate),
+                "input_format": "mjpeg"
+            },
+            format="v4l2",
+            low_latency=self.low_latency,
+            logger=logger
+        )
+        try:
+            if not isinstance(hub, CaptureHub):
+                logger.error(f"{self.device_name} is already served by another process")
+                return
 
+            logger.info(f"Serving {self.device_name}, stop with Ctrl+C")
+            while not (stop_event and stop_event.is_set()):
+                time.sleep(self.stats_interval)
+                logger.info(f"Capture hub: {hub.stats()}")
+        except KeyboardInterrupt:
+            pass
         finally:
-            cam.stop()
+            hub.close()
@@ -9,6 +9,105 @@ import cv2
 import datetime
 import threading
 
+class LatencyHistogram:
+    """
+    Histogram of latencies with logarithmic bins from 0.1 ms to 1 s
+    """
+
+    def __init__(self, low=1e-4, high=1.0, bins=40):
+        self.edges = np.logspace(np.log10(low), np.log10(high), bins + 1)
+        self.counts = np.zeros(bins + 2, dtype=np.int64) # Including underflow and overflow
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[np.searchsorted(self.edges, value, side="right")] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        """
+        Upper edge of the bin that contains the percentile, at most the maximum latency (s)
+        """
+        if self.total == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), p / 100 * self.total))
+        return min(float(self.edges[min(index, len(self.edges) - 1)]), self.max)
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "mean": self.sum / self.total if self.total else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max
+        }
+
+# Planar YUV formats that are converted by OpenCV: (chroma subsampled vertically, full range)
+_PLANAR_YUV = {
+    "yuv420p": (True, False),
+    "yuvj420p": (True, True),
+    "yuv422p": (False, False),
+    "yuvj422p": (False, True)
+}
+
+def _plane_pixels(plane, columns):
+    """
+    View of the pixels of a PyAV plane without the padding of the lines
+
+    :param plane: av.VideoPlane
+    :param columns: bytes per line without padding
+    :return: uint8 array (height, columns) that shares the memory of the plane
+    """
+    return np.frombuffer(plane, dtype=np.uint8, count=plane.height * plane.line_size).reshape(plane.height, plane.line_size)[:, :columns]
+
+def _copy_frame(image, out=None):
+    # Copy into the buffer of the caller if there is one
+    if out is None:
+        return image.copy()
+    np.copyto(out, image)
+    return out
+
+class FrameRef:
+    """
+    Read-only view of a frame in the ring buffer of CameraThreadWithAV
+
+    The slot of the frame is not reused until the reference is released.
+    """
+
+    def __init__(self, cam, slot, image, fps, frame_num, capture_ts, pts, read_ts):
+        self.cam = cam
+        self.slot = slot
+        self.image = image
+        self.fps = fps
+        self.frame_num = frame_num
+        self.capture_ts = capture_ts # time.monotonic() when the decoded frame arrived
+        self.pts = pts # Presentation timestamp of PyAV
+        self.read_ts = read_ts # time.monotonic() when the reference was acquired
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.cam.release(self.slot, self.read_ts)
+
+    def share(self):
+        """
+        Another reference to the same frame that is released independently
+
+        :return: FrameRef
+        """
+        return self.cam.share(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
 class CameraThreadWithAV:
     def __init__(
             self,
@@ -19,7 +118,16 @@ class CameraThreadWithAV:
                 "video_size": "1920x1080",
                 "framerate": "30"
             },
-            format = "dshow"
+            format = "dshow",
+
+            # Number of preallocated frame buffers
+            ring_size = 4,
+
+            # Minimal buffering in demuxer and decoder, consumers always get the newest frame
+            low_latency = False,
+
+            # Allocates the slots of the ring, called with the index and the shape of the slot
+            buffer_factory = None
 
             # Linux 
             # Check which camera is connected
@@ -39,8 +147,34 @@ class CameraThreadWithAV:
         self.logger.debug(options)
         self.logger.debug(format)
         self.frame_num = 0
+        self.fps = 0
+        self.low_latency = low_latency
+        if low_latency:
+            options = {**options, "fflags": "nobuffer", "flags": "low_delay"}
         self.container = av.open(file=device_name, options=options, format=format)
-        self.img = None
+        if low_latency:
+            # Frame threading delays the output by one frame per thread
+            self.container.streams.video[0].thread_type = "SLICE"
+
+        # Frames are decoded into a ring of preallocated buffers, consumers hold references to the slots
+        self.ring_size = ring_size
+        self.ring = None
+        self.buffer_factory = buffer_factory or (lambda slot, shape: np.empty(shape, dtype=np.uint8))
+        self.refcounts = [0] * ring_size
+        self.latest = None # Slot of the latest frame
+        self.frames_dropped = 0 # Frames without free slot
+        self.capture_ts = [0.0] * ring_size
+        self.pts = [None] * ring_size
+
+        # Reused buffers of the planar YUV conversion, only used by the decoding thread
+        self.staging = None
+
+        # Latency from capture until a consumer reads the frame and from reading until the consumer releases it
+        self.capture_to_read = LatencyHistogram()
+        self.read_to_consumer = LatencyHistogram()
+
+        # Notifies waiting consumers about new frames
+        self.condition = threading.Condition()
         
         self.running = True
         self.thread = threading.Thread(target=self.update, daemon=True)
@@ -51,10 +185,19 @@ class CameraThreadWithAV:
         fps_times = deque()
         try:
             for frame in self.container.decode(video=0):
+                capture_ts = time.monotonic()
                 if not self.running:
                     break
-                self.img = frame.to_ndarray(format="bgr24")
-                self.frame_num += 1
+
+                # Decode into a slot that is neither the latest frame nor referenced by a consumer
+                with self.condition:
+                    slot = next((i for i in range(self.ring_size) if i != self.latest and self.refcounts[i] == 0), None)
+                if slot is None:
+                    self.frames_dropped += 1
+                    continue
+                self.decode_into(frame, slot)
+                self.capture_ts[slot] = capture_ts
+                self.pts[slot] = frame.pts
 
                 # Calculate fps
                 now = time.monotonic()
@@ -62,15 +205,222 @@ class CameraThreadWithAV:
                 while fps_times and (now - fps_times[0] > 1.0):
                     fps_times.popleft()
 
-                self.fps = len(fps_times)
+                with self.condition:
+                    self.latest = slot
+                    self.frame_num += 1
+                    self.fps = len(fps_times)
+                    self.condition.notify_all()
         except:
             self.logger.error("Videoquelle beendet oder Fehler beim Lesen.")
-            self.running = False
+        finally:
+            with self.condition:
+                self.running = False
+                self.condition.notify_all()
     
-    def read(self):
-        if self.img is None:
+    def decode_into(self, frame, slot):
+        """
+        Convert a decoded frame to BGR into a slot of the ring
+
+        YUYV (uncompressed cameras), planar YUV 4:2:0 and 4:2:2 (MJPEG cameras) and BGR frames are converted by
+        OpenCV directly into the slot. The planes of planar frames are first packed into a staging buffer of the
+        camera, the full range of the JPEG formats is scaled to the limited range that OpenCV expects on the way.
+        Only other formats are converted by PyAV, which allocates one BGR frame per frame that is then copied
+        into the slot.
+
+        :param frame: av.VideoFrame from the decoder
+        :param slot: index of the slot in the ring
+        """
+        height, width = frame.height, frame.width
+        with self.condition:
+            if self.ring is None or self.ring[0].shape != (height, width, 3):
+                self.ring = [self.buffer_factory(i, (height, width, 3)) for i in range(self.ring_size)]
+            target = self.ring[slot]
+
+        name = frame.format.name
+        if name == "yuyv422":
+            pixels = _plane_pixels(frame.planes[0], width * 2).reshape(height, width, 2)
+            cv2.cvtColor(pixels, cv2.COLOR_YUV2BGR_YUYV, dst=target)
+            return
+        if name in _PLANAR_YUV and width % 2 == 0 and height % 2 == 0:
+            self._convert_planar(frame, name, target)
+            return
+        if name != "bgr24":
+            frame = frame.reformat(format="bgr24")
+        np.copyto(target, _plane_pixels(frame.planes[0], width * 3).reshape(height, width, 3))
+
+    def _convert_planar(self, frame, name, target):
+        # Pack the planes into the layout of OpenCV, 4:2:0 as I420 and 4:2:2 as YUYV
+        height, width = frame.height, frame.width
+        subsampled, full_range = _PLANAR_YUV[name]
+        if self.staging is None or self.staging[0] != (name, height, width):
+            if subsampled:
+                buffers = (np.empty((height * 3 // 2, width), dtype=np.uint8),)
+            else:
+                buffers = (
+                    np.empty((height, width, 2), dtype=np.uint8), # YUYV
+                    np.empty((height, width), dtype=np.uint8), # Y
+                    np.empty((height, width // 2), dtype=np.uint8), # U
+                    np.empty((height, width // 2), dtype=np.uint8), # V
+                    np.empty((height, width // 2, 2), dtype=np.uint8) # UV interleaved
+                )
+            self.staging = ((name, height, width), buffers)
+        buffers = self.staging[1]
+
+        chroma_height = height // 2 if subsampled else height
+        if subsampled:
+            flat = buffers[0].reshape(-1)
+            chroma_size = chroma_height * (width // 2)
+            planes = (
+                buffers[0][:height],
+                flat[height * width:height * width + chroma_size].reshape(chroma_height, width // 2),
+                flat[height * width + chroma_size:].reshape(chroma_height, width // 2)
+            )
+        else:
+            planes = buffers[1:4]
+
+        # Full range to limited range, Y 0..255 -> 16..235, U and V 0..255 -> 16..240 around 128
+        luma, chroma = ((219 / 255, 16), (224 / 255, 128 - 128 * 224 / 255)) if full_range else ((1, 0), (1, 0))
+        cv2.convertScaleAbs(_plane_pixels(frame.planes[0], width), dst=planes[0], alpha=luma[0], beta=luma[1])
+        for index in (1, 2):
+            cv2.convertScaleAbs(_plane_pixels(frame.planes[index], width // 2), dst=planes[index], alpha=chroma[0], beta=chroma[1])
+
+        if subsampled:
+            cv2.cvtColor(buffers[0], cv2.COLOR_YUV2BGR_I420, dst=target)
+        else:
+            yuyv, y, u, v, uv = buffers
+            cv2.merge((u, v), dst=uv)
+            cv2.merge((y, uv.reshape(height, width)), dst=yuyv)
+            cv2.cvtColor(yuyv, cv2.COLOR_YUV2BGR_YUYV, dst=target)
+
+    def acquire(self, after=None, timeout=None):
+        """
+        Get a read-only reference to the latest frame without copying it
+
+        :param after: wait for a frame newer than this frame number, None returns the latest frame immediately
+        :param timeout: maximum waiting time (s)
+        :return: FrameRef that must be released, or None if there is no (new) frame
+        """
+        with self.condition:
+            if after is not None:
+                self.condition.wait_for(lambda: self.frame_num > after or not self.running, timeout)
+                if self.frame_num <= after:
+                    return None
+            if self.latest is None:
+                return None
+            slot = self.latest
+            self.refcounts[slot] += 1
+            image = self.ring[slot].view()
+            image.flags.writeable = False
+            read_ts = time.monotonic()
+            self.capture_to_read.add(read_ts - self.capture_ts[slot])
+            return FrameRef(self, slot, image, self.fps, self.frame_num, self.capture_ts[slot], self.pts[slot], read_ts)
+
+    def share(self, ref):
+        """
+        Add a reference to the slot of a frame
+
+        :param ref: FrameRef that is not released yet
+        :return: FrameRef with the acquire time of the given reference
+        """
+        with self.condition:
+            self.refcounts[ref.slot] += 1
+        return FrameRef(self, ref.slot, ref.image, ref.fps, ref.frame_num, ref.capture_ts, ref.pts, ref.read_ts)
+
+    def resize_ring(self, ring_size):
+        """
+        Grow the ring, e.g. when consumers hold more frames at the same time
+
+        :param ring_size: minimum number of slots, the ring never shrinks
+        """
+        with self.condition:
+            if ring_size <= self.ring_size:
+                return
+            for slot in range(self.ring_size, ring_size):
+                self.refcounts.append(0)
+                self.capture_ts.append(0.0)
+                self.pts.append(None)
+                if self.ring is not None:
+                    self.ring.append(self.buffer_factory(slot, self.ring[0].shape))
+            self.ring_size = ring_size
+
+    def release(self, slot, read_ts=None):
+        with self.condition:
+            self.refcounts[slot] -= 1
+            if read_ts is not None:
+                self.read_to_consumer.add(time.monotonic() - read_ts)
+
+    def latency_summary(self):
+        """
+        :return: dictionary with the summaries of the capture to read and read to consumer latencies (s)
+        """
+        with self.condition:
+            return {
+                "capture_to_read": self.capture_to_read.summary(),
+                "read_to_consumer": self.read_to_consumer.summary()
+            }
+
+    def read(self, out=None):
+        """
+        Copy of the latest frame
+
+        :param out: optional array with the shape of the frames that receives the copy, no frame is allocated
+        :return: frame, fps and frame number, the frame is None if there is no frame yet
+        """
+        ref = self.acquire()
+        if ref is None:
             return None, 0, 0
-        return self.img.copy(), self.fps, self.frame_num
+        with ref:
+            return _copy_frame(ref.image, out), ref.fps, ref.frame_num
+
+    def wait_for_frame(self, after=None, timeout=None, out=None):
+        """
+        Wait for a frame newer than the given frame number
+
+        :param after: frame number of the last frame that was read, default is the current frame
+        :param timeout: maximum waiting time (s)
+        :param out: optional array with the shape of the frames that receives the copy, no frame is allocated
+        :return: same as read, the frame is None on timeout or if the capture stopped
+        """
+        with self.condition:
+            after = self.frame_num if after is None else after
+        ref = self.acquire(after, timeout)
+        if ref is None:
+            return None, self.fps, self.frame_num
+        with ref:
+            return _copy_frame(ref.image, out), ref.fps, ref.frame_num
+
+    def frame_refs(self, stop_event=None, timeout=0.5):
+        """
+        Iterate over new frames as read-only references without copying them
+
+        Each reference is released when the next one is requested.
+
+        :param stop_event: optional event to stop the iteration
+        :param timeout: interval to check the stop event (s)
+        :return: generator of FrameRef
+        """
+        frame_num = self.frame_num
+        while self.running and not (stop_event and stop_event.is_set()):
+            ref = self.acquire(frame_num, timeout)
+            if ref is None:
+                continue
+            frame_num = ref.frame_num
+            with ref:
+                yield ref
+
+    def frames(self, stop_event=None, timeout=0.5):
+        """
+        Iterate over new frames until the capture or the stop event stops
+
+        The frames are read-only views of the ring that are valid until the next frame is requested, copy a
+        frame to keep it longer.
+
+        :param stop_event: optional event to stop the iteration
+        :param timeout: interval to check the stop event (s)
+        :return: generator of (frame, fps, frame_num)
+        """
+        for ref in self.frame_refs(stop_event, timeout):
+            yield ref.image, ref.fps, ref.frame_num
     
     def stop(self):
         self.running = False
@@ -101,6 +451,9 @@ class CameraThread:
         # Current fps
         self.fps = 1
 
+        # Notifies waiting consumers about new frames
+        self.condition = threading.Condition()
+
         # Is thread running
         self.running = True
 
@@ -111,8 +464,7 @@ class CameraThread:
     def update(self):
         fps_times = deque()
         while self.running:
-            self.ret, self.frame = self.cap.read()
-            self.frame_num += 1
+            ret, frame = self.cap.read()
 
             # Calculate fps
             now = time.monotonic()
@@ -121,13 +473,53 @@ class CameraThread:
             while fps_times and (now - fps_times[0] > 1):
                 fps_times.popleft()
 
-            self.fps = len(fps_times)
+            with self.condition:
+                self.ret, self.frame = ret, frame
+                self.frame_num += 1
+                self.fps = len(fps_times)
+                self.condition.notify_all()
+
+        with self.condition:
+            self.condition.notify_all()
 
     def read(self):
-        return self.ret, self.frame, self.fps, self.frame_num
+        with self.condition:
+            return self.ret, self.frame, self.fps, self.frame_num
+
+    def wait_for_frame(self, after=None, timeout=None):
+        """
+        Wait for a frame newer than the given frame number
+
+        :param after: frame number of the last frame that was read, default is the current frame
+        :param timeout: maximum waiting time (s)
+        :return: same as read, ret is False on timeout or if the capture stopped
+        """
+        with self.condition:
+            after = self.frame_num if after is None else after
+            if not self.condition.wait_for(lambda: self.frame_num > after or not self.running, timeout) or self.frame_num <= after:
+                return False, None, self.fps, self.frame_num
+            return self.read()
+
+    def frames(self, stop_event=None, timeout=0.5):
+        """
+        Iterate over new frames until the capture or the stop event stops
+
+        :param stop_event: optional event to stop the iteration
+        :param timeout: interval to check the stop event (s)
+        :return: generator of (ret, frame, fps, frame_num)
+        """
+        frame_num = self.frame_num
+        while self.running and not (stop_event and stop_event.is_set()):
+            ret, frame, fps, new_frame_num = self.wait_for_frame(frame_num, timeout)
+            if new_frame_num <= frame_num:
+                continue
+            frame_num = new_frame_num
+            yield ret, frame, fps, frame_num
 
     def stop(self):
-        self.running = False
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
         self.thread.join()
         self.cap.release()
 
@@ -191,26 +583,20 @@ def returnCameraIndexes():
 def get_frame_with_thread():
     cam = CameraThread(cam_index=1)
     
-    last_frame_num = cam.frame_num
     try:
-        while True:
-            
-            if last_frame_num != cam.frame_num:
-                last_frame_num = cam.frame_num
-            
-                ret, frame, fps, frame_num = cam.read()
-                if not ret:
-                    print("Fehler beim Lesen des Frames")
-                    break
+        for ret, frame, fps, frame_num in cam.frames():
+            if not ret:
+                print("Fehler beim Lesen des Frames")
+                break
 
-                print(f"FPS: {fps} (num: {frame_num})")
+            print(f"FPS: {fps} (num: {frame_num})")
 
-                # Anzeige des Bildes
-                cv2.imshow("Threaded Camera", frame)
+            # Anzeige des Bildes
+            cv2.imshow("Threaded Camera", frame)
 
-                # Mit 'q' beenden
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+            # Mit 'q' beenden
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
 
     finally:
         cam.stop()
@@ -220,22 +606,16 @@ def get_frame_with_av_thread():
     # cam = CameraThreadWithAV("Microsoft® LifeCam HD-3000")
     cam = CameraThreadWithAV()
 
-    last_frame_num = cam.frame_num
     try:
-        while cam.running:
-            if last_frame_num != cam.frame_num:
-                last_frame_num = cam.frame_num
-
-                frame, fps, frame_num = cam.read()
-                if frame is not None:
-                    print(f"FPS: {fps} (num: {frame_num})")
+        for frame, fps, frame_num in cam.frames():
+            print(f"FPS: {fps} (num: {frame_num})")
 
-                    # Anzeige des Bildes
-                    cv2.imshow("Threaded Camera", frame)
+            # Anzeige des Bildes
+            cv2.imshow("Threaded Camera", frame)
 
-                    # Mit 'q' beenden
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
-                        break
+            # Mit 'q' beenden
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
 
     finally:
         cam.stop()
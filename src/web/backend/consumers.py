@@ -1,11 +1,12 @@
 import asyncio
-import base64
 import json
 from queue import Queue
 import threading
 import time
 from channels.generic.websocket import AsyncWebsocketConsumer
-import cv2
+
+from src.web.backend import streams
+from src.web.backend.frames import FrameSender
 
 class TaskConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -48,11 +49,11 @@ class StewartPlatformConsumer(AsyncWebsocketConsumer):
         self._nunchuck_thread = None
         self._nunchuck_stop_event = threading.Event()
 
-        self._video_cam_thread = None
-        self._video_cam_stop_event = threading.Event()
+        # Rung of the ladder by shared stream this connection is viewing, None for automatic selection
+        self._streams = {}
 
-        self._run_ball_on_plate_thread = None
-        self._run_ball_on_plate_stop_event = threading.Event()
+        # Latest frame wins sender of the video streams
+        self._frame_sender = FrameSender(self.send, self.send_stats)
 
         with open('./src/config.json', 'r') as f:
             config_data = json.load(f)
@@ -67,15 +68,22 @@ class StewartPlatformConsumer(AsyncWebsocketConsumer):
         else:
             print("Client connected...")
             await self.accept()
+            self._frame_sender.start()
             self.send("Hallo")
     
     async def receive(self, text_data=None, bytes_data=None):
-        print(text_data)
         json_data = json.loads(text_data)
 
         task_id = json_data.get('task_id')
         state = json_data.get('state')
         payload = json_data.get('payload', {})
+
+        # Empfangsbestätigung eines Frames, bestimmt Bildrate und Qualität des Streams
+        if state == 'ack':
+            self._frame_sender.ack(task_id, payload.get('stream'), payload.get('frame_num'))
+            return
+
+        print(text_data)
         print(task_id)
 
         match task_id:
@@ -121,20 +129,21 @@ class StewartPlatformConsumer(AsyncWebsocketConsumer):
                     await self.stop_nunchuck_handler()
             case 'video_cam':
                 if state == 'connect':
-                    if self._video_cam_thread and self._video_cam_thread.is_alive():
+                    if streams.is_viewing('video_cam', self.channel_name):
                         await self.send_response(task_id, False, 'Already connected to video cam!')
                     else:
                         platform = payload.get('platform')
                         device_name = payload.get('device_name')
                         resolution = payload.get('resolution')
                         fps = payload.get('fps')
-                        await self.run_video_cam_handler(platform, device_name, resolution, fps)
+                        rung = payload.get('rung')
+                        await self.run_video_cam_handler(platform, device_name, resolution, fps, rung)
                 elif state == 'disconnect':
                     print("disconnect") 
                     await self.stop_video_cam_handler()
             case 'ball_on_plate':
                 if state == 'connect':
-                    if self._run_ball_on_plate_thread and self._run_ball_on_plate_thread.is_alive():
+                    if streams.is_viewing('ball_on_plate', self.channel_name):
                         await self.send_response(task_id, False, 'Already connected to ball on plate!')
                     else:
                         env = payload.get('env')
@@ -145,7 +154,8 @@ class StewartPlatformConsumer(AsyncWebsocketConsumer):
                         iterations = payload.get('iterations')
                         simulation_mode = payload.get('simulation_mode')
                         fps = payload.get('fps')
-                        await self.run_ball_on_plate_handler(env, id, model_name, sb3_model, device, iterations, simulation_mode, fps)
+                        rung = payload.get('rung')
+                        await self.run_ball_on_plate_handler(env, id, model_name, sb3_model, device, iterations, simulation_mode, fps, rung)
                 elif state == 'disconnect':
                     print("disconnect") 
                     await self.stop_ball_on_plate_handler()
@@ -160,6 +170,7 @@ class StewartPlatformConsumer(AsyncWebsocketConsumer):
         await self.stop_nunchuck_handler()
         await self.stop_video_cam_handler()
         await self.stop_ball_on_plate_handler()
+        await self._frame_sender.stop()
 
     async def stop_set_handler(self):
         if self._set_thread and self._set_thread.is_alive():
@@ -273,111 +284,139 @@ class StewartPlatformConsumer(AsyncWebsocketConsumer):
 
     # Ball on Plate Section
     async def stop_ball_on_plate_handler(self):
-        if self._run_ball_on_plate_thread and self._run_ball_on_plate_thread.is_alive():
-            self._run_ball_on_plate_stop_event.set()
-            self._run_ball_on_plate_thread.join(timeout=2)
+        await self.leave_stream('ball_on_plate')
 
-    async def run_ball_on_plate_handler(self, env, id, model_name, sb3_model, device, iterations, simulation_mode, fps):
-        self._run_ball_on_plate_stop_event.clear()
-        loop = asyncio.get_running_loop()
+    async def run_ball_on_plate_handler(self, env, id, model_name, sb3_model, device, iterations, simulation_mode, fps, rung=None):
 
-        def start_ball_on_plate(loop):
+        def start_ball_on_plate(producer, stop_event):
             from src.ball_on_plate.rl.task import RunBallOnPlateRL
 
-            def raw_image_event(buffer):
-                if not self._run_ball_on_plate_stop_event.is_set():
-                    b64_image = base64.b64encode(buffer).decode('utf-8')
-
-                    # Sende die base64-Daten an den Client (über asyncio)
-                    asyncio.run_coroutine_threadsafe(
-                        self.send_response('ball_on_plate', True, b64_image),
-                        loop
-                    )
-            try:
-                model = RunBallOnPlateRL()
-                model.manual(
-                    env,
-                    id,
-                    model_name,
-                    sb3_model,
-                    device,
-                    iterations,
-                    simulation_mode,
-                    fps
-                )
-                model.run(
-                    None,
-                    raw_image_event,
-                    self._run_ball_on_plate_stop_event
-                )
-            except Exception as e:
-                import traceback
-                traceback.print_exc()
-                print(e)
-                asyncio.run_coroutine_threadsafe(
-                    self.send_response('ball_on_plate', False, e),
-                    loop
-                )
-            finally:
-                asyncio.run_coroutine_threadsafe(
-                    self.send_response('ball_on_plate', False, 'Ball on plate ended'),
-                    loop
-                )
-
-        # Starte Thread
-        self._run_ball_on_plate_thread = threading.Thread(target=start_ball_on_plate, args=(loop,), daemon=True)
-        self._run_ball_on_plate_thread.start()
+            def raw_image_event(image):
+                # Das Bild wird im Encoder-Pool einmal pro genutzter Stufe kodiert
+                producer.publish(image)
+
+            model = RunBallOnPlateRL()
+            model.manual(
+                env,
+                id,
+                model_name,
+                sb3_model,
+                device,
+                iterations,
+                simulation_mode,
+                fps
+            )
+            # Der Zustand des Reglers wird bei jedem Schritt gesendet, unabhängig von der Bildrate
+            model.run(
+                None,
+                raw_image_event,
+                stop_event,
+                producer.publish_telemetry
+            )
+
+        params = {
+            'env': env,
+            'id': id,
+            'model_name': model_name,
+            'sb3_model': sb3_model,
+            'device': device,
+            'iterations': iterations,
+            'simulation_mode': simulation_mode,
+            'fps': fps
+        }
+        await self.join_stream('ball_on_plate', start_ball_on_plate, rung, params)
 
 
     # Video Cam Section
     async def stop_video_cam_handler(self):
-        if self._video_cam_thread and self._video_cam_thread.is_alive():
-            self._video_cam_stop_event.set()
-            self._video_cam_thread.join(timeout=2)
+        await self.leave_stream('video_cam')
 
-    async def run_video_cam_handler(self, platform, device_name, resolution, fps):
-        self._video_cam_stop_event.clear()
-        loop = asyncio.get_running_loop()
+    async def run_video_cam_handler(self, platform, device_name, resolution, fps, rung=None):
 
-        def run(loop):
+        def run(producer, stop_event):
 
             def raw_image_event(frame):
-                if not self._video_cam_stop_event.is_set():
-                    _, buffer = cv2.imencode('.jpg', frame)
-                    b64_image = base64.b64encode(buffer).decode('utf-8')
-
-                    # Sende die base64-Daten an den Client (über asyncio)
-                    asyncio.run_coroutine_threadsafe(
-                        self.send_response('video_cam', True, b64_image),
-                        loop
-                    )
+                # Der Frame gehört dem Capture-Hub und wird nur kopiert, wenn er kodiert wird
+                producer.publish(frame, copy=True)
+
             if platform == 'linux':
                 from src.video_capture.task import VideoCaptureLinux
+                model = VideoCaptureLinux()
             else:
                 from src.video_capture.task import VideoCaptureWindows
-            try:
-                if platform == 'linux':
-                    model = VideoCaptureLinux()
-                else:
-                    model = VideoCaptureWindows()
-                model.manual(device_name, resolution, fps)
-                model.run(
-                    None,
-                    raw_image_event,
-                    self._video_cam_stop_event
-                )
-            except Exception as e:
-                import traceback
-                traceback.print_exc()
-                print(e)
-                asyncio.run_coroutine_threadsafe(
-                    self.send_response('video_cam', False, e),
-                    loop
-                )
-
-        # Starte Thread
-        self._video_cam_thread = threading.Thread(target=run, args=(loop,), daemon=True)
-        self._video_cam_thread.start()
+                model = VideoCaptureWindows()
+            model.manual(device_name, resolution, fps)
+            model.run(
+                None,
+                raw_image_event,
+                stop_event
+            )
+
+        params = {
+            'platform': platform,
+            'device_name': device_name,
+            'resolution': resolution,
+            'fps': fps
+        }
+        await self.join_stream('video_cam', run, rung, params)
+
+
+    # Shared Streams Section
+    async def join_stream(self, name, target, rung=None, params=None):
+        # Viewers of a stream are members of its group, the first viewer starts the producer with its parameters
+        try:
+            rung = streams.get_encoder().rung(rung)
+        except ValueError as e:
+            await self.send_response(name, False, e)
+            return
+        await self.channel_layer.group_add(streams.group_name(name), self.channel_name)
+
+        # Without a chosen rung the rung follows the quality the connection can afford
+        self._streams[name] = rung
+        if rung is None:
+            rung = streams.get_encoder().rung_for_quality(self._frame_sender.quality)
+        try:
+            started = streams.join(name, self.channel_name, target, asyncio.get_running_loop(), rung, params)
+        except ValueError as e:
+            # Ein zweiter Zuschauer bekommt nicht stillschweigend den Stream mit anderen Parametern
+            del self._streams[name]
+            await self.channel_layer.group_discard(streams.group_name(name), self.channel_name)
+            await self.send_response(name, False, e)
+            return
+        if not started:
+            await self.send_response(name, True, 'Joined running stream')
+
+    async def leave_stream(self, name):
+        if name in self._streams:
+            del self._streams[name]
+            await self.channel_layer.group_discard(streams.group_name(name), self.channel_name)
+            streams.leave(name, self.channel_name)
+            self._frame_sender.forget(name)
+
+    async def stream_frame(self, event):
+        # Frame of a shared stream, every viewer sends it with its own rate and rung
+        task_id = event['task_id']
+        if task_id not in self._streams or not self._frame_sender.accept(task_id):
+            return
+
+        jpegs = event['jpegs']
+        rung = self._streams[task_id]
+        if rung is None:
+            rung = streams.get_encoder().rung_for_quality(self._frame_sender.quality)
+            streams.set_rung(task_id, self.channel_name, rung)
+
+        # After a change of the rung the frame may only be encoded for the previous rung
+        if jpegs[rung] is None:
+            rung = min((index for index, jpeg in enumerate(jpegs) if jpeg is not None), key=lambda index: abs(index - rung))
+        self._frame_sender.submit(task_id, event['frame_num'], jpegs[rung], event['stream'], event['timestamp'])
+
+    async def stream_telemetry(self, event):
+        # Controller state of every tick, not limited by the frame rate of the video
+        if event['task_id'] in self._streams:
+            self._frame_sender.submit_telemetry(event['task_id'], event['samples'])
+
+    async def stream_response(self, event):
+        await self.send_response(event['task_id'], event['success'], event['response'])
 
 
     async def send_response(self, task_id: str, success: bool, response):
@@ -385,4 +424,12 @@ class StewartPlatformConsumer(AsyncWebsocketConsumer):
             'task_id': task_id,
             'success': success,
             'response': str(response)
+        }))
+
+    async def send_stats(self, task_id: str, stats: dict):
+        # Statistics of the video stream, e.g. the number of dropped frames
+        await self.send(text_data=json.dumps({
+            'task_id': task_id,
+            'success': True,
+            'response': stats
         }))
\ No newline at end of file
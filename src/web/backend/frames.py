@@ -0,0 +1,355 @@
+import asyncio
+from collections import defaultdict, deque
+import logging
+import struct
+import threading
+import time
+
+from src.ball_on_plate.telemetry import Telemetry
+
+# Binary video frame: fixed header followed by the JPEG bytes
+# task code (u8), stream (u8), frame number (u32), timestamp in seconds since the epoch (f64), little endian
+FRAME_HEADER = struct.Struct("<BBId")
+
+# Task codes of the binary frames, must match TASK_CODES in websocket_handler.ts
+TASK_CODES = {
+    'video_cam': 1,
+    'ball_on_plate': 2,
+    'ball_on_plate_physical': 3
+}
+
+# Streams of a task, e.g. the virtual plate and the camera of the physical ball on plate
+STREAM_DEFAULT = 0
+STREAM_CAMERA = 1
+
+# Binary telemetry message: task code (u8), TELEMETRY_STREAM (u8) and number of samples (u16), followed by the samples
+# The stream byte tells telemetry apart from the video frames, which share the first two bytes of the header
+TELEMETRY_STREAM = 0xFF
+TELEMETRY_HEADER = struct.Struct("<BBH")
+
+# Telemetry sample: tick (u32), time in seconds since the epoch (f64), age of the measurement (f32, s)
+# and sx, sy, vx, vy, roll, pitch, target_x, target_y, error_x, error_y, integral_x, integral_y (f32), little endian
+TELEMETRY_SAMPLE = struct.Struct("<Id13f")
+
+def pack_frame(task_id: str, frame_num: int, jpeg, stream: int = STREAM_DEFAULT, timestamp: float = None) -> bytes:
+    """
+    Build a binary video frame
+
+    :param task_id: task the frame belongs to
+    :param frame_num: number of the frame, wraps at 2^32
+    :param jpeg: encoded image (bytes or the array returned by cv2.imencode)
+    :param stream: stream of the task
+    :param timestamp: capture time in seconds since the epoch, default is now
+    :return: header and JPEG bytes
+    """
+    header = FRAME_HEADER.pack(
+        TASK_CODES[task_id],
+        stream,
+        frame_num & 0xFFFFFFFF,
+        time.time() if timestamp is None else timestamp
+    )
+    return header + (jpeg if isinstance(jpeg, bytes) else jpeg.tobytes())
+
+def unpack_frame(data: bytes):
+    """
+    Split a binary video frame
+
+    :param data: header and JPEG bytes
+    :return: task id, stream, frame number, timestamp and JPEG bytes
+    """
+    code, stream, frame_num, timestamp = FRAME_HEADER.unpack_from(data)
+    task_id = next(task_id for task_id, task_code in TASK_CODES.items() if task_code == code)
+    return task_id, stream, frame_num, timestamp, data[FRAME_HEADER.size:]
+
+def pack_telemetry(task_id: str, samples) -> bytes:
+    """
+    Build a binary telemetry message
+
+    :param task_id: task the samples belong to
+    :param samples: list of (tick, Telemetry), at most 65535
+    :return: header and samples
+    """
+    packet = bytearray(TELEMETRY_HEADER.size + TELEMETRY_SAMPLE.size * len(samples))
+    TELEMETRY_HEADER.pack_into(packet, 0, TASK_CODES[task_id], TELEMETRY_STREAM, len(samples))
+    offset = TELEMETRY_HEADER.size
+    for tick, telemetry in samples:
+        telemetry = Telemetry(*telemetry)
+        TELEMETRY_SAMPLE.pack_into(
+            packet,
+            offset,
+            tick & 0xFFFFFFFF,
+            telemetry.time,
+            telemetry.time - telemetry.capture_ts,
+            *telemetry[2:]
+        )
+        offset += TELEMETRY_SAMPLE.size
+    return bytes(packet)
+
+def unpack_telemetry(data: bytes):
+    """
+    Split a binary telemetry message
+
+    :param data: header and samples
+    :return: task id and list of (tick, Telemetry), the float32 values are rounded
+    """
+    code, _, count = TELEMETRY_HEADER.unpack_from(data)
+    task_id = next(task_id for task_id, task_code in TASK_CODES.items() if task_code == code)
+    samples = []
+    for tick, timestamp, age, *values in TELEMETRY_SAMPLE.iter_unpack(data[TELEMETRY_HEADER.size:]):
+        samples.append((tick, Telemetry(timestamp, timestamp - age, *values)))
+    return task_id, samples
+
+class FrameSender:
+    """
+    Per connection sender of the binary video frames
+
+    Every stream has a single slot. A frame that has not been sent yet is replaced by the next one, so a slow
+    browser or network drops frames instead of queueing them. The browser acknowledges every frame and only
+    max_in_flight frames may be unacknowledged, the other frames wait in their slots. The server writes into
+    the transport without backpressure, so the acknowledgements are the only signal of the actual delivery:
+    the frame rate and the JPEG quality follow the measured delivery time.
+
+    Telemetry is not rate limited and not acknowledged. The samples that arrive while a message is being sent
+    are sent together in the next telemetry message, before the frames.
+    """
+
+    def __init__(self, send, send_stats=None, max_fps: float = 30.0, min_quality: int = 40, max_quality: int = 90, stats_interval: float = 1.0, max_telemetry: int = 1024, max_in_flight: int = 2, ack_timeout: float = 2.0, logger=None):
+        """
+        Initialize the sender, start must be called from the event loop
+
+        :param send: coroutine function of the consumer that sends bytes_data
+        :param send_stats: optional coroutine function called with the task id and its statistics
+        :param max_fps: upper limit of the frame rate per task
+        :param min_quality: lowest JPEG quality
+        :param max_quality: highest JPEG quality
+        :param stats_interval: interval of the statistics reports (s)
+        :param max_telemetry: telemetry samples queued per task, the oldest are dropped beyond
+        :param max_in_flight: frames of all streams that may be sent but not acknowledged
+        :param ack_timeout: time after which a frame without acknowledgement counts as lost (s)
+        """
+        self.logger = logger or logging.getLogger("StewartPlatform.FrameSender")
+        self.send = send
+        self.send_stats = send_stats
+        self.min_interval = 1 / max_fps
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.stats_interval = stats_interval
+        self.max_in_flight = max_in_flight
+        self.ack_timeout = ack_timeout
+
+        # Latest frame number and packed frame by (task id, stream), filled by the producer threads
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.max_telemetry = max_telemetry
+        self.telemetry = {} # Queued telemetry samples by task id
+        self.ticks = {} # Last received tick by task id, a gap is telemetry lost in the channel layer
+        self.in_flight = {} # Send time of the unacknowledged frames by (task id, stream, frame number)
+        self.loop = None
+        self.wakeup = None
+
+        # Adaptation
+        self.delivery_time = 0.0 # Moving average of the time from sending a frame until its acknowledgement (s)
+        self.quality = max_quality
+        self.last_accepted = defaultdict(float)
+
+        # Statistics by task id
+        self.stats = defaultdict(lambda: {"sent": 0, "dropped": 0, "skipped": 0, "unacknowledged": 0, "telemetry": 0, "telemetry_dropped": 0, "telemetry_lost": 0})
+
+        self.running = False
+        self.task = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        self.running = True
+        self.task = self.loop.create_task(self.run())
+
+    def frame_time(self) -> float:
+        """
+        :return: delivery time per frame with max_in_flight frames on the way (s)
+        """
+        return self.delivery_time / self.max_in_flight
+
+    def interval(self) -> float:
+        """
+        :return: minimum time between two frames of a task (s), at least the delivery time per frame
+        """
+        return max(self.min_interval, 1.25 * self.frame_time())
+
+    def accept(self, task_id: str) -> bool:
+        """
+        Check in the producer thread if the next frame should be encoded and submitted
+
+        :param task_id: task of the frame
+        :return: False if the frame comes too early for the current frame rate and should be skipped
+        """
+        now = time.monotonic()
+        with self.lock:
+            if not self.running:
+                return False
+            if now - self.last_accepted[task_id] < self.interval():
+                self.stats[task_id]["skipped"] += 1
+                return False
+            self.last_accepted[task_id] = now
+            return True
+
+    def submit(self, task_id: str, frame_num: int, jpeg, stream: int = STREAM_DEFAULT, timestamp: float = None):
+        """
+        Put a frame into the slot of its stream, thread safe and non-blocking
+
+        :param task_id: task the frame belongs to
+        :param frame_num: number of the frame
+        :param jpeg: encoded image
+        :param stream: stream of the task
+        :param timestamp: capture time in seconds since the epoch, default is now
+        """
+        packet = pack_frame(task_id, frame_num, jpeg, stream, timestamp)
+        with self.lock:
+            if not self.running:
+                return
+            key = (task_id, stream)
+            if key in self.slots:
+                self.stats[task_id]["dropped"] += 1
+            empty = not self.slots
+            self.slots[key] = (frame_num & 0xFFFFFFFF, packet)
+
+        # Only wake up the sender if it is not woken up already, frames waiting for acknowledgements are woken up by ack
+        if empty:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def ack(self, task_id: str, stream: int, frame_num: int):
+        """
+        Acknowledgement of a frame by the browser, called from the event loop
+
+        :param task_id: task of the frame
+        :param stream: stream of the frame
+        :param frame_num: number of the frame as in its header
+        """
+        with self.lock:
+            sent = self.in_flight.pop((task_id, stream, frame_num), None)
+            if sent is None:
+                return
+            self.adapt(time.monotonic() - sent)
+        self.wakeup.set()
+
+    def submit_telemetry(self, task_id: str, samples):
+        """
+        Queue telemetry samples, thread safe and non-blocking
+
+        :param task_id: task the samples belong to
+        :param samples: list of (tick, Telemetry)
+        """
+        with self.lock:
+            if not self.running or not samples:
+                return
+            # The channel layer drops messages to a full channel silently, the ticks of the producer are consecutive
+            last = self.ticks.get(task_id)
+            if last is not None and samples[0][0] > last + 1:
+                self.stats[task_id]["telemetry_lost"] += samples[0][0] - last - 1
+            self.ticks[task_id] = samples[-1][0]
+
+            # Telemetry does not wait for the acknowledgements of the frames
+            empty = not self.telemetry
+            queue = self.telemetry.setdefault(task_id, deque(maxlen=self.max_telemetry))
+            overflow = len(queue) + len(samples) - self.max_telemetry
+            if overflow > 0:
+                self.stats[task_id]["telemetry_dropped"] += overflow
+            queue.extend(samples)
+
+        if empty:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def run(self):
+        last_stats = time.monotonic()
+        while self.running:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.ack_timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+            now = time.monotonic()
+            with self.lock:
+                self.expire(now)
+
+                # Only as many frames as the window allows, the others stay in their slots and may be replaced
+                free = max(self.max_in_flight - len(self.in_flight), 0)
+                slots = [(key, *self.slots.pop(key)) for key in list(self.slots)[:free]]
+                for (task_id, stream), frame_num, _ in slots:
+                    self.in_flight[(task_id, stream, frame_num)] = now
+                telemetry, self.telemetry = self.telemetry, {}
+
+            try:
+                # Telemetry first, it is small and every sample counts
+                for task_id, samples in telemetry.items():
+                    await self.send(bytes_data=pack_telemetry(task_id, list(samples)))
+                    with self.lock:
+                        self.stats[task_id]["telemetry"] += len(samples)
+
+                for (task_id, _), _, packet in slots:
+                    await self.send(bytes_data=packet)
+                    with self.lock:
+                        self.stats[task_id]["sent"] += 1
+
+                now = time.monotonic()
+                if self.send_stats and now - last_stats >= self.stats_interval:
+                    last_stats = now
+                    for task_id in list(self.stats):
+                        await self.send_stats(task_id, self.report(task_id))
+            except Exception as e:
+                # The connection is closed
+                self.logger.error(f"Failed to send frame: {e}")
+                with self.lock:
+                    self.running = False
+                return
+
+    def expire(self, now: float):
+        # Frames without acknowledgement count as delivered after the timeout, so a lost acknowledgement does not block the stream
+        for key, sent in list(self.in_flight.items()):
+            if now - sent > self.ack_timeout:
+                del self.in_flight[key]
+                self.stats[key[0]]["unacknowledged"] += 1
+                self.adapt(self.ack_timeout)
+
+    def adapt(self, delivery_time: float):
+        # Moving average of the delivery time, the quality is lowered if the window cannot deliver the maximum frame rate
+        self.delivery_time = delivery_time if self.delivery_time == 0 else 0.8 * self.delivery_time + 0.2 * delivery_time
+        if self.frame_time() > self.min_interval:
+            self.quality = max(self.min_quality, self.quality - 5)
+        elif self.frame_time() < 0.5 * self.min_interval:
+            self.quality = min(self.max_quality, self.quality + 1)
+
+    def forget(self, task_id: str):
+        """
+        Forget the last tick of a task when its stream is left, the ticks of a later stream start anew
+
+        :param task_id: task of the stream
+        """
+        with self.lock:
+            self.ticks.pop(task_id, None)
+
+    def report(self, task_id: str):
+        """
+        :return: dictionary with the sent, dropped, skipped and unacknowledged frames, the sent, dropped and lost telemetry samples of the task,
+            the current frame rate limit and JPEG quality, the mean delivery time (s) and the unacknowledged frames of the connection
+        """
+        with self.lock:
+            return {
+                **self.stats[task_id],
+                "fps": round(1 / self.interval(), 1),
+                "quality": self.quality,
+                "delivery_time": round(self.delivery_time, 4),
+                "in_flight": len(self.in_flight)
+            }
+
+    async def stop(self):
+        with self.lock:
+            self.running = False
+            self.slots.clear()
+            self.telemetry.clear()
+            self.ticks.clear()
+            self.in_flight.clear()
+        if self.task:
+            self.wakeup.set()
+            await self.task
+            self.task = None
@@ -0,0 +1,268 @@
+import asyncio
+from collections import deque
+import logging
+import threading
+import time
+
+from channels.layers import get_channel_layer
+
+from src.video_capture.encoder import StreamEncoder
+
+# Running producers by stream name, shared by all connections of the server
+_producers = {}
+_producers_lock = threading.Lock()
+
+# Encoder pool shared by all producers
+_encoder = None
+_encoder_lock = threading.Lock()
+
+def get_encoder() -> StreamEncoder:
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = StreamEncoder()
+        return _encoder
+
+def group_name(name: str) -> str:
+    """
+    :param name: name of the stream
+    :return: name of the channel layer group of the viewers
+    """
+    return f"stream_{name}"
+
+class StreamProducer:
+    """
+    One task that produces the frames of a stream for all viewers
+
+    Every frame is encoded once per rung of the ladder that a viewer uses and published to the channel layer
+    group of the stream. A frame is dropped if the previous one is still being encoded or published,
+    so the producer never queues frames. Telemetry is published for every tick, the ticks that come
+    while the event loop is busy are published together.
+    """
+
+    def __init__(self, name: str, target, loop, params: dict = None, max_telemetry: int = 1024, logger=None):
+        """
+        Initialize the producer, start runs the target in a separate thread
+
+        :param name: name of the stream, e.g. the task id
+        :param target: function called with the producer and the stop event, runs the task and calls publish for every frame
+        :param loop: event loop of the server, the frames are published on it
+        :param params: parameters the task was started with, viewers can only join with the same parameters
+        :param max_telemetry: telemetry samples waiting for the event loop, the oldest are dropped beyond
+        """
+        self.logger = logger or logging.getLogger("StewartPlatform.StreamProducer")
+        self.name = name
+        self.group = group_name(name)
+        self.target = target
+        self.loop = loop
+        self.params = params or {}
+        self.layer = get_channel_layer()
+        self.encoder = get_encoder()
+
+        # Rung of the ladder by viewer
+        self.viewers = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Statistics
+        self.frame_num = 0
+        self.frames_published = 0
+        self.frames_dropped = 0
+        self.pending = None # Future of the frame that is being encoded or published
+
+        # Telemetry samples waiting for the event loop
+        self.tick = 0
+        self.telemetry = deque(maxlen=max_telemetry)
+        self.telemetry_lock = threading.Lock()
+        self.telemetry_scheduled = False
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            self.target(self, self.stop_event)
+        except Exception as e:
+            self.logger.exception(f"Stream {self.name} failed")
+            self.respond(False, e)
+        finally:
+            self.respond(False, f"Stream {self.name} ended")
+            with _producers_lock:
+                if _producers.get(self.name) is self:
+                    del _producers[self.name]
+
+    def publish(self, image, stream: int = 0, timestamp: float = None, copy: bool = False):
+        """
+        Encode a BGR frame in the encoder pool and publish it to all viewers, called from the producer thread
+
+        :param image: BGR frame, must not be modified afterwards
+        :param stream: stream of the task
+        :param timestamp: capture time in seconds since the epoch, default is now
+        :param copy: copy the frame before it is handed to the encoder pool, for frames that are only valid during the call
+        """
+        self.frame_num += 1
+        if self.stop_event.is_set():
+            return
+        if self.pending is not None and not self.pending.done():
+            self.frames_dropped += 1
+            return
+
+        # Only the rungs used by the viewers are encoded
+        with _producers_lock:
+            rungs = sorted(set(self.viewers.values())) or [0]
+        frame_num = self.frame_num
+        timestamp = time.time() if timestamp is None else timestamp
+        encoding = self.encoder.submit(image.copy() if copy else image, rungs)
+        self.pending = encoding
+        encoding.add_done_callback(lambda future: self._encoded(future, stream, frame_num, timestamp))
+
+    def _encoded(self, future, stream, frame_num, timestamp):
+        # Runs in the encoder thread
+        try:
+            jpegs = future.result()
+        except Exception as e:
+            self.logger.error(f"Failed to encode frame of stream {self.name}: {e}")
+            return
+
+        self.pending = asyncio.run_coroutine_threadsafe(
+            self.layer.group_send(self.group, {
+                'type': 'stream.frame',
+                'task_id': self.name,
+                'stream': stream,
+                'frame_num': frame_num,
+                'timestamp': timestamp,
+                'jpegs': jpegs
+            }),
+            self.loop
+        )
+        self.frames_published += 1
+
+    def publish_telemetry(self, telemetry):
+        """
+        Publish the controller state of a tick to all viewers, called from the producer thread
+
+        :param telemetry: Telemetry of the tick
+        """
+        self.tick += 1
+        if self.stop_event.is_set():
+            return
+        with self.telemetry_lock:
+            self.telemetry.append((self.tick, tuple(telemetry)))
+            if self.telemetry_scheduled:
+                return
+            self.telemetry_scheduled = True
+        self.loop.call_soon_threadsafe(self._flush_telemetry)
+
+    def _flush_telemetry(self):
+        # Runs in the event loop, all samples since the last flush go out in one group message
+        with self.telemetry_lock:
+            samples = list(self.telemetry)
+            self.telemetry.clear()
+            self.telemetry_scheduled = False
+        self.loop.create_task(self.layer.group_send(self.group, {
+            'type': 'stream.telemetry',
+            'task_id': self.name,
+            'samples': samples
+        }))
+
+    def respond(self, success: bool, response):
+        """
+        Send a control message to all viewers, called from the producer thread
+        """
+        asyncio.run_coroutine_threadsafe(
+            self.layer.group_send(self.group, {
+                'type': 'stream.response',
+                'task_id': self.name,
+                'success': success,
+                'response': str(response)
+            }),
+            self.loop
+        )
+
+    def stop(self, timeout: float = 2):
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+
+def mismatched_params(producer: StreamProducer, params: dict) -> dict:
+    """
+    Parameters a viewer left out (None) accept any value of the running producer
+
+    :param producer: running producer of the stream
+    :param params: parameters requested by the viewer
+    :return: parameters of the producer that differ from the requested ones
+    """
+    return {
+        key: producer.params.get(key)
+        for key, value in params.items()
+        if value is not None and producer.params.get(key) != value
+    }
+
+def join(name: str, channel_name: str, target, loop, rung: int = 0, params: dict = None) -> bool:
+    """
+    Add a viewer to a stream, the producer of the stream is started by the first viewer
+
+    :param name: name of the stream
+    :param channel_name: channel of the viewer
+    :param target: function that runs the task, see StreamProducer
+    :param loop: event loop of the server
+    :param rung: index of the rung of the ladder the viewer receives
+    :param params: parameters of the task, a running producer is only joined if they match
+    :return: True if the viewer started the producer, False if it joined a running producer
+    :raises ValueError: if the stream is running with other parameters
+    """
+    params = params or {}
+    with _producers_lock:
+        producer = _producers.get(name)
+        started = producer is None
+        if started:
+            producer = StreamProducer(name, target, loop, params)
+            _producers[name] = producer
+        else:
+            mismatched = mismatched_params(producer, params)
+            if mismatched:
+                running = ", ".join(f"{key}={value}" for key, value in mismatched.items())
+                raise ValueError(f"Stream is running with other parameters: {running}")
+        producer.viewers[channel_name] = rung
+    if started:
+        producer.start()
+    return started
+
+def leave(name: str, channel_name: str):
+    """
+    Remove a viewer from a stream, the producer is stopped with the last viewer
+
+    :param name: name of the stream
+    :param channel_name: channel of the viewer
+    """
+    with _producers_lock:
+        producer = _producers.get(name)
+        if producer is None or channel_name not in producer.viewers:
+            return
+        del producer.viewers[channel_name]
+        if producer.viewers:
+            return
+        del _producers[name]
+    producer.stop()
+
+def set_rung(name: str, channel_name: str, rung: int):
+    """
+    Change the rung of a viewer, the producer encodes it from the next frame on
+
+    :param name: name of the stream
+    :param channel_name: channel of the viewer
+    :param rung: index of the rung of the ladder
+    """
+    with _producers_lock:
+        producer = _producers.get(name)
+        if producer is not None and channel_name in producer.viewers:
+            producer.viewers[channel_name] = rung
+
+def is_viewing(name: str, channel_name: str) -> bool:
+    """
+    :return: True if the viewer is watching the running producer of the stream
+    """
+    with _producers_lock:
+        producer = _producers.get(name)
+        return producer is not None and channel_name in producer.viewers
@@ -9,7 +9,164 @@ export enum TaskId {
 
 export enum State {
     CONNECT = 'connect',
-    DISCONNECT = 'disconnect'
+    DISCONNECT = 'disconnect',
+    ACK = 'ack'
+}
+
+/**
+ * Task codes of the binary video frames, must match TASK_CODES in src/web/backend/frames.py
+ */
+const TASK_CODES: { [code: number]: TaskId } = {
+    1: TaskId.VIDEO_CAM,
+    2: TaskId.BALL_ON_PLATE,
+    3: TaskId.BALL_ON_PLATE_PHYSICAL
+};
+
+/**
+ * Size of the header of a binary video frame:
+ * task code (u8), stream (u8), frame number (u32), timestamp in seconds (f64), little endian
+ */
+const FRAME_HEADER_SIZE = 14;
+
+/**
+ * Stream byte of the binary telemetry messages, must match TELEMETRY_STREAM in src/web/backend/frames.py
+ */
+const TELEMETRY_STREAM = 0xFF;
+
+/**
+ * Size of the header of a binary telemetry message: task code (u8), TELEMETRY_STREAM (u8), number of samples (u16)
+ */
+const TELEMETRY_HEADER_SIZE = 4;
+
+/**
+ * Size of a telemetry sample: tick (u32), time in seconds (f64), age of the measurement (f32) and 12 values (f32)
+ */
+const TELEMETRY_SAMPLE_SIZE = 64;
+
+/**
+ * Statistics of a video stream, sent by the backend as JSON response about once per second
+ */
+export interface StreamStats {
+    sent: number;
+    dropped: number;
+    skipped: number;
+    unacknowledged: number;
+    fps: number;
+    quality: number;
+    delivery_time: number;
+    in_flight: number;
+    telemetry: number;
+    telemetry_dropped: number;
+    telemetry_lost: number;
+}
+
+/**
+ * Binary video frame with the JPEG image
+ */
+export class StreamFrame {
+
+    public task_id: TaskId;
+    public stream: number;
+    public frame_num: number;
+    public timestamp: number;
+    public image: Blob;
+
+    constructor(task_id: TaskId, stream: number, frame_num: number, timestamp: number, image: Blob) {
+        this.task_id = task_id;
+        this.stream = stream;
+        this.frame_num = frame_num;
+        this.timestamp = timestamp;
+        this.image = image;
+    }
+
+    /**
+     * Parses a binary message of the backend.
+     * @param {ArrayBuffer} data - Header followed by the JPEG bytes.
+     * @returns {StreamFrame | undefined} The frame or undefined if the task code is unknown.
+     */
+    public static parse(data: ArrayBuffer): StreamFrame | undefined {
+        const view = new DataView(data);
+        const task_id = TASK_CODES[view.getUint8(0)];
+        if (!task_id) {
+            return undefined;
+        }
+        return new StreamFrame(
+            task_id,
+            view.getUint8(1),
+            view.getUint32(2, true),
+            view.getFloat64(6, true),
+            new Blob([data.slice(FRAME_HEADER_SIZE)], { type: 'image/jpeg' })
+        );
+    }
+}
+
+/**
+ * Controller state of one tick of the control loop, positions in m, velocities in m/s and angles in degree
+ */
+export class TelemetrySample {
+
+    public tick: number;
+    public time: number;
+    public capture_ts: number;
+    public sx: number;
+    public sy: number;
+    public vx: number;
+    public vy: number;
+    public roll: number;
+    public pitch: number;
+    public target_x: number;
+    public target_y: number;
+    public error_x: number;
+    public error_y: number;
+    public integral_x: number;
+    public integral_y: number;
+
+    private constructor(view: DataView, offset: number) {
+        const value = (index: number) => view.getFloat32(offset + 16 + 4 * index, true);
+        this.tick = view.getUint32(offset, true);
+        this.time = view.getFloat64(offset + 4, true);
+        this.capture_ts = this.time - view.getFloat32(offset + 12, true);
+        this.sx = value(0);
+        this.sy = value(1);
+        this.vx = value(2);
+        this.vy = value(3);
+        this.roll = value(4);
+        this.pitch = value(5);
+        this.target_x = value(6);
+        this.target_y = value(7);
+        this.error_x = value(8);
+        this.error_y = value(9);
+        this.integral_x = value(10);
+        this.integral_y = value(11);
+    }
+
+    /**
+     * Checks if a binary message of the backend is a telemetry message.
+     * @param {ArrayBuffer} data - The binary message.
+     * @returns {boolean} True for telemetry, false for a video frame.
+     */
+    public static is_telemetry(data: ArrayBuffer): boolean {
+        return data.byteLength >= TELEMETRY_HEADER_SIZE && new DataView(data).getUint8(1) == TELEMETRY_STREAM;
+    }
+
+    /**
+     * Parses a binary telemetry message of the backend.
+     * @param {ArrayBuffer} data - Header followed by the samples.
+     * @returns {[TaskId, TelemetrySample[]] | undefined} The task and its samples or undefined if the task code is unknown.
+     */
+    public static parse(data: ArrayBuffer): [TaskId, TelemetrySample[]] | undefined {
+        const view = new DataView(data);
+        const task_id = TASK_CODES[view.getUint8(0)];
+        if (!task_id) {
+            return undefined;
+        }
+        const samples: TelemetrySample[] = [];
+        const count = view.getUint16(2, true);
+        for (let i = 0; i < count; i++) {
+            samples.push(new TelemetrySample(view, TELEMETRY_HEADER_SIZE + i * TELEMETRY_SAMPLE_SIZE));
+        }
+        return [task_id, samples];
+    }
 }
 
 export class WebSocketHandlerListener {
@@ -17,11 +174,15 @@ export class WebSocketHandlerListener {
     public id: number;
     public task_id: TaskId;
     public event: (success: boolean, payload: object) => void;
+    public frame_event?: (frame: StreamFrame) => void;
+    public telemetry_event?: (samples: TelemetrySample[]) => void;
 
-    constructor(id: number, task_id: TaskId, event: (success: boolean, payload: object) => void) {
+    constructor(id: number, task_id: TaskId, event: (success: boolean, payload: object) => void, frame_event?: (frame: StreamFrame) => void, telemetry_event?: (samples: TelemetrySample[]) => void) {
         this.id = id;
         this.task_id = task_id;
         this.event = event;
+        this.frame_event = frame_event;
+        this.telemetry_event = telemetry_event;
     }
 }
 
@@ -54,6 +215,7 @@ class WebSocketHandler {
 
     public connect(): void {
         this.websocket = new WebSocket(`ws://${this.url}`);
+        this.websocket.binaryType = 'arraybuffer';
 
         this.websocket.addEventListener('open', event => {
             if (this.switchElement) {
@@ -63,6 +225,40 @@ class WebSocketHandler {
         });
 
         this.websocket.addEventListener('message', event => {
+            // Binary messages are telemetry or video frames
+            if (event.data instanceof ArrayBuffer && TelemetrySample.is_telemetry(event.data)) {
+                const telemetry = TelemetrySample.parse(event.data);
+                if (telemetry) {
+                    const [task_id, samples] = telemetry;
+                    for (let i = 0; i < this.listener.length; i++) {
+                        if (this.listener[i].task_id == task_id) {
+                            this.listener[i].telemetry_event?.(samples);
+                        }
+                    }
+                }
+                return;
+            }
+            if (event.data instanceof ArrayBuffer) {
+                const frame = StreamFrame.parse(event.data);
+                if (frame) {
+                    // Acknowledge the frame, the backend only sends the next frames after the acknowledgements
+                    this.websocket?.send(JSON.stringify({
+                        'task_id': frame.task_id,
+                        'state': State.ACK,
+                        'payload': {
+                            'stream': frame.stream,
+                            'frame_num': frame.frame_num
+                        }
+                    }));
+                    for (let i = 0; i < this.listener.length; i++) {
+                        if (this.listener[i].task_id == frame.task_id) {
+                            this.listener[i].frame_event?.(frame);
+                        }
+                    }
+                }
+                return;
+            }
+
             const message = JSON.parse(event.data);
             console.log(message);
             const {task_id, success, response} = message;
@@ -97,12 +293,12 @@ class WebSocketHandler {
         return false;
     }
 
-    public static subscribe(id: number, task_id: TaskId, event: (success: boolean, payload: object) => void): void {
+    public static subscribe(id: number, task_id: TaskId, event: (success: boolean, payload: object) => void, frame_event?: (frame: StreamFrame) => void, telemetry_event?: (samples: TelemetrySample[]) => void): void {
         if (!this.wsh) {
             throw new WebSocketHandlerError('There is no WebSocketHandler instance!');
         }
         else {
-            this.wsh.listener.push(new WebSocketHandlerListener(id, task_id, event));
+            this.wsh.listener.push(new WebSocketHandlerListener(id, task_id, event, frame_event, telemetry_event));
         }
     }
 
@@ -1,4 +1,4 @@
-import WebSocketHandler, { State, TaskId } from "../../websocket_handler.js";
+import WebSocketHandler, { State, StreamFrame, StreamStats, TaskId } from "../../websocket_handler.js";
 import Frame from "../frame.js";
 import ImageStream from "./elements/image_stream.js";
 import MenuBar, { MenuBarItem } from "./elements/menu_bar.js";
@@ -65,25 +65,19 @@ class BallOnPlatePhysical extends Frame {
      */
     private connect(): void {
         WebSocketHandler.subscribe(this.id, TaskId.BALL_ON_PLATE_PHYSICAL, (state: boolean, payload: any) => {
-            if (this.image_stream) {
-                if (state) {
-                    try {
-                        if (payload) {
-                            const frame = payload[this.selected_task];
-                            // response is expected to be a base64 string
-                            const img = new Image();
-                            img.onload = () => {
-                                this.image_stream?.drawFrame(img);
-                            };
-                            img.src = `data:image/jpeg;base64,${frame}`;
-                        }
-                    } catch (e) {
-                        throw new BallOnPlatePhysicalError("Failed to parse message or draw frame: " + e);
-                    }
-                }
-                else {
-                    this.image_stream?.stop();
-                }
+            // JSON messages report the state of the task and the statistics of the stream
+            if (this.image_stream && !state) {
+                this.image_stream.stop();
+            }
+            else if (this.image_stream && payload) {
+                this.image_stream.showStats(payload as StreamStats);
+            }
+        }, (frame: StreamFrame) => {
+            // Only the frames of the selected view are drawn
+            if (this.image_stream && frame.stream == this.selected_stream()) {
+                this.image_stream.drawBlob(frame.image).catch(e => {
+                    console.log(new BallOnPlatePhysicalError("Failed to draw frame: " + e));
+                });
             }
         });
     }
@@ -154,6 +148,14 @@ class BallOnPlatePhysical extends Frame {
         this.setContent();
     }
 
+    /**
+     * Stream of the binary frames shown by the selected task, must match the streams in src/web/backend/frames.py.
+     * @returns {number} 0 for the virtual plate, 1 for the camera stream.
+     */
+    private selected_stream(): number {
+        return this.selected_task == MenuBarTask.STREAM ? 1 : 0;
+    }
+
     /**
      * Sets the content of the Control Panel based on the selected task.
      * 
@@ -1,6 +1,7 @@
-import WebSocketHandler, { State, TaskId } from "../../websocket_handler.js";
+import WebSocketHandler, { State, StreamFrame, StreamStats, TaskId, TelemetrySample } from "../../websocket_handler.js";
 import Frame from "../frame.js";
 import ImageStream from "./elements/image_stream.js";
+import TelemetryPlot from "./elements/telemetry_plot.js";
 
 /**
  * BallOnPlateError is a custom error class for handling errors specific to the Ball On Plate simulation.
@@ -25,6 +26,7 @@ class BallOnPlateSimulation extends Frame {
 
     private static instance?: BallOnPlateSimulation;
     image_stream?: ImageStream;
+    telemetry_plot?: TelemetryPlot;
     
     /**
      * Creates a BallOnPlate frame.
@@ -57,25 +59,23 @@ class BallOnPlateSimulation extends Frame {
      */
     private connect(): void {
         WebSocketHandler.subscribe(this.id, TaskId.BALL_ON_PLATE, (state: boolean, payload: object) => {
+            // JSON messages report the state of the task and the statistics of the stream
+            if (this.image_stream && !state) {
+                this.image_stream.stop();
+            }
+            else if (this.image_stream && payload) {
+                this.image_stream.showStats(payload as StreamStats);
+            }
+        }, (frame: StreamFrame) => {
+            // Binary frame with the JPEG image
             if (this.image_stream) {
-                if (state) {
-                    try {
-                        if (payload) {
-                            // response is expected to be a base64 string
-                            const img = new Image();
-                            img.onload = () => {
-                                this.image_stream?.drawFrame(img);
-                            };
-                            img.src = `data:image/jpeg;base64,${payload}`;
-                        }
-                    } catch (e) {
-                        throw new BallOnPlateSimulationError("Failed to parse message or draw frame: " + e);
-                    }
-                }
-                else {
-                    this.image_stream?.stop();
-                }
+                this.image_stream.drawBlob(frame.image).catch(e => {
+                    console.log(new BallOnPlateSimulationError("Failed to draw frame: " + e));
+                });
             }
+        }, (samples: TelemetrySample[]) => {
+            // Controller state of every step, independent of the frame rate of the video
+            this.telemetry_plot?.add(samples);
         });
     }
 
@@ -114,14 +114,16 @@ class BallOnPlateSimulation extends Frame {
     }
 
     /**
-     * Builds the Ball On Plate frame UI by initializing the image stream and appending it to the container.
+     * Builds the Ball On Plate frame UI by initializing the image stream and the telemetry plot and appending them to the container.
      * @param container - The HTML container element for the frame.
      * @private
      */
     private build(container: HTMLElement): void {
         this.image_stream = new ImageStream(512, 632, this.start, this.stop);
-        container.style.maxHeight = "632px";
+        this.telemetry_plot = new TelemetryPlot(512, 120);
+        container.style.maxHeight = "800px";
         container.appendChild(this.image_stream.element);
+        container.appendChild(this.telemetry_plot.element);
     }
 
     /**
@@ -130,6 +132,7 @@ class BallOnPlateSimulation extends Frame {
      */
     private start = (): void => {
         console.log("BallOnPlate: Start");
+        this.telemetry_plot?.clear();
         this.connect();
         this.send();
     }
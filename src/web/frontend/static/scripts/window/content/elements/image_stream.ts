@@ -1,3 +1,4 @@
+import { StreamStats } from "../../../websocket_handler.js";
 import StreamButton from "./stream_button.js";
 
 class ImageStreamError extends Error {
@@ -14,6 +15,7 @@ class ImageStream extends StreamButton {
     private canvas: HTMLCanvasElement;
     private ctx: CanvasRenderingContext2D | null;
     private death_screen: HTMLImageElement;
+    private stats: HTMLElement;
 
     constructor(width: number, height: number, start_event: () => void, stop_event: () => void) {
         super(start_event, stop_event);
@@ -25,6 +27,10 @@ class ImageStream extends StreamButton {
         this.element.appendChild(canvas);
         this.element.appendChild(this.stream_buttons);
 
+        this.stats = document.createElement('div');
+        this.stats.className = 'image_stream_stats';
+        this.element.appendChild(this.stats);
+
         const ctx = canvas.getContext('2d');
 
         this.canvas = canvas;
@@ -35,10 +41,30 @@ class ImageStream extends StreamButton {
         this.death_screen.alt = 'Deathscreen';
     }
 
-    drawFrame(image: HTMLImageElement) {
+    drawFrame(image: CanvasImageSource) {
         this.ctx?.clearRect(0, 0, this.canvas.width, this.canvas.height);
         this.ctx?.drawImage(image, 0, 0, this.canvas.width, this.canvas.height);
     }
+
+    /**
+     * Shows the statistics of the stream below the image.
+     * @param {StreamStats} stats - Statistics reported by the backend.
+     * @returns {void}
+     */
+    showStats(stats: StreamStats): void {
+        this.stats.textContent = `${stats.fps} fps, quality ${stats.quality}, sent ${stats.sent}, dropped ${stats.dropped}, skipped ${stats.skipped}, in flight ${stats.in_flight}`;
+    }
+
+    /**
+     * Decodes a JPEG image off the main thread and draws it.
+     * @param {Blob} image - The JPEG image.
+     * @returns {Promise<void>}
+     */
+    async drawBlob(image: Blob): Promise<void> {
+        const bitmap = await createImageBitmap(image);
+        this.drawFrame(bitmap);
+        bitmap.close();
+    }
 }
 
 export default ImageStream;
\ No newline at end of file
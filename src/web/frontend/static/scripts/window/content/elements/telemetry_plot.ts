@@ -0,0 +1,127 @@
+import { TelemetrySample } from "../../../websocket_handler.js";
+
+/**
+ * Rolling plot of the controller telemetry.
+ *
+ * Samples arrive at the rate of the control loop, the plot is redrawn at most once per animation frame.
+ */
+class TelemetryPlot {
+
+    public readonly element: HTMLElement;
+    private canvas: HTMLCanvasElement;
+    private ctx: CanvasRenderingContext2D | null;
+    private readout: HTMLElement;
+    private samples: TelemetrySample[] = [];
+    private time_span: number;
+    private range: number;
+    private redraw_requested: boolean = false;
+
+    /**
+     * Creates a telemetry plot.
+     * @param {number} width - Width of the canvas in pixel.
+     * @param {number} height - Height of the canvas in pixel.
+     * @param {number} time_span - Time span of the plot in seconds.
+     * @param {number} range - Largest error shown in meters, the plot goes from -range to range.
+     */
+    constructor(width: number, height: number, time_span: number = 10, range: number = 0.15) {
+        this.element = document.createElement('div');
+        this.element.className = 'telemetry_plot';
+        this.time_span = time_span;
+        this.range = range;
+
+        this.canvas = document.createElement('canvas');
+        this.canvas.width = width;
+        this.canvas.height = height;
+        this.ctx = this.canvas.getContext('2d');
+        this.element.appendChild(this.canvas);
+
+        this.readout = document.createElement('div');
+        this.readout.className = 'telemetry_plot_readout';
+        this.element.appendChild(this.readout);
+    }
+
+    /**
+     * Adds the samples of a telemetry message and schedules a redraw.
+     * @param {TelemetrySample[]} samples - Samples in the order of the ticks.
+     * @returns {void}
+     */
+    add(samples: TelemetrySample[]): void {
+        if (samples.length == 0) {
+            return;
+        }
+        this.samples.push(...samples);
+
+        // Keep the samples of the visible time span
+        const start = samples[samples.length - 1].time - this.time_span;
+        let first = 0;
+        while (first < this.samples.length && this.samples[first].time < start) {
+            first++;
+        }
+        this.samples.splice(0, first);
+
+        if (!this.redraw_requested) {
+            this.redraw_requested = true;
+            requestAnimationFrame(() => this.draw());
+        }
+    }
+
+    /**
+     * Removes all samples.
+     * @returns {void}
+     */
+    clear(): void {
+        this.samples = [];
+        this.readout.textContent = '';
+        this.ctx?.clearRect(0, 0, this.canvas.width, this.canvas.height);
+    }
+
+    private draw(): void {
+        this.redraw_requested = false;
+        if (!this.ctx || this.samples.length == 0) {
+            return;
+        }
+        const ctx = this.ctx;
+        const width = this.canvas.width;
+        const height = this.canvas.height;
+        const end = this.samples[this.samples.length - 1].time;
+        const x = (time: number) => width * (1 - (end - time) / this.time_span);
+        const y = (value: number) => height * (0.5 - 0.5 * Math.max(-1, Math.min(1, value / this.range)));
+
+        ctx.clearRect(0, 0, width, height);
+
+        // Zero line
+        ctx.strokeStyle = 'rgba(128, 128, 128, 0.5)';
+        ctx.beginPath();
+        ctx.moveTo(0, y(0));
+        ctx.lineTo(width, y(0));
+        ctx.stroke();
+
+        // Error of both axes
+        const lines: [string, (sample: TelemetrySample) => number][] = [
+            ['#e05050', sample => sample.error_x],
+            ['#5080e0', sample => sample.error_y]
+        ];
+        for (const [color, value] of lines) {
+            ctx.strokeStyle = color;
+            ctx.beginPath();
+            for (let i = 0; i < this.samples.length; i++) {
+                const sample = this.samples[i];
+                if (i == 0) {
+                    ctx.moveTo(x(sample.time), y(value(sample)));
+                }
+                else {
+                    ctx.lineTo(x(sample.time), y(value(sample)));
+                }
+            }
+            ctx.stroke();
+        }
+
+        const last = this.samples[this.samples.length - 1];
+        const duration = end - this.samples[0].time;
+        const rate = duration > 0 ? (this.samples.length - 1) / duration : 0;
+        this.readout.textContent = `error x ${(last.error_x * 100).toFixed(1)} cm, y ${(last.error_y * 100).toFixed(1)} cm, ` +
+            `roll ${last.roll.toFixed(1)}°, pitch ${last.pitch.toFixed(1)}°, ${rate.toFixed(0)} Hz`;
+    }
+}
+
+export default TelemetryPlot;
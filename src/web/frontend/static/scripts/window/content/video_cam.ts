@@ -1,4 +1,4 @@
-import WebSocketHandler, { State, TaskId } from "../../websocket_handler.js";
+import WebSocketHandler, { State, StreamFrame, StreamStats, TaskId } from "../../websocket_handler.js";
 import Frame from "../frame.js";
 import ImageStream from "./elements/image_stream.js";
 
@@ -61,24 +61,19 @@ class VideoCam extends Frame {
     private connect(): void {
         
         WebSocketHandler.subscribe(this.id, TaskId.VIDEO_CAM, (state: boolean, payload: object) => {
+            // JSON messages report the state of the task and the statistics of the stream
+            if (this.image_stream && !state) {
+                this.image_stream.stop();
+            }
+            else if (this.image_stream && payload) {
+                this.image_stream.showStats(payload as StreamStats);
+            }
+        }, (frame: StreamFrame) => {
+            // Binary frame with the JPEG image
             if (this.image_stream) {
-                if (state) {
-                    try {
-                        if (payload) {
-                            // response is expected to be a base64 string
-                            const img = new Image();
-                            img.onload = () => {
-                                this.image_stream?.drawFrame(img);
-                            };
-                            img.src = `data:image/jpeg;base64,${payload}`;
-                        }
-                    } catch (e) {
-                        throw new VideoCamError("Failed to parse message or draw frame: " + e);
-                    }
-                }
-                else {
-                    this.image_stream?.stop();
-                }
+                this.image_stream.drawBlob(frame.image).catch(e => {
+                    console.log(new VideoCamError("Failed to draw frame: " + e));
+                });
             }
         });
 
@@ -97,7 +92,9 @@ class VideoCam extends Frame {
                 'platform': 'linux',
                 'device_name': '/dev/video0',
                 'resolution': '1280x720',
-                'fps': 10
+                'fps': 10,
+                // Rung of the stream ladder: 'high', 'medium', 'low', 'minimal' or 'auto'
+                'rung': 'auto'
             }
         );
     }
@@ -45,6 +45,16 @@ INSTALLED_APPS = [
 
 ASGI_APPLICATION = 'src.web.server.asgi.application'
 
+# Shared video streams are published to the viewers through channel layer groups, in memory for a single host
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "CONFIG": {
+            "capacity": 16
+        }
+    }
+}
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 STATIC_URL = "/"